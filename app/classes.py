@@ -4,13 +4,15 @@ SQLAlchemy Object Relational Mapper (ORM) and Flask-WTForms
 Including:
 Classes for each table in the database -
 user, plaid_items, accounts, transaction, savings_history, habits,
-coin, lottery, and user_lottery_log
+coin, lottery, user_lottery_log, user_daily_activity, outbox,
+daily_spending, and ingest_job
 
 WTForms -
 RegistrationForm, LogInForm, and HabitForm
 """
 
 import pytz
+import re
 from flask_login import UserMixin
 from flask_wtf import FlaskForm
 
@@ -24,6 +26,8 @@ from app import db, login_manager, application
 
 migrate = Migrate(application, db)
 TZ = pytz.timezone("America/Los_Angeles")
+# E.164 North American number: area code and exchange don't start with 0/1
+US_PHONE = re.compile(r"^\+1[2-9]\d{2}[2-9]\d{6}$")
 
 
 class User(db.Model, UserMixin):
@@ -35,12 +39,16 @@ class User(db.Model, UserMixin):
     last_name: user's last name; string
     email: user's email address; string; unique
     phone: user's phone number; string; unique
+    phone_e164: user's phone number in E.164 format, ex. +16158675309;
+                string; unique
     password_hash: user's hashed password; string
     signup_date: user's signup date; datetime
     status: user's current status; string
     auth_id: unique user id from OAuth if available; string
     coins: total number of coins the user has; int
     saving_suggestions: number of habit notifications sent to the user; int
+    last_login_coin_date: date of the last login or registration coins;
+                          date
     """
     __tablename__ = "user"
     id = db.Column("user_id", db.Integer, primary_key=True)
@@ -48,6 +56,7 @@ class User(db.Model, UserMixin):
     last_name = db.Column(db.String, nullable=False)
     email = db.Column(db.String, unique=True, nullable=False)
     phone = db.Column(db.String(10), unique=True, nullable=False)
+    phone_e164 = db.Column(db.String, unique=True, index=True)
     password_hash = db.Column(db.String, nullable=False)
     signup_date = db.Column(db.DateTime, nullable=False,
                             default=datetime.now().astimezone(TZ))
@@ -55,6 +64,7 @@ class User(db.Model, UserMixin):
     auth_id = db.Column(db.String, default=None)
     coins = db.Column(db.Integer, nullable=False, default=0)
     saving_suggestions = db.Column(db.Integer, nullable=False, default=0)
+    last_login_coin_date = db.Column(db.Date)
 
     # relationships
     plaid_items = db.relationship("PlaidItems", backref="user")
@@ -64,6 +74,7 @@ class User(db.Model, UserMixin):
     habits = db.relationship("Habits", backref="user")
     coin = db.relationship("Coin", backref="user")
     lottery_log = db.relationship("UserLotteryLog", backref="user")
+    daily_activity = db.relationship("UserDailyActivity", backref="user")
 
     def __init__(self, first_name, last_name, email,
                  phone, password, auth_id=None):
@@ -72,9 +83,23 @@ class User(db.Model, UserMixin):
         self.last_name = last_name
         self.email = email
         self.phone = phone
+        self.phone_e164 = self.normalize_phone(phone)
         self.auth_id = auth_id
         self.set_password(password)
 
+    @staticmethod
+    def normalize_phone(phone):
+        """Return a US phone number in E.164 format, ex. +16158675309"""
+        digits = "".join(c for c in str(phone) if c.isdigit())
+        if len(digits) == 10:
+            digits = "1" + digits
+        return "+" + digits
+
+    @staticmethod
+    def valid_phone(phone):
+        """Whether a phone number normalizes to a valid US number"""
+        return US_PHONE.match(User.normalize_phone(phone)) is not None
+
     def set_password(self, password):
         """Generates a hashed password"""
         self.password_hash = generate_password_hash(password)
@@ -96,12 +121,13 @@ class PlaidItems(db.Model):
     """
     __tablename__ = "plaid_items"
     id = db.Column("plaid_item_id", db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey("user.user_id"))
-    item_id = db.Column(db.String, nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.user_id"), index=True)
+    item_id = db.Column(db.String, nullable=False, index=True)
     access_token = db.Column(db.String, nullable=False)
 
     # relationships
-    accounts = db.relationship("Accounts", backref="plaid_item")
+    accounts = db.relationship("Accounts", backref="plaid_item",
+                               passive_deletes=True)
 
 
 class Accounts(db.Model):
@@ -115,19 +141,27 @@ class Accounts(db.Model):
     account_name: account name; string
     account_type: account type, ex. investment/depository/credit; string
     account_subtype: account subtype, ex. 401k/checking/credit card; string
+    synced_through: date of the latest posted transaction synced from
+                    plaid; date
+    last_synced_at: UTC time of the last transaction sync; datetime
     """
     __tablename__ = "accounts"
     id = db.Column("account_id", db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey("user.user_id"))
+    user_id = db.Column(db.Integer, db.ForeignKey("user.user_id"), index=True)
     plaid_id = db.Column(db.Integer,
-                         db.ForeignKey("plaid_items.plaid_item_id"))
+                         db.ForeignKey("plaid_items.plaid_item_id",
+                                       ondelete="CASCADE"),
+                         index=True)
     account_plaid_id = db.Column(db.String, nullable=False)
     account_name = db.Column(db.String)
     account_type = db.Column(db.String)
     account_subtype = db.Column(db.String)
+    synced_through = db.Column(db.Date)
+    last_synced_at = db.Column(db.DateTime)
 
     # relationships
-    transaction = db.relationship("Transaction", backref="account")
+    transaction = db.relationship("Transaction", backref="account",
+                                  passive_deletes=True)
 
 
 class Transaction(db.Model):
@@ -151,12 +185,20 @@ class Transaction(db.Model):
     merchant_postal_code: merchant postal code; string
     merchant_longitude: merchant longitude; string
     merchant_latitude: merchant latitude; string
+    plaid_transaction_id: unique id of the transaction in plaid; string
+    pending: whether the transaction is still pending in plaid; bool
     """
     __tablename__ = "transaction"
+    __table_args__ = (
+        db.Index("ix_transaction_user_id_trans_date_category_id",
+                 "user_id", "trans_date", "category_id"),
+    )
     id = db.Column("transaction_id", db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("user.user_id"))
     account_id = db.Column(db.Integer,
-                           db.ForeignKey("accounts.account_id"))
+                           db.ForeignKey("accounts.account_id",
+                                         ondelete="CASCADE"),
+                           index=True)
     trans_amount = db.Column(db.Numeric(10, 2), nullable=False)
     category_id = db.Column(db.Integer)
     is_preferred_saving = db.Column(db.String)
@@ -170,6 +212,8 @@ class Transaction(db.Model):
     merchant_postal_code = db.Column(db.String)
     merchant_longitude = db.Column(db.String)
     merchant_latitude = db.Column(db.String)
+    plaid_transaction_id = db.Column(db.String, unique=True, index=True)
+    pending = db.Column(db.Boolean, nullable=False, default=False)
 
 
 class SavingsHistory(db.Model):
@@ -207,15 +251,20 @@ class Habits(db.Model):
     time_hour: hour of the reminder (0-23); int
     time_day_of_week: day of week of the reminder, including 3 values:
                       "weekday", "weekend", "everyday"; string
+    next_fire_at: UTC time of the next reminder; datetime; indexed
+    updated_at: UTC time when the habit was last changed; datetime; indexed
     """
     __tablename__ = "habits"
     id = db.Column("habits_id", db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey("user.user_id"))
+    user_id = db.Column(db.Integer, db.ForeignKey("user.user_id"), index=True)
     habit_name = db.Column(db.String, nullable=False)
     habit_category = db.Column(db.String, nullable=False)
     time_minute = db.Column(db.Integer, nullable=False)
     time_hour = db.Column(db.Integer, nullable=False)
     time_day_of_week = db.Column(db.String, nullable=False)
+    next_fire_at = db.Column(db.DateTime, index=True)
+    updated_at = db.Column(db.DateTime, index=True, default=datetime.utcnow,
+                           onupdate=datetime.utcnow)
 
 
 class Coin(db.Model):
@@ -230,6 +279,10 @@ class Coin(db.Model):
                  login, saving, and lottery; string
     """
     __tablename__ = "coin"
+    __table_args__ = (
+        db.Index("ix_coin_user_id_description_log_date",
+                 "user_id", "description", "log_date"),
+    )
     id = db.Column("log_id", db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("user.user_id"))
     coin_amount = db.Column(db.Integer, nullable=False)
@@ -250,6 +303,11 @@ class Lottery(db.Model):
     winner_user_id: user id of the lottery winner; int
     """
     __tablename__ = "lottery"
+    __table_args__ = (
+        db.Index("ix_lottery_start_date_end_date", "start_date", "end_date"),
+        db.Index("ix_lottery_winner_user_id_end_date",
+                 "winner_user_id", "end_date"),
+    )
     id = db.Column("lottery_id", db.Integer, primary_key=True)
     lottery_name = db.Column(db.String, nullable=False)
     start_date = db.Column(db.DateTime, nullable=False)
@@ -272,12 +330,169 @@ class UserLotteryLog(db.Model):
     entries: number of entries for the lottery; int
     """
     __tablename__ = "user_lottery_log"
+    __table_args__ = (
+        db.Index("ix_user_lottery_log_user_id_lottery_id",
+                 "user_id", "lottery_id"),
+        db.Index("ix_user_lottery_log_lottery_id_user_id",
+                 "lottery_id", "user_id"),
+    )
     id = db.Column("lottery_log_id", db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("user.user_id"))
     lottery_id = db.Column(db.Integer, db.ForeignKey("lottery.lottery_id"))
     entries = db.Column(db.Integer, nullable=False, default=1)
 
 
+class UserDailyActivity(db.Model):
+    """Data model for user_daily_activity table.
+
+    Columns include:
+    activity_id: auto increment primary key; int
+    user_id: id of the user; int
+    activity_date: local date the counters are for; date
+    reminders_sent: number of habit reminders delivered that day; int
+    saves_recorded: number of savings recorded that day; int
+    """
+    __tablename__ = "user_daily_activity"
+    __table_args__ = (
+        db.UniqueConstraint("user_id", "activity_date",
+                            name="uq_user_daily_activity_user_date"),
+    )
+    id = db.Column("activity_id", db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.user_id"),
+                        nullable=False)
+    activity_date = db.Column(db.Date, nullable=False)
+    reminders_sent = db.Column(db.Integer, nullable=False, default=0)
+    saves_recorded = db.Column(db.Integer, nullable=False, default=0)
+
+
+class Outbox(db.Model):
+    """Data model for outbox table.
+
+    Columns include:
+    outbox_id: auto increment primary key; int
+    user_id: id of the user the message is sent to; int
+    kind: type of message, including 3 values:
+          reminder, lottery, and verification; string
+    to_phone: phone number the message is sent to; string
+    body: text of the message, empty for verifications; string
+    idempotency_key: key identifying the message, a message with a key
+                     that already exists is never enqueued again;
+                     string; unique
+    status: delivery status, including 5 values: pending, sending,
+            delivered, failed, and unknown (the send timed out and may
+            have been delivered, it is not retried); string
+    attempts: number of send attempts so far; int
+    next_attempt_at: UTC time from which the message may be sent; datetime
+    claimed_by: id of the worker currently sending the message; string
+    claimed_at: UTC time when the message was claimed; datetime
+    provider_sid: message sid returned by the SMS provider; string
+    last_error: error of the last failed attempt; string
+    created_at: UTC time when the message was enqueued; datetime
+    delivered_at: UTC time when the message was delivered; datetime
+    """
+    __tablename__ = "outbox"
+    __table_args__ = (
+        db.Index("ix_outbox_status_next_attempt_at",
+                 "status", "next_attempt_at"),
+        db.Index("ix_outbox_user_id_kind", "user_id", "kind"),
+    )
+    id = db.Column("outbox_id", db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.user_id"))
+    kind = db.Column(db.String, nullable=False)
+    to_phone = db.Column(db.String, nullable=False)
+    body = db.Column(db.String)
+    idempotency_key = db.Column(db.String, unique=True, nullable=False)
+    status = db.Column(db.String, nullable=False, default="pending")
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False,
+                                default=datetime.utcnow)
+    claimed_by = db.Column(db.String)
+    claimed_at = db.Column(db.DateTime)
+    provider_sid = db.Column(db.String)
+    last_error = db.Column(db.String)
+    created_at = db.Column(db.DateTime, nullable=False,
+                           default=datetime.utcnow)
+    delivered_at = db.Column(db.DateTime)
+
+
+class DailySpending(db.Model):
+    """Data model for daily_spending table, a rollup of transaction.
+
+    Columns include:
+    daily_spending_id: auto increment primary key; int
+    user_id: id of the user; int
+    spending_date: date of the transactions; date
+    bucket: habit of the transactions' category (see
+            scripts/category_registry.py), or "other"; string
+    trans_count: number of transactions; int
+    trans_amount: total amount of the transactions; decimal(12, 2)
+    """
+    __tablename__ = "daily_spending"
+    __table_args__ = (
+        db.UniqueConstraint("user_id", "spending_date", "bucket",
+                            name="uq_daily_spending_user_date_bucket"),
+    )
+    id = db.Column("daily_spending_id", db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.user_id"),
+                        nullable=False)
+    spending_date = db.Column(db.Date, nullable=False)
+    bucket = db.Column(db.String, nullable=False)
+    trans_count = db.Column(db.Integer, nullable=False, default=0)
+    trans_amount = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+
+
+class IngestJob(db.Model):
+    """Data model for ingest_job table, the queue of Plaid ingestion jobs.
+
+    Columns include:
+    ingest_job_id: auto increment primary key; int
+    user_id: id of the user whose transactions are ingested; int
+    plaid_item_id: plaid item whose accounts are synced; int
+    kind: reason for the job, including 4 values: link, and the
+          initial_update, historical_update and default_update
+          webhooks; string
+    status: job status, including 4 values:
+            pending, running, done, and failed; string
+    attempts: number of runs so far; int
+    next_attempt_at: UTC time from which the job may run; datetime
+    claimed_by: id of the worker currently running the job; string
+    claimed_at: UTC time when the job was claimed; datetime
+    pages_fetched: number of transaction pages fetched from plaid; int
+    rows_written: number of transactions inserted, updated or deleted; int
+    last_error: error of the last failed run; string
+    created_at: UTC time when the job was enqueued; datetime
+    finished_at: UTC time when the job was done or failed; datetime
+    """
+    __tablename__ = "ingest_job"
+    __table_args__ = (
+        db.Index("ix_ingest_job_status_next_attempt_at",
+                 "status", "next_attempt_at"),
+    )
+    id = db.Column("ingest_job_id", db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.user_id"),
+                        nullable=False, index=True)
+    plaid_item_id = db.Column(db.Integer,
+                              db.ForeignKey("plaid_items.plaid_item_id",
+                                            ondelete="CASCADE"),
+                              nullable=False)
+    kind = db.Column(db.String, nullable=False, default="link")
+    status = db.Column(db.String, nullable=False, default="pending")
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False,
+                                default=datetime.utcnow)
+    claimed_by = db.Column(db.String)
+    claimed_at = db.Column(db.DateTime)
+    pages_fetched = db.Column(db.Integer, nullable=False, default=0)
+    rows_written = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.String)
+    created_at = db.Column(db.DateTime, nullable=False,
+                           default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+
+    # relationships
+    plaid_item = db.relationship("PlaidItems")
+
+
 class RegistrationForm(FlaskForm):
     """Class for registration form"""
     first_name = StringField("First Name:",
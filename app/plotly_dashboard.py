@@ -1,20 +1,10 @@
-import plotly
-import plotly.graph_objects as go
-import pandas as pd
 from datetime import datetime, timedelta
 import pytz
 
 TZ = pytz.timezone("America/Los_Angeles")
 
 
-def select_past_week(saving_date):
-    this_week_cnt = 0
-    last_week_cnt = 0
-    for dates in saving_date:
-        if (datetime.now().astimezone(TZ).date() - dates[0]).days <= 7:
-            this_week_cnt += 1
-        elif (datetime.now().astimezone(TZ).date() - dates[0]).days <= 14:
-            last_week_cnt += 1
+def select_past_week(this_week_cnt, last_week_cnt):
     if last_week_cnt == 0:
         percentage = 0
     else:
@@ -23,55 +13,42 @@ def select_past_week(saving_date):
     return percentage, this_week_cnt * 10
 
 
-def plotly_saving_history(saving_date, saving_coins):
-    if len(saving_coins) != 0:
-        saving_coins_sum = [(saving_date[0][0], saving_coins[0][0])]
-        for i, coin in enumerate(saving_coins[1:]):
-            saving_coins_sum.append(
-                (saving_date[i + 1][0], saving_coins_sum[i][1] + coin[0]))
-
-        saving_dict = dict(saving_coins_sum)
-        base = datetime.now().astimezone(TZ).date()
-        first_date = saving_coins_sum[0][0]
-        latest_date = saving_coins_sum[-1][0]
-        date_list = [(base - timedelta(days=x)) for x in range(0, 7)]
-        for dates in date_list:
-            if dates > latest_date:
-                saving_dict[dates] = saving_dict[latest_date]
-            elif dates < first_date:
-                saving_dict[dates] = 0
-        df = pd.DataFrame(saving_dict.items(), columns=['date', 'coins']) \
-            .sort_values('date')
-
-        fig = go.Figure(data=go.Scatter(x=df.date, y=df.coins,
-                                        line=dict(color='#327AB7', width=4)))
-
-        fig.update_layout(
-            xaxis_range=[datetime.now().astimezone(TZ) - timedelta(days=7),
-                         datetime.now().astimezone(TZ)])
-        fig.update_layout(xaxis_title=None,
-                          paper_bgcolor='rgba(0,0,0,0)',
-                          plot_bgcolor='rgba(0,0,0,0)')
-        fig.update_yaxes(showgrid=True, gridwidth=1, gridcolor='LightGrey')
-        output = plotly.offline.plot(fig, include_plotlyjs=False,
-                                     output_type='div')
-        return output
-    else:
-        return 'No savings yet'
-
-
-def plotly_percent_saved(num_saved, num_total_suggestions):
-    labels = ['Saved', 'Unsaved']
-    values = [num_saved, num_total_suggestions - num_saved]
-
-    # pull is given as a fraction of the pie radius
-    fig = go.Figure(data=[go.Pie(labels=labels, values=values, pull=[0.2, 0])])
-    fig.update_traces(marker=dict(colors=['#327AB7', 'grey']))
-    output = plotly.offline.plot(fig, include_plotlyjs=False,
-                                 output_type='div')
-    return output
-
-
-if __name__ == "__main__":
-    plotly_saving_history(saving_date, saving_coins_sum)
-    plotly_percent_saved(num_saved, num_total_suggestions)
+def saving_history_series(daily, today=None):
+    """Return the cumulative savings chart data of the last week.
+
+    :param daily: [(date, coins, count), ...] rows ordered by date
+    :param today: local date, defaults to today
+    :return: {"date": [iso dates], "coins": [cumulative coins],
+              "range": [first day, today]}, or None without savings
+    """
+    if len(daily) == 0:
+        return None
+    if today is None:
+        today = datetime.now().astimezone(TZ).date()
+
+    saving_dict = {}
+    total = 0
+    for log_date, coins, _ in daily:
+        total += coins
+        saving_dict[log_date] = total
+
+    first_date = daily[0][0]
+    latest_date = daily[-1][0]
+    date_list = [(today - timedelta(days=x)) for x in range(0, 7)]
+    for dates in date_list:
+        if dates > latest_date:
+            saving_dict[dates] = saving_dict[latest_date]
+        elif dates < first_date:
+            saving_dict[dates] = 0
+
+    dates = sorted(saving_dict)
+    return {"date": [d.isoformat() for d in dates],
+            "coins": [int(saving_dict[d]) for d in dates],
+            "range": [(today - timedelta(days=7)).isoformat(),
+                      today.isoformat()]}
+
+
+def percent_saved_series(num_saved, num_total_suggestions):
+    """Return the saved versus unsaved pie chart data"""
+    return {"labels": ['Saved', 'Unsaved'],
+            "values": [num_saved, num_total_suggestions - num_saved]}
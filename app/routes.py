@@ -1,23 +1,33 @@
+import collections
 import os
 from datetime import datetime
 from app import application, classes, db
-from flask import redirect, render_template, url_for, request, flash
+from flask import redirect, render_template, url_for, request, flash, \
+    jsonify
 from flask_login import current_user, login_user, login_required, logout_user
-from plaid.errors import ItemError
-from plaid_methods.methods import get_accounts, get_transactions, \
-    token_exchange
+from plaid.errors import ItemError, PlaidError
+from plaid_methods.methods import get_accounts, token_exchange
 from plaid_methods import add_plaid_data as plaid_to_db
-from plaid import Client
 from plaid.api import Item
 import pytz
 import pandas as pd
-import twilio.rest
 from twilio.twiml.messaging_response import MessagingResponse
 from scripts.coin_transaction import add_login_coin, add_saving_coin, \
-    enter_lottery, lottery_drawing
-from app.plotly_dashboard import plotly_saving_history, plotly_percent_saved,\
-    select_past_week
-from scripts.extract_habit import Insights
+    available_lotteries_query, coin_log_query, enter_lottery, \
+    lottery_drawing, lottery_log_query
+from app.plotly_dashboard import saving_history_series, \
+    percent_saved_series, select_past_week
+from scripts.insights_engine import InsightsEngine
+from scripts.category_registry import CATEGORIES_FILE
+from scripts.fragment_cache import graph_cache
+from scripts.account_deletion import delete_account
+from scripts.habit_schedule import due_habits, save_habits, \
+    schedule_habit, queue_reminders
+from scripts.daily_activity import local_today, reply_counters_query
+from scripts.outbox import enqueue_messages, latest_message_query
+from scripts.dashboard_summary import saving_summary
+from scripts.http_transport import new_plaid_client, new_twilio_client
+from scripts.ingest_jobs import enqueue_ingest, handle_webhook, job_status
 
 ENV_VARS = {
     "PLAID_CLIENT_ID": os.environ["PLAID_CLIENT_ID"],
@@ -30,18 +40,9 @@ ENV_VARS = {
     "VERIFICATION_SID": os.environ["VERIFICATION_SID"]
 }
 
-# setup plaid client
-client = Client(
-    ENV_VARS["PLAID_CLIENT_ID"],
-    ENV_VARS["PLAID_SECRET"],
-    ENV_VARS["PLAID_PUBLIC_KEY"],
-    ENV_VARS["PLAID_ENV"],
-)
-
-# setup twilio client
-twilio_client = twilio.rest.Client(
-    ENV_VARS["TWILIO_ACCOUNT_SID"],
-    ENV_VARS["TWILIO_AUTH_TOKEN"])
+# setup plaid and twilio clients, sharing one pooled http transport
+client = new_plaid_client()
+twilio_client = new_twilio_client(application.config["SMS_TIMEOUT"])
 
 
 @application.route("/index")
@@ -110,19 +111,23 @@ def register():
 @application.route('/start_verification', methods=('GET', 'POST'))
 @login_required
 def start_verification():
-    """Start a phone number verification"""
-
-    service = ENV_VARS["VERIFICATION_SID"]
-    try:
-        verification = twilio_client.verify \
-            .services(service) \
-            .verifications \
-            .create(to="+1"+str(current_user.phone), channel="sms")
+    """Start a phone number verification
 
-    except Exception as e:
+    The verification text is queued in the outbox and sent by the outbox
+    worker. Repeated requests within the same minute are sent once.
+    """
+    phone = classes.User.normalize_phone(current_user.phone)
+    if not classes.User.valid_phone(phone):
         flash("oops! We can't verify this phone number, please use a \
             valid phone number! Returning to homepage in 3 seconds")
         return render_template('message.html', validator=True)
+
+    now = datetime.utcnow()
+    enqueue_messages([classes.Outbox(
+        user_id=current_user.id, kind="verification", to_phone=phone,
+        idempotency_key=f"verification:{current_user.id}:"
+                        f"{now:%Y-%m-%dT%H:%M}")])
+    db.session.commit()
     return redirect(url_for('verify'))
 
 
@@ -130,10 +135,18 @@ def start_verification():
 @login_required
 def verify():
     """Verify a user on registration with their phone number"""
-    phone = "+1"+str(current_user.phone)
+    phone = classes.User.normalize_phone(current_user.phone)
     if request.method == 'POST':
         code = request.form['code']
         return check_verification(phone, code)
+
+    # the verification text is sent by the outbox worker; tell the user
+    # if it could not be sent rather than leave them waiting for a code
+    latest = latest_message_query(current_user.id, "verification").first()
+    if latest is not None and latest.status == "failed":
+        flash("oops! We couldn't send a verification code to this phone \
+            number, please use a valid phone number!")
+        return render_template('message.html', validator=True)
     return render_template('verify.html')
 
 
@@ -170,25 +183,28 @@ def habit_table_save_changes():
     if request.method == "POST":
         user_id = current_user.id
 
+        habit_id = request.form.getlist("habit_id")
         habit_name = request.form.getlist("habit_name")
         habit_category = request.form.getlist("habit_category")
         time_hour_minute = request.form.getlist("time_hour_minute")
         time_day_of_week = request.form.getlist("time_day_of_week")
 
-        # delete the user's habits
-        classes.Habits.query.filter_by(user_id=user_id).delete()
-        db.session.commit()
-
-        # add the latest habits back to db
+        # rows without an id, e.g. added with "Add New", are new habits
+        rows = []
         for i in range(len(habit_name)):
-            habit = classes.Habits(user_id=user_id, habit_name=habit_name[i],
-                                   habit_category=habit_category[i],
-                                   time_minute=time_hour_minute[i]
-                                   .split(':')[1],
-                                   time_hour=time_hour_minute[i].split(':')[0],
-                                   time_day_of_week=time_day_of_week[i])
-            db.session.add(habit)
-            db.session.commit()
+            time_hour, time_minute = time_hour_minute[i].split(':')
+            rows.append({"id": int(habit_id[i])
+                         if i < len(habit_id) and habit_id[i].isdigit()
+                         else None,
+                         "habit_name": habit_name[i],
+                         "habit_category": habit_category[i],
+                         "time_hour": int(time_hour),
+                         "time_minute": int(time_minute),
+                         "time_day_of_week": time_day_of_week[i]})
+
+        # insert, update and delete the user's habits in one transaction
+        save_habits(user_id, rows)
+        db.session.commit()
 
     return redirect(url_for("dashboard"))
 
@@ -210,6 +226,7 @@ def create_habit():
                                time_minute=int(time_minute),
                                time_hour=int(time_hour),
                                time_day_of_week=time_day_of_week)
+        schedule_habit(habit)
 
         db.session.add(habit)
         db.session.commit()
@@ -240,55 +257,40 @@ def dashboard():
             else:
                 lottery_status = 'You just bought a lottery ticket'
                 for lottery_obj in lottery_objs:
-                    enter_lottery(current_user, lottery_obj)
+                    if not enter_lottery(current_user, lottery_obj):
+                        lottery_status = 'Not enough coins'
 
     # get the lottery that the user has bought
-    bought_lottery_records = classes.UserLotteryLog.query.filter_by(
-        user=current_user).all()
+    bought_lottery_records = lottery_log_query(current_user.id).all()
 
     # get all the available lottery records
     tz = pytz.timezone("America/Los_Angeles")
     current_time = datetime.now().astimezone(tz)
-    available_lottery_records = classes.Lottery.query.filter(
-        classes.Lottery.start_date <= str(current_time),
-        classes.Lottery.end_date >= str(current_time)).all()
+    available_lottery_records = available_lotteries_query(
+        str(current_time)).all()
 
     # Dashboard tab
     # extract user's saving history from coins associated with "saving"
     user_id = current_user.id
 
-    saving_date = classes.Coin.query.filter(
-        classes.Coin.user_id == user_id,
-        classes.Coin.description.in_(['saving'])) \
-        .with_entities(classes.Coin.log_date).all()
-    saving_coins = classes.Coin.query.filter(
-        classes.Coin.user_id == user_id,
-        classes.Coin.description.in_(['saving'])) \
-        .with_entities(classes.Coin.coin_amount).all()
-    savings_bar_plot = plotly_saving_history(saving_date, saving_coins)
-    saving_percent, total_saving_coins = select_past_week(saving_date)
+    # the charts themselves are drawn in the browser from
+    # saving_history_data and percent_saved_data
+    summary = saving_summary(user_id)
+    saving_percent, total_saving_coins = select_past_week(
+        summary.this_week, summary.last_week)
 
     # count how many times user has responded "Y" to save
-    num_saved = len(classes.Coin.query.filter_by(user_id=user_id,
-                                                 description='saving').all())
-    saving_percent_plot = plotly_percent_saved(
-        num_saved, current_user.saving_suggestions)
+    num_saved = summary.num_saved
 
     # Retrieve spending habits for Insights
-    categories_file = os.path.join(os.getcwd(), 'scripts', 'categories.json')
-
-    beginning_month = datetime(year=2019, month=10, day=1)
-    insights_list = []
-    thresholds = [8, 6, 2]
-    for ind, habit_name in enumerate(['coffee', 'lunch', 'transportation']):
-        insights = Insights(user_id, beginning_month, categories_file,
-                            habit_name, thresholds[ind])
-        if insights.transactions is not None:
-            insights_list.append(insights)
+    # over the 30 days up to the user's latest transaction
+    thresholds = collections.OrderedDict(
+        [('coffee', 8), ('lunch', 6), ('transportation', 2)])
+    insights_list = InsightsEngine.load(user_id, CATEGORIES_FILE) \
+        .insights(thresholds, 30)
 
     # coin transaction history
-    coin_log = classes.Coin.query.filter_by(user=current_user).order_by(
-        classes.Coin.id.desc()).limit(6).all()
+    coin_log = coin_log_query(current_user.id).all()
 
     return render_template("dashboard.html",
                            user=current_user,
@@ -298,12 +300,12 @@ def dashboard():
                            bought_lottery_records=bought_lottery_records,
                            plaid_public_key=client.public_key,
                            plaid_environment=client.environment,
+                           plaid_webhook=application.config[
+                               "PLAID_WEBHOOK_URL"],
                            plaid_products=ENV_VARS.get("PLAID_PRODUCTS",
                                                        "transactions"),
                            plaid_country_codes=ENV_VARS.
                            get("PLAID_COUNTRY_CODES", "US"),
-                           source_bar=savings_bar_plot,
-                           source_pie=saving_percent_plot,
                            num_suggestions=current_user.saving_suggestions,
                            num_saved=num_saved,
                            total_saving_coins=total_saving_coins,
@@ -312,6 +314,34 @@ def dashboard():
                            )
 
 
+@application.route("/dashboard/saving_history.json")
+@login_required
+def saving_history_data():
+    """Cumulative savings series for the Savings History chart"""
+    summary = saving_summary(current_user.id)
+    return jsonify(saving_history_series(summary.daily))
+
+
+@application.route("/dashboard/percent_saved.json")
+@login_required
+def percent_saved_data():
+    """Saved versus unsaved counts for the Total Savings chart"""
+    summary = saving_summary(current_user.id)
+    return jsonify(percent_saved_series(summary.num_saved,
+                                        current_user.saving_suggestions))
+
+
+@application.route("/dashboard/ingest_jobs.json")
+@login_required
+def ingest_jobs_data():
+    """Status and progress of the user's latest account ingestion jobs"""
+    jobs = classes.IngestJob.query \
+        .filter_by(user_id=current_user.id) \
+        .order_by(classes.IngestJob.id.desc()) \
+        .limit(5)
+    return jsonify({"jobs": [job_status(job) for job in jobs]})
+
+
 @application.route('/find_insights')
 @login_required
 def find_insights():
@@ -337,23 +367,17 @@ def delete_plaid_account():
     account_id = request.form['accountId']
     # get account
     account = classes.Accounts.query.get(account_id)
-    # get transactions associated with account
-    transactions = classes.Transaction.query.\
-        filter_by(account_id=account.id)
-
-    accounts_with_plaid_id = classes.Accounts.query.\
-        filter_by(plaid_id=account.plaid_id)\
-        .count()
-    # if only account associated with plaid id delete plaid id
-    if accounts_with_plaid_id == 1:
-        plaid_item = classes.PlaidItems.query.get(account.plaid_id)
-        Item(client).remove(plaid_item.access_token)
-        db.session.delete(plaid_item)
-
-    for transaction in transactions:
-        db.session.delete(transaction)
-    db.session.delete(account)
-    db.session.commit()
+    user_id = account.user_id
+    access_token = delete_account(account)
+    graph_cache.invalidate_user(user_id)
+
+    # unlink the item at plaid once the deletion is committed; the
+    # account is gone from the app either way
+    if access_token is not None:
+        try:
+            Item(client).remove(access_token)
+        except PlaidError as e:
+            application.logger.warning("plaid item not removed: %s", e)
 
     return redirect(url_for('dashboard'))
 
@@ -402,13 +426,13 @@ def access_plaid_token():
                  'subtype': request.form[f'accounts[{idx}][subtype]']}
             )
 
-        existing_account_ids = [account_id for account in current_user.accounts
-                                for account_id in account.account_plaid_id]
-
-        for new_account in accounts:
-            if new_account['account_id'] in existing_account_ids:
-                flash("You have already added the account selected")
-                redirect(url_for("dashboard"))
+        existing_account_ids = {account.account_plaid_id
+                                for account in current_user.accounts}
+        accounts = [account for account in accounts
+                    if account['account_id'] not in existing_account_ids]
+        if not accounts:
+            flash("You have already added the account selected")
+            return redirect(url_for("dashboard"))
 
         response = token_exchange(client, public_token)
         item_id = response['item_id']
@@ -420,14 +444,11 @@ def access_plaid_token():
         db.session.add(plaid)
         db.session.commit()
 
-        plaid_to_db.add_accounts(accounts, current_user, plaid)
+        plaid_to_db.add_accounts(accounts, current_user, plaid, commit=False)
 
-        for account in current_user.accounts:
-            transactions = get_transactions(
-                client, '2019-10-01', '2019-11-01',
-                access_token=account.plaid_item.access_token,
-                account_id=account.account_plaid_id)
-            plaid_to_db.add_transactions(transactions, current_user, account)
+        # transactions are downloaded by the ingest worker
+        enqueue_ingest(plaid)
+        db.session.commit()
 
     except ItemError as e:
         outstring = f"Failure: {e.code}"
@@ -437,31 +458,29 @@ def access_plaid_token():
     return redirect(url_for("dashboard"))
 
 
+@application.route("/plaid/webhook", methods=["POST"])
+def plaid_webhook():
+    """Receive Plaid's webhooks and queue a sync of the item on new
+    transactions"""
+    job = handle_webhook(request.get_json(silent=True) or {})
+    db.session.commit()
+    return jsonify({"queued": job is not None})
+
+
 @application.route("/send_message", methods=['GET', 'POST'])
 def send_message():
-    """send message to user's phone number based on habit time"""
-    dow_dict = {'weekday': [0, 1, 2, 3, 4],
-                'weekend': [5, 6],
-                'everyday': [0, 1, 2, 3, 4, 5, 6]}
-
-    habits = classes.Habits.query.all()
-
-    for habit in habits:
-        pst = pytz.timezone("America/Los_Angeles")
-        now = datetime.now().astimezone(pst)
-        if now.weekday() in dow_dict[habit.time_day_of_week] and \
-                habit.time_minute == now.minute and \
-                habit.time_hour == now.hour:
-            habit.user.saving_suggestions += 1  # add 1 user saving suggestion
-            body = f"Would you like to save $5 on {habit.habit_category} " + \
-                   "today? Respond Y/N"
-            twilio_client.messages.create(
-                body=body,
-                to=habit.user.phone,
-                from_="+16462573594")
+    """Queue messages to user's phone number based on habit time
+
+    Messages are sent by the outbox worker (python -m scripts.outbox).
+    Not needed when the reminder scheduler daemon
+    (python -m scripts.reminder_scheduler) is running, but safe to keep
+    as the two never queue the same reminder twice.
+    """
+    now = datetime.utcnow()
+    queue_reminders(due_habits(now), now)
     db.session.commit()
 
-    # lottery drawing and send message to the winner
+    # lottery drawing and queue message to the winner
     lottery_drawing()
 
     return redirect(url_for("index"))
@@ -469,34 +488,25 @@ def send_message():
 
 @application.route("/receive_message", methods=["POST"])
 def receive_message():
-    """Receive user's reply to habit messages and add saving coins"""
-    dow_dict = {'weekday': [0, 1, 2, 3, 4],
-                'weekend': [5, 6],
-                'everyday': [0, 1, 2, 3, 4, 5, 6]}
+    """Receive user's reply to habit messages and add saving coins
 
-    pst = pytz.timezone("America/Los_Angeles")
-    now = datetime.now().astimezone(pst)
-    date = now.date()
-
-    number = str(request.form['From'])[2:]
+    The user and today's reminder and saving counters are read with one
+    indexed query on the E.164 phone number.
+    """
+    number = classes.User.normalize_phone(request.form['From'])
     response = request.form['Body']
-    user_by_num = classes.User.query.filter_by(phone=number).first()
-    name = user_by_num.first_name
-
-    user_habits_num = len([habit for habit in user_by_num.habits
-                           if now.weekday() in
-                           dow_dict[habit.time_day_of_week]])
 
-    save_num = len([save for save in user_by_num.coin
-                    if save.log_date == date and save.description == "saving"])
+    row = reply_counters_query(number, local_today()).first()
 
-    if save_num >= user_habits_num:
+    if row is None or (row[2] or 0) >= (row[1] or 0):
         resp = MessagingResponse()
         res_str_1 = f"Oops, I don't understand!"
         resp.message(res_str_1)
         return str(resp)
 
     else:
+        user_by_num = row[0]
+        name = user_by_num.first_name
         if response.lower() == "y":
             add_saving_coin(user_by_num)
             resp = MessagingResponse()
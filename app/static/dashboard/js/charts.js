@@ -0,0 +1,58 @@
+// Dashboard charts, drawn in the browser from the JSON series served by
+// /dashboard/saving_history.json and /dashboard/percent_saved.json
+
+var CHART_COLOR = '#327AB7';
+
+// layout shared by every dashboard chart
+var CHART_LAYOUT = {
+    paper_bgcolor: 'rgba(0,0,0,0)',
+    plot_bgcolor: 'rgba(0,0,0,0)',
+    xaxis: {title: null},
+    yaxis: {showgrid: true, gridwidth: 1, gridcolor: 'LightGrey'}
+};
+
+var CHART_CONFIG = {responsive: true};
+
+function chartLayout(extra) {
+    return $.extend(true, {}, CHART_LAYOUT, extra);
+}
+
+function drawSavingHistory(element, series) {
+    var trace = {
+        type: 'scatter',
+        x: series.date,
+        y: series.coins,
+        line: {color: CHART_COLOR, width: 4}
+    };
+    Plotly.newPlot(element, [trace],
+                   chartLayout({xaxis: {range: series.range}}), CHART_CONFIG);
+}
+
+function drawPercentSaved(element, series) {
+    var trace = {
+        type: 'pie',
+        labels: series.labels,
+        values: series.values,
+        // pull is given as a fraction of the pie radius
+        pull: [0.2, 0],
+        marker: {colors: [CHART_COLOR, 'grey']}
+    };
+    Plotly.newPlot(element, [trace], chartLayout({}), CHART_CONFIG);
+}
+
+function loadChart(elementId, draw) {
+    var element = document.getElementById(elementId);
+    if (element === null) {
+        return;
+    }
+    $.getJSON(element.getAttribute('data-url'), function (series) {
+        if (series !== null) {
+            draw(element, series);
+        }
+    });
+}
+
+$(document).ready(function () {
+    loadChart('saving-history-chart', drawSavingHistory);
+    loadChart('percent-saved-chart', drawPercentSaved);
+});
@@ -0,0 +1,42 @@
+// Progress of account ingestion jobs, polled from /dashboard/ingest_jobs.json
+// while a newly linked account's transactions are being imported
+
+var INGEST_POLL_MS = 2000;
+
+function describeJob(job) {
+    if (job.status === 'pending') {
+        return 'Waiting to import transactions...';
+    }
+    if (job.status === 'running') {
+        return 'Importing transactions: ' + job.pages_fetched +
+            ' pages fetched...';
+    }
+    if (job.status === 'failed') {
+        return 'Importing transactions failed: ' + job.last_error;
+    }
+    return 'Imported ' + job.rows_written + ' transactions.';
+}
+
+function pollIngestJobs(element, sawActive) {
+    $.getJSON(element.getAttribute('data-url'), function (data) {
+        var active = $.grep(data.jobs, function (job) {
+            return job.status === 'pending' || job.status === 'running';
+        });
+        if (active.length > 0) {
+            $(element).text(describeJob(active[0])).show();
+            setTimeout(function () {
+                pollIngestJobs(element, true);
+            }, INGEST_POLL_MS);
+        } else if (sawActive) {
+            // the import finished while the page was open
+            window.location.reload();
+        }
+    });
+}
+
+$(document).ready(function () {
+    var element = document.getElementById('ingest-status');
+    if (element !== null) {
+        pollIngestJobs(element, false);
+    }
+});
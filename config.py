@@ -7,6 +7,35 @@ class Config(object):
     SQLALCHEMY_DATABASE_URI = os.environ["SQLALCHEMY_DATABASE_URI"]
     SQLALCHEMY_TRACK_MODIFICATIONS = True
     SECRET_KEY = os.urandom(24)
+    # turn executemany INSERTs into multi-row VALUES batches on Postgres
+    if SQLALCHEMY_DATABASE_URI.startswith("postgres"):
+        SQLALCHEMY_ENGINE_OPTIONS = {"executemany_mode": "values"}
+    # concurrency cap and per-message timeout (seconds) for outbound SMS
+    SMS_MAX_WORKERS = int(os.environ.get("SMS_MAX_WORKERS", 8))
+    SMS_TIMEOUT = float(os.environ.get("SMS_TIMEOUT", 10))
+    # rendered insights charts kept in memory, and optionally on disk
+    FRAGMENT_CACHE_SIZE = int(os.environ.get("FRAGMENT_CACHE_SIZE", 256))
+    FRAGMENT_CACHE_DIR = os.environ.get("FRAGMENT_CACHE_DIR")
+    # first date fetched when an account is synced for the first time
+    PLAID_SYNC_START = os.environ.get("PLAID_SYNC_START", "2019-10-01")
+    # transactions per page, and pages fetched at once, from plaid
+    PLAID_PAGE_SIZE = int(os.environ.get("PLAID_PAGE_SIZE", 500))
+    PLAID_FETCH_CONCURRENCY = int(os.environ.get("PLAID_FETCH_CONCURRENCY",
+                                                 4))
+    # public url of the plaid_webhook route given to Plaid Link, if any
+    PLAID_WEBHOOK_URL = os.environ.get("PLAID_WEBHOOK_URL")
+    # connection pool shared by the Plaid and Twilio clients: connections
+    # per host, timeouts (seconds), retry budget per request, and whether
+    # to wait for a free connection when a host's pool is exhausted
+    HTTP_POOL_SIZE = int(os.environ.get("HTTP_POOL_SIZE", 10))
+    HTTP_CONNECT_TIMEOUT = float(os.environ.get("HTTP_CONNECT_TIMEOUT", 3.05))
+    HTTP_READ_TIMEOUT = float(os.environ.get("HTTP_READ_TIMEOUT", 30))
+    HTTP_RETRIES = int(os.environ.get("HTTP_RETRIES", 2))
+    HTTP_POOL_BLOCK = os.environ.get("HTTP_POOL_BLOCK", "") == "1"
+    # base urls of local stand-ins for the Plaid and Twilio apis (see
+    # scripts/stand_in_server.py), instead of the real ones, if set
+    PLAID_BASE_URL = os.environ.get("PLAID_BASE_URL")
+    TWILIO_BASE_URL = os.environ.get("TWILIO_BASE_URL")
 
 # for running sphinx documentation:
 # class Config(object):
@@ -0,0 +1,68 @@
+"""add next_fire_at to habits table
+
+Revision ID: a3f1c9d2b7e4
+Revises: 5ccad50bb0af
+Create Date: 2020-05-20 10:12:41.532815
+
+"""
+from datetime import datetime, timedelta
+
+from alembic import op
+import pytz
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3f1c9d2b7e4'
+down_revision = '5ccad50bb0af'
+branch_labels = None
+depends_on = None
+
+TZ = pytz.timezone("America/Los_Angeles")
+DAYS_OF_WEEK = {"weekday": (0, 1, 2, 3, 4),
+                "weekend": (5, 6),
+                "everyday": (0, 1, 2, 3, 4, 5, 6)}
+
+
+def _next_fire_time(time_day_of_week, time_hour, time_minute, after):
+    local_after = pytz.utc.localize(after).astimezone(TZ)
+    for offset in range(8):
+        day = local_after.date() + timedelta(days=offset)
+        if day.weekday() not in DAYS_OF_WEEK[time_day_of_week]:
+            continue
+        local_fire = TZ.localize(datetime(day.year, day.month, day.day,
+                                          time_hour, time_minute))
+        fire_at = local_fire.astimezone(pytz.utc).replace(tzinfo=None)
+        if fire_at > after:
+            return fire_at
+
+
+def upgrade():
+    op.add_column('habits', sa.Column('next_fire_at', sa.DateTime(),
+                                      nullable=True))
+    op.create_index(op.f('ix_habits_next_fire_at'), 'habits',
+                    ['next_fire_at'], unique=False)
+
+    # backfill the schedule of existing habits
+    habits = sa.table('habits',
+                      sa.column('habits_id', sa.Integer),
+                      sa.column('time_minute', sa.Integer),
+                      sa.column('time_hour', sa.Integer),
+                      sa.column('time_day_of_week', sa.String),
+                      sa.column('next_fire_at', sa.DateTime))
+    conn = op.get_bind()
+    now = datetime.utcnow()
+    rows = conn.execute(sa.select([habits.c.habits_id,
+                                   habits.c.time_day_of_week,
+                                   habits.c.time_hour,
+                                   habits.c.time_minute])).fetchall()
+    for habit_id, day_of_week, hour, minute in rows:
+        conn.execute(habits.update()
+                     .where(habits.c.habits_id == habit_id)
+                     .values(next_fire_at=_next_fire_time(
+                         day_of_week, hour, minute, now)))
+
+
+def downgrade():
+    op.drop_index(op.f('ix_habits_next_fire_at'), table_name='habits')
+    op.drop_column('habits', 'next_fire_at')
@@ -0,0 +1,40 @@
+"""add daily_spending table
+
+Revision ID: a71c3e9d4b25
+Revises: f603b1d7e9a2
+Create Date: 2020-06-05 10:12:31.508214
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a71c3e9d4b25'
+down_revision = 'f603b1d7e9a2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # filled by python -m scripts.daily_spending --rebuild
+    op.create_table('daily_spending',
+                    sa.Column('daily_spending_id', sa.Integer(),
+                              nullable=False),
+                    sa.Column('user_id', sa.Integer(), nullable=False),
+                    sa.Column('spending_date', sa.Date(), nullable=False),
+                    sa.Column('bucket', sa.String(), nullable=False),
+                    sa.Column('trans_count', sa.Integer(), nullable=False),
+                    sa.Column('trans_amount',
+                              sa.Numeric(precision=12, scale=2),
+                              nullable=False),
+                    sa.ForeignKeyConstraint(['user_id'], ['user.user_id'], ),
+                    sa.PrimaryKeyConstraint('daily_spending_id'),
+                    sa.UniqueConstraint('user_id', 'spending_date', 'bucket',
+                                        name='uq_daily_spending_user_date_'
+                                             'bucket')
+                    )
+
+
+def downgrade():
+    op.drop_table('daily_spending')
@@ -0,0 +1,40 @@
+"""add plaid_transaction_id, pending and account sync state
+
+Revision ID: b3d8f2a6c170
+Revises: a71c3e9d4b25
+Create Date: 2020-06-08 11:47:02.331596
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b3d8f2a6c170'
+down_revision = 'a71c3e9d4b25'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # transactions ingested before this revision have no plaid id
+    op.add_column('transaction', sa.Column('plaid_transaction_id',
+                                           sa.String(), nullable=True))
+    op.add_column('transaction', sa.Column('pending', sa.Boolean(),
+                                           nullable=False,
+                                           server_default=sa.false()))
+    op.create_index(op.f('ix_transaction_plaid_transaction_id'),
+                    'transaction', ['plaid_transaction_id'], unique=True)
+    op.add_column('accounts', sa.Column('synced_through', sa.Date(),
+                                        nullable=True))
+    op.add_column('accounts', sa.Column('last_synced_at', sa.DateTime(),
+                                        nullable=True))
+
+
+def downgrade():
+    op.drop_column('accounts', 'last_synced_at')
+    op.drop_column('accounts', 'synced_through')
+    op.drop_index(op.f('ix_transaction_plaid_transaction_id'),
+                  table_name='transaction')
+    op.drop_column('transaction', 'pending')
+    op.drop_column('transaction', 'plaid_transaction_id')
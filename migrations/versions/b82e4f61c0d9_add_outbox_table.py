@@ -0,0 +1,48 @@
+"""add outbox table
+
+Revision ID: b82e4f61c0d9
+Revises: a3f1c9d2b7e4
+Create Date: 2020-05-22 14:03:27.918402
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b82e4f61c0d9'
+down_revision = 'a3f1c9d2b7e4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('outbox',
+                    sa.Column('outbox_id', sa.Integer(), nullable=False),
+                    sa.Column('user_id', sa.Integer(), nullable=True),
+                    sa.Column('kind', sa.String(), nullable=False),
+                    sa.Column('to_phone', sa.String(), nullable=False),
+                    sa.Column('body', sa.String(), nullable=True),
+                    sa.Column('idempotency_key', sa.String(),
+                              nullable=False),
+                    sa.Column('status', sa.String(), nullable=False),
+                    sa.Column('attempts', sa.Integer(), nullable=False),
+                    sa.Column('next_attempt_at', sa.DateTime(),
+                              nullable=False),
+                    sa.Column('claimed_by', sa.String(), nullable=True),
+                    sa.Column('claimed_at', sa.DateTime(), nullable=True),
+                    sa.Column('provider_sid', sa.String(), nullable=True),
+                    sa.Column('last_error', sa.String(), nullable=True),
+                    sa.Column('created_at', sa.DateTime(), nullable=False),
+                    sa.Column('delivered_at', sa.DateTime(), nullable=True),
+                    sa.ForeignKeyConstraint(['user_id'], ['user.user_id'], ),
+                    sa.PrimaryKeyConstraint('outbox_id'),
+                    sa.UniqueConstraint('idempotency_key')
+                    )
+    op.create_index('ix_outbox_status_next_attempt_at', 'outbox',
+                    ['status', 'next_attempt_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_outbox_status_next_attempt_at', table_name='outbox')
+    op.drop_table('outbox')
@@ -0,0 +1,35 @@
+"""add updated_at to habits table
+
+Revision ID: c47d0e5a9b13
+Revises: b82e4f61c0d9
+Create Date: 2020-05-26 11:48:05.274519
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c47d0e5a9b13'
+down_revision = 'b82e4f61c0d9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # sqlite cannot add a column with a non-constant default, so the
+    # column is added bare, backfilled, then given its default
+    op.add_column('habits', sa.Column('updated_at', sa.DateTime(),
+                                      nullable=True))
+    op.execute("UPDATE habits SET updated_at = CURRENT_TIMESTAMP")
+    with op.batch_alter_table('habits') as batch_op:
+        batch_op.alter_column('updated_at', existing_type=sa.DateTime(),
+                              server_default=sa.func.now())
+    op.create_index(op.f('ix_habits_updated_at'), 'habits',
+                    ['updated_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_habits_updated_at'), table_name='habits')
+    with op.batch_alter_table('habits') as batch_op:
+        batch_op.drop_column('updated_at')
@@ -0,0 +1,52 @@
+"""add ingest_job table
+
+Revision ID: c5e1a7b94d02
+Revises: b3d8f2a6c170
+Create Date: 2020-06-10 16:21:45.207118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5e1a7b94d02'
+down_revision = 'b3d8f2a6c170'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('ingest_job',
+                    sa.Column('ingest_job_id', sa.Integer(), nullable=False),
+                    sa.Column('user_id', sa.Integer(), nullable=False),
+                    sa.Column('plaid_item_id', sa.Integer(), nullable=False),
+                    sa.Column('kind', sa.String(), nullable=False),
+                    sa.Column('status', sa.String(), nullable=False),
+                    sa.Column('attempts', sa.Integer(), nullable=False),
+                    sa.Column('next_attempt_at', sa.DateTime(),
+                              nullable=False),
+                    sa.Column('claimed_by', sa.String(), nullable=True),
+                    sa.Column('claimed_at', sa.DateTime(), nullable=True),
+                    sa.Column('pages_fetched', sa.Integer(), nullable=False),
+                    sa.Column('rows_written', sa.Integer(), nullable=False),
+                    sa.Column('last_error', sa.String(), nullable=True),
+                    sa.Column('created_at', sa.DateTime(), nullable=False),
+                    sa.Column('finished_at', sa.DateTime(), nullable=True),
+                    sa.ForeignKeyConstraint(['user_id'], ['user.user_id'], ),
+                    sa.ForeignKeyConstraint(['plaid_item_id'],
+                                            ['plaid_items.plaid_item_id'],
+                                            ondelete='CASCADE'),
+                    sa.PrimaryKeyConstraint('ingest_job_id')
+                    )
+    op.create_index('ix_ingest_job_status_next_attempt_at', 'ingest_job',
+                    ['status', 'next_attempt_at'], unique=False)
+    op.create_index(op.f('ix_ingest_job_user_id'), 'ingest_job',
+                    ['user_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_ingest_job_user_id'), table_name='ingest_job')
+    op.drop_index('ix_ingest_job_status_next_attempt_at',
+                  table_name='ingest_job')
+    op.drop_table('ingest_job')
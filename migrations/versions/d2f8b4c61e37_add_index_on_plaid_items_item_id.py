@@ -0,0 +1,25 @@
+"""add index on plaid_items.item_id
+
+Revision ID: d2f8b4c61e37
+Revises: c5e1a7b94d02
+Create Date: 2020-06-12 10:05:38.614290
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd2f8b4c61e37'
+down_revision = 'c5e1a7b94d02'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index(op.f('ix_plaid_items_item_id'), 'plaid_items',
+                    ['item_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_plaid_items_item_id'), table_name='plaid_items')
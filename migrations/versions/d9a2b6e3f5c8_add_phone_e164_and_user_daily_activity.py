@@ -0,0 +1,46 @@
+"""add phone_e164 to user table and user_daily_activity table
+
+Revision ID: d9a2b6e3f5c8
+Revises: c47d0e5a9b13
+Create Date: 2020-05-28 16:21:54.640137
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd9a2b6e3f5c8'
+down_revision = 'c47d0e5a9b13'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('user', sa.Column('phone_e164', sa.String(),
+                                    nullable=True))
+    # phone numbers are stored as 10 digit US numbers
+    op.execute("UPDATE \"user\" SET phone_e164 = '+1' || phone")
+    op.create_index(op.f('ix_user_phone_e164'), 'user', ['phone_e164'],
+                    unique=True)
+
+    op.create_table('user_daily_activity',
+                    sa.Column('activity_id', sa.Integer(), nullable=False),
+                    sa.Column('user_id', sa.Integer(), nullable=False),
+                    sa.Column('activity_date', sa.Date(), nullable=False),
+                    sa.Column('reminders_sent', sa.Integer(),
+                              nullable=False),
+                    sa.Column('saves_recorded', sa.Integer(),
+                              nullable=False),
+                    sa.ForeignKeyConstraint(['user_id'], ['user.user_id'], ),
+                    sa.PrimaryKeyConstraint('activity_id'),
+                    sa.UniqueConstraint('user_id', 'activity_date',
+                                        name='uq_user_daily_activity_'
+                                             'user_date')
+                    )
+
+
+def downgrade():
+    op.drop_table('user_daily_activity')
+    op.drop_index(op.f('ix_user_phone_e164'), table_name='user')
+    op.drop_column('user', 'phone_e164')
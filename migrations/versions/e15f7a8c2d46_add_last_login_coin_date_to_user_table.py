@@ -0,0 +1,31 @@
+"""add last_login_coin_date to user table
+
+Revision ID: e15f7a8c2d46
+Revises: d9a2b6e3f5c8
+Create Date: 2020-06-01 09:37:12.085731
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e15f7a8c2d46'
+down_revision = 'd9a2b6e3f5c8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('user', sa.Column('last_login_coin_date', sa.Date(),
+                                    nullable=True))
+    op.execute("""
+        UPDATE "user" SET last_login_coin_date = (
+            SELECT max(coin.log_date) FROM coin
+            WHERE coin.user_id = "user".user_id
+              AND coin.description IN ('login', 'registration'))
+    """)
+
+
+def downgrade():
+    op.drop_column('user', 'last_login_coin_date')
@@ -0,0 +1,42 @@
+"""cascade deletes from plaid_items to accounts and transaction
+
+Revision ID: e4a9c3f7d1b8
+Revises: d2f8b4c61e37
+Create Date: 2020-06-15 09:32:17.480251
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4a9c3f7d1b8'
+down_revision = 'd2f8b4c61e37'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # the tables were created by db.create_all, with postgres' default
+    # constraint names
+    op.drop_constraint('accounts_plaid_id_fkey', 'accounts',
+                       type_='foreignkey')
+    op.create_foreign_key('accounts_plaid_id_fkey', 'accounts',
+                          'plaid_items', ['plaid_id'], ['plaid_item_id'],
+                          ondelete='CASCADE')
+    op.drop_constraint('transaction_account_id_fkey', 'transaction',
+                       type_='foreignkey')
+    op.create_foreign_key('transaction_account_id_fkey', 'transaction',
+                          'accounts', ['account_id'], ['account_id'],
+                          ondelete='CASCADE')
+
+
+def downgrade():
+    op.drop_constraint('transaction_account_id_fkey', 'transaction',
+                       type_='foreignkey')
+    op.create_foreign_key('transaction_account_id_fkey', 'transaction',
+                          'accounts', ['account_id'], ['account_id'])
+    op.drop_constraint('accounts_plaid_id_fkey', 'accounts',
+                       type_='foreignkey')
+    op.create_foreign_key('accounts_plaid_id_fkey', 'accounts',
+                          'plaid_items', ['plaid_id'], ['plaid_item_id'])
@@ -0,0 +1,48 @@
+"""add indexes for hot query paths
+
+Revision ID: f603b1d7e9a2
+Revises: e15f7a8c2d46
+Create Date: 2020-06-03 13:55:40.719264
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f603b1d7e9a2'
+down_revision = 'e15f7a8c2d46'
+branch_labels = None
+depends_on = None
+
+# (index name, table, columns); user.email and user.phone are already
+# indexed by their unique constraints
+INDEXES = [
+    ('ix_plaid_items_user_id', 'plaid_items', ['user_id']),
+    ('ix_accounts_user_id', 'accounts', ['user_id']),
+    ('ix_accounts_plaid_id', 'accounts', ['plaid_id']),
+    ('ix_transaction_user_id_trans_date_category_id', 'transaction',
+     ['user_id', 'trans_date', 'category_id']),
+    ('ix_transaction_account_id', 'transaction', ['account_id']),
+    ('ix_habits_user_id', 'habits', ['user_id']),
+    ('ix_coin_user_id_description_log_date', 'coin',
+     ['user_id', 'description', 'log_date']),
+    ('ix_lottery_start_date_end_date', 'lottery',
+     ['start_date', 'end_date']),
+    ('ix_lottery_winner_user_id_end_date', 'lottery',
+     ['winner_user_id', 'end_date']),
+    ('ix_user_lottery_log_user_id_lottery_id', 'user_lottery_log',
+     ['user_id', 'lottery_id']),
+    ('ix_user_lottery_log_lottery_id_user_id', 'user_lottery_log',
+     ['lottery_id', 'user_id']),
+]
+
+
+def upgrade():
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns, unique=False)
+
+
+def downgrade():
+    for name, table, columns in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
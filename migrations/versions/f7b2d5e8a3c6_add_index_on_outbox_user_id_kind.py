@@ -0,0 +1,25 @@
+"""add index on outbox user_id and kind
+
+Revision ID: f7b2d5e8a3c6
+Revises: e4a9c3f7d1b8
+Create Date: 2020-06-17 14:08:51.203377
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f7b2d5e8a3c6'
+down_revision = 'e4a9c3f7d1b8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_outbox_user_id_kind', 'outbox', ['user_id', 'kind'],
+                    unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_outbox_user_id_kind', table_name='outbox')
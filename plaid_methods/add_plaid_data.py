@@ -1,5 +1,10 @@
 from app import db, classes
-from datetime import datetime
+from datetime import date
+from scripts.daily_spending import record_spending
+from scripts.fragment_cache import graph_cache
+
+# rows per INSERT statement when ingesting Plaid data
+CHUNK_SIZE = 1000
 
 
 def add_accounts(accounts, user, plaid_item, commit=True):
@@ -13,15 +18,18 @@ def add_accounts(accounts, user, plaid_item, commit=True):
     :param commit: If commit is True then commits transactions the add to the
     database
     """
-
-    for account in accounts:
-        acc = classes.Accounts(account_plaid_id=account['account_id'],
-                               account_name=account['name'],
-                               account_type=account['type'],
-                               account_subtype=account['subtype'],
-                               user=user,
-                               plaid_item=plaid_item)
-        db.session.add(acc)
+    if user.id is None or plaid_item.id is None:
+        db.session.flush()
+    rows = [{"account_plaid_id": account['account_id'],
+             "account_name": account['name'],
+             "account_type": account['type'],
+             "account_subtype": account['subtype'],
+             "user_id": user.id,
+             "plaid_id": plaid_item.id}
+            for account in accounts]
+    insert_rows(classes.Accounts.__table__, rows)
+    db.session.expire(user, ["accounts"])
+    db.session.expire(plaid_item, ["accounts"])
     if commit is True:
         db.session.commit()
 
@@ -37,33 +45,65 @@ def add_transactions(transactions, user, account, commit=True):
     :param commit: If commit is True then commits transactions the add to the
     database
     """
+    if user.id is None or (account is not None and account.id is None):
+        db.session.flush()
+    rows = transaction_rows(transactions, user.id,
+                            account.id if account is not None else None)
+    insert_rows(classes.Transaction.__table__, rows)
+    record_spending(user.id, [(row["trans_date"], row["category_id"],
+                               row["trans_amount"]) for row in rows])
+    db.session.expire(user, ["transaction"])
+    if account is not None:
+        db.session.expire(account, ["transaction"])
+    if commit is True:
+        db.session.commit()
+    graph_cache.invalidate_user(user.id)
 
+
+def transaction_rows(transactions, user_id, account_id):
+    """
+    Convert transactions data from plaid api to transaction table rows
+    :param transactions: transactions data from plaid api
+    :param user_id: id of the user associated with the transactions
+    :param account_id: id of the account associated with the transactions
+    """
+    rows = []
+    append = rows.append
     for transaction in transactions:
         loc = transaction['location']
-        categories = ';'.join(transaction['category'])
-        trans = classes.Transaction(user=user,
-                                    account=account,
-                                    trans_date=parse_date(transaction['date']),
-                                    post_date=parse_date(
-                                        transaction['authorized_date']),
-                                    trans_amount=transaction['amount'],
-                                    merchant_category=categories,
-                                    merchant_address=loc['address'],
-                                    merchant_city=loc['city'],
-                                    merchant_state=loc['region'],
-                                    merchant_country=loc['country'],
-                                    merchant_postal_code=loc['postal_code'],
-                                    merchant_longitude=loc['lon'],
-                                    merchant_latitude=loc['lat'],
-                                    category_id=transaction['category_id']
-                                    )
-        db.session.add(trans)
-    if commit is True:
-        db.session.commit()
+        append({"user_id": user_id,
+                "account_id": account_id,
+                "trans_date": parse_date(transaction['date']),
+                "post_date": parse_date(transaction['authorized_date']),
+                "trans_amount": transaction['amount'],
+                "merchant_category": ';'.join(transaction['category']),
+                "merchant_address": loc['address'],
+                "merchant_city": loc['city'],
+                "merchant_state": loc['region'],
+                "merchant_country": loc['country'],
+                "merchant_postal_code": loc['postal_code'],
+                "merchant_longitude": loc['lon'],
+                "merchant_latitude": loc['lat'],
+                "category_id": transaction['category_id'],
+                "plaid_transaction_id": transaction.get('transaction_id'),
+                "pending": bool(transaction.get('pending', False))})
+    return rows
+
+
+def insert_rows(table, rows, chunk_size=CHUNK_SIZE):
+    """
+    Insert rows into table with one executemany per chunk of rows
+    (multi-row INSERT ... VALUES on Postgres, see config.py)
+    """
+    for start in range(0, len(rows), chunk_size):
+        db.session.execute(table.insert(), rows[start:start + chunk_size])
 
 
 def parse_date(date_string):
-    try:
-        return datetime.strptime(date_string, "%Y-%m-%d")
-    except TypeError:
+    """
+    Return the date of a "YYYY-MM-DD" string, or None
+    """
+    if date_string is None:
         return None
+    return date(int(date_string[0:4]), int(date_string[5:7]),
+                int(date_string[8:10]))
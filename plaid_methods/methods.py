@@ -2,14 +2,19 @@ import plaid
 from plaid.errors import APIError, ItemError, PlaidError
 import requests
 
-import os
+from concurrent.futures import ThreadPoolExecutor
 from typing import List
-import time
+
+# transactions per Transactions.get page (plaid allows up to 500)
+PAGE_SIZE = 500
+# pages of one transactions fetch requested concurrently
+FETCH_CONCURRENCY = 4
 
 
 def get_transactions(
     client: plaid.Client, start_date: str, end_date: str,
-    access_token: str, account_id: str
+    access_token: str, account_id: str, page_size: int = PAGE_SIZE,
+    concurrency: int = FETCH_CONCURRENCY, on_page=None
 ) -> List[dict]:
     """
     Returns transactions associated with access_token
@@ -28,39 +33,77 @@ def get_transactions(
     :param [access_token]:  access token to use to retrieve transactions
     :type [access_token]: [string]
 
-    :param [account_id]:  account id of the transactions you want to retrieve
-    :type [account_id]:[list[string]]
+    :param [account_id]:  account id, or list of account ids, of the
+                          transactions you want to retrieve
+    :type [account_id]:[string or list[string]]
+
+    :param [page_size]:  number of transactions requested per page
+    :type [page_size]: [int]
+
+    :param [concurrency]:  maximum number of pages requested at once
+    :type [concurrency]: [int]
+
+    :param [on_page]:  called with the transactions of each page fetched,
+                       in offset order
+    :type [on_page]: [callable]
+
+    The first page gives the total number of transactions; the remaining
+    pages are then fetched concurrently and each is stored at its offset.
+    Positions left empty by pages that came back short are refetched,
+    and a transaction returned twice, e.g. when paging shifted, is only
+    kept once.
     """
-    timeout = 5
-    while True:
-        try:
-            response = client.Transactions.get(
-                access_token, start_date=start_date, end_date=end_date,
-                account_ids=[account_id]
-            )
-
-            transactions = response["transactions"]
-
-            while len(transactions) < response["total_transactions"]:
-                response = client.Transactions.get(
-                    access_token,
-                    start_date=start_date,
-                    end_date=end_date,
-                    offset=len(transactions),
-                    account_ids=[account_id]
-                )
-                transactions.extend(response["transactions"])
-            break
-        except ItemError as e:
-            if e.code == "NO_PRODUCT_READY":
-                if timeout == 0:
-                    return e.code
-                else:
-                    time.sleep(.5)
-                    timeout = timeout - 1
-
-        except APIError as e:
-            return e.code
+    account_ids = [account_id] if isinstance(account_id, str) \
+        else list(account_id)
+    # position in the result -> transaction
+    fetched = {}
+
+    def get_page(offset):
+        return client.Transactions.get(
+            access_token, start_date=start_date, end_date=end_date,
+            account_ids=account_ids, count=page_size, offset=offset
+        )
+
+    def store(offset, page):
+        for position, transaction in enumerate(page, offset):
+            fetched.setdefault(position, transaction)
+        if on_page is not None:
+            on_page(page)
+
+    try:
+        response = get_page(0)
+        total = response["total_transactions"]
+        store(0, response["transactions"])
+
+        offsets = range(len(fetched), total, page_size)
+        if len(offsets) > 1 and concurrency > 1:
+            with ThreadPoolExecutor(
+                    min(concurrency, len(offsets))) as pool:
+                for offset, page in zip(offsets,
+                                        pool.map(get_page, offsets)):
+                    store(offset, page["transactions"])
+
+        # serial pass over the gaps, e.g. after a page that came up short
+        position = 0
+        while position < total:
+            if position in fetched:
+                position += 1
+                continue
+            page = get_page(position)["transactions"]
+            if not page:
+                break
+            store(position, page)
+    except (ItemError, APIError) as e:
+        # PRODUCT_NOT_READY included: the caller retries later, or waits
+        # for the item's INITIAL_UPDATE / HISTORICAL_UPDATE webhook
+        return e.code
+
+    transactions, seen = [], set()
+    for position in sorted(fetched):
+        transaction = fetched[position]
+        if transaction["transaction_id"] not in seen:
+            seen.add(transaction["transaction_id"])
+            transactions.append(transaction)
     return transactions
 
 
@@ -0,0 +1,242 @@
+"""
+Incremental sync of Plaid transactions into the transaction table.
+
+Each account remembers the date of the latest posted transaction synced
+(accounts.synced_through). A sync only asks Plaid for the transactions
+from SYNC_OVERLAP_DAYS before that date, the window in which pending
+transactions may still post or be dropped, and upserts them by
+transaction.plaid_transaction_id:
+
+* transactions already stored are updated if Plaid changed them,
+* a posted transaction that replaces a stored pending one (Plaid's
+  pending_transaction_id) updates that row in place,
+* pending transactions in the window that Plaid no longer returns are
+  deleted,
+* everything else is inserted.
+
+The daily_spending rollup is updated with the net change.
+"""
+
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from sqlalchemy import and_, bindparam
+
+from app import application, classes, db
+from plaid_methods.add_plaid_data import insert_rows, parse_date, \
+    transaction_rows
+from plaid_methods.methods import get_transactions
+from scripts.daily_activity import local_today
+from scripts.daily_spending import apply_spending, spending_deltas
+from scripts.fragment_cache import graph_cache
+
+SYNC_OVERLAP_DAYS = 14
+# size of the IN lists used to look transactions up by plaid id
+LOOKUP_CHUNK_SIZE = 1000
+
+# columns compared, and rewritten, when a stored transaction is updated
+SYNC_COLUMNS = ["trans_date", "post_date", "trans_amount", "category_id",
+                "merchant_category", "pending", "plaid_transaction_id"]
+
+
+def _normalize(column, value):
+    if value is None:
+        return None
+    if column == "trans_amount":
+        return Decimal(str(value)).quantize(Decimal("0.01"))
+    if column == "category_id":
+        return int(value)
+    if column == "pending":
+        return bool(value)
+    return value
+
+
+def _changed(stored, row):
+    return any(_normalize(column, stored[column]) !=
+               _normalize(column, row[column]) for column in SYNC_COLUMNS)
+
+
+def stored_transactions(plaid_ids):
+    """Return {plaid_transaction_id: row} of the stored transactions with
+    one of plaid_ids"""
+    table = classes.Transaction.__table__
+    columns = [table.c.transaction_id, table.c.user_id] + \
+        [table.c[column] for column in SYNC_COLUMNS]
+    plaid_ids = sorted(plaid_ids)
+    stored = {}
+    for start in range(0, len(plaid_ids), LOOKUP_CHUNK_SIZE):
+        for row in db.session.execute(
+                db.select(columns).where(table.c.plaid_transaction_id.in_(
+                    plaid_ids[start:start + LOOKUP_CHUNK_SIZE]))):
+            stored[row["plaid_transaction_id"]] = dict(row)
+    return stored
+
+
+def upsert_transactions(transactions, user, account, window=None):
+    """
+    Upsert transactions from plaid api into the transaction table
+    :param transactions: transactions data from plaid api
+    :param user: User SQLAlchemy object of the user associated with the
+    transactions
+    :param account: Accounts SQLAlchemy object of the user associated with the
+    transactions
+    :param window: (start date, end date) that transactions cover; pending
+    transactions of the account in the window that are not in transactions
+    are deleted
+    :return: (number inserted, number updated, number deleted)
+
+    The caller is responsible for committing the session.
+    """
+    table = classes.Transaction.__table__
+    rows = transaction_rows(transactions, user.id, account.id)
+    replaces = [transaction.get('pending_transaction_id')
+                for transaction in transactions]
+    stored = stored_transactions(
+        {row["plaid_transaction_id"] for row in rows} |
+        {plaid_id for plaid_id in replaces if plaid_id is not None})
+
+    inserts, updates, added, removed = [], [], [], []
+    seen = set()
+    for row, replaced in zip(rows, replaces):
+        plaid_id = row["plaid_transaction_id"]
+        # a transaction can come twice when paging shifted; keep the first
+        if plaid_id in seen:
+            continue
+        seen.add(plaid_id)
+        old = stored.get(plaid_id)
+        if old is None and replaced is not None and replaced not in seen:
+            old = stored.get(replaced)
+            seen.add(replaced)
+        if old is None:
+            inserts.append(row)
+            added.append(row)
+        elif _changed(old, row):
+            updates.append(dict({"b_id": old["transaction_id"]},
+                                **{"u_" + column: row[column]
+                                   for column in SYNC_COLUMNS}))
+            removed.append(old)
+            added.append(row)
+
+    insert_rows(table, inserts)
+    if updates:
+        db.session.execute(
+            table.update()
+            .where(table.c.transaction_id == bindparam("b_id"))
+            .values({column: bindparam("u_" + column)
+                     for column in SYNC_COLUMNS}),
+            updates)
+
+    deleted = []
+    if window is not None:
+        start, end = window
+        pending = db.session.execute(
+            db.select([table.c.transaction_id, table.c.user_id,
+                       table.c.trans_date, table.c.category_id,
+                       table.c.trans_amount, table.c.plaid_transaction_id])
+            .where(and_(table.c.account_id == account.id,
+                        table.c.pending.is_(True),
+                        table.c.trans_date >= start,
+                        table.c.trans_date <= end)))
+        deleted = [dict(row) for row in pending
+                   if row["plaid_transaction_id"] not in seen]
+        if deleted:
+            db.session.execute(table.delete().where(
+                table.c.transaction_id.in_(
+                    [row["transaction_id"] for row in deleted])))
+        removed.extend(deleted)
+
+    deltas = spending_deltas(
+        (user.id, row["trans_date"], row["category_id"], 1,
+         row["trans_amount"]) for row in added)
+    for key, (count, amount) in spending_deltas(
+            ((user.id, row["trans_date"], row["category_id"], 1,
+              row["trans_amount"]) for row in removed), sign=-1).items():
+        deltas[key][0] += count
+        deltas[key][1] += amount
+    apply_spending(deltas)
+
+    db.session.expire(user, ["transaction"])
+    db.session.expire(account, ["transaction"])
+    if added or removed:
+        graph_cache.invalidate_user(user.id)
+    return len(inserts), len(updates), len(deleted)
+
+
+def sync_window(account, end_date=None, full=False):
+    """Return the (start date, end date) to ask Plaid for, from
+    PLAID_SYNC_START for a full sync"""
+    if end_date is None:
+        end_date = local_today()
+    if account.synced_through is None or full:
+        start_date = parse_date(application.config["PLAID_SYNC_START"])
+    else:
+        start_date = account.synced_through - \
+            timedelta(days=SYNC_OVERLAP_DAYS)
+    return start_date, end_date
+
+
+def sync_item(client, plaid_item, accounts, end_date=None, on_page=None,
+              full=False):
+    """
+    Fetch and upsert the new or changed transactions of accounts of one
+    plaid item, with a single paged fetch for all of them
+    :param client: plaid client object
+    :param plaid_item: PlaidItems SQLAlchemy object the accounts belong to
+    :param accounts: Accounts SQLAlchemy objects to sync
+    :param end_date: last date to sync, defaults to today
+    :param on_page: called with the transactions of each page fetched
+    :param full: if True, sync the whole history rather than the
+    transactions since accounts.synced_through
+    :return: {account id: (number inserted, number updated, number
+    deleted)}, or the plaid error code if the transactions could not be
+    fetched
+    """
+    if not accounts:
+        return {}
+    windows = [sync_window(account, end_date, full) for account in accounts]
+    start_date = min(start for start, _ in windows)
+    end_date = windows[0][1]
+    transactions = get_transactions(
+        client, start_date.isoformat(), end_date.isoformat(),
+        access_token=plaid_item.access_token,
+        account_id=[account.account_plaid_id for account in accounts],
+        page_size=application.config["PLAID_PAGE_SIZE"],
+        concurrency=application.config["PLAID_FETCH_CONCURRENCY"],
+        on_page=on_page)
+    if isinstance(transactions, str):
+        return transactions
+
+    by_account = {account.account_plaid_id: [] for account in accounts}
+    for transaction in transactions:
+        by_account[transaction['account_id']].append(transaction)
+
+    counts = {}
+    for account in accounts:
+        account_transactions = by_account[account.account_plaid_id]
+        counts[account.id] = upsert_transactions(
+            account_transactions, account.user, account,
+            (start_date, end_date))
+        posted = [parse_date(transaction['date'])
+                  for transaction in account_transactions
+                  if not transaction.get('pending', False)]
+        if posted and (account.synced_through is None or
+                       max(posted) > account.synced_through):
+            account.synced_through = max(posted)
+        account.last_synced_at = datetime.utcnow()
+    db.session.commit()
+    return counts
+
+
+def sync_account(client, account, end_date=None):
+    """
+    Fetch and upsert the new or changed transactions of an account
+    :param client: plaid client object
+    :param account: Accounts SQLAlchemy object
+    :param end_date: last date to sync, defaults to today
+    :return: (number inserted, number updated, number deleted), or the
+    plaid error code if the transactions could not be fetched
+    """
+    counts = sync_item(client, account.plaid_item, [account], end_date)
+    if isinstance(counts, str):
+        return counts
+    return counts[account.id]
@@ -0,0 +1,85 @@
+"""
+Set-based deletion of a linked bank account, including delete_account.
+
+The account's transactions are deleted chunk_size rows at a time, each
+chunk with one DELETE statement and its own commit, so the locks taken
+on the transaction and daily_spending tables stay short however long
+the account's history is. The final transaction locks the account row,
+which makes a concurrent sync writing to the account wait, takes any
+transactions inserted since the last chunk out of the rollup and
+deletes them, then deletes the account, and the plaid item once its
+last account is gone. The foreign keys plaid_items -> accounts ->
+transaction also cascade on delete.
+
+Unlinking the item at Plaid is left to the caller, after the deletion
+is committed, so no database transaction waits on the network.
+"""
+
+from app import classes, db
+from scripts.daily_spending import remove_account_spending
+
+DELETE_CHUNK_SIZE = 5000
+
+
+def account_transactions_query(account_id, chunk_size):
+    """Return the query of the ids of an account's first chunk_size
+    transactions"""
+    transaction = classes.Transaction
+    return db.session.query(transaction.id) \
+        .filter(transaction.account_id == account_id) \
+        .order_by(transaction.id) \
+        .limit(chunk_size)
+
+
+def item_accounts_query(plaid_item_id):
+    """Return the query of the accounts of a plaid item"""
+    return classes.Accounts.query.filter_by(plaid_id=plaid_item_id)
+
+
+def delete_account(account, chunk_size=DELETE_CHUNK_SIZE):
+    """Delete an account, its transactions and their spending rollup.
+
+    The plaid item is deleted too if the account was its last one.
+    Commits the session. Returns the access token of the deleted plaid
+    item, to be removed at Plaid by the caller, or None.
+    """
+    account_id = account.id
+    plaid_item_id = account.plaid_id
+    transaction = classes.Transaction
+
+    while True:
+        transaction_ids = [transaction_id for transaction_id, in
+                           account_transactions_query(account_id,
+                                                      chunk_size)]
+        if not transaction_ids:
+            break
+        remove_account_spending(account_id, transaction_ids)
+        transaction.query.filter(transaction.id.in_(transaction_ids)) \
+            .delete(synchronize_session=False)
+        db.session.commit()
+
+    # inserting a transaction locks the account row it references, so
+    # once this lock is held no sync can add rows to the account
+    if classes.Accounts.query.filter_by(id=account_id) \
+            .with_for_update().first() is None:
+        db.session.rollback()
+        return None
+    remove_account_spending(account_id)
+    transaction.query.filter_by(account_id=account_id) \
+        .delete(synchronize_session=False)
+
+    accounts_of_item = item_accounts_query(plaid_item_id).count()
+    classes.Accounts.query.filter_by(id=account_id) \
+        .delete(synchronize_session=False)
+
+    access_token = None
+    # if only account associated with plaid id delete plaid id
+    if plaid_item_id is not None and accounts_of_item == 1:
+        plaid_item = classes.PlaidItems.query.get(plaid_item_id)
+        access_token = plaid_item.access_token
+        classes.IngestJob.query.filter_by(plaid_item_id=plaid_item_id) \
+            .delete(synchronize_session=False)
+        classes.PlaidItems.query.filter_by(id=plaid_item_id) \
+            .delete(synchronize_session=False)
+    db.session.commit()
+    return access_token
@@ -0,0 +1,108 @@
+"""
+Registry of the Plaid category taxonomy in scripts/categories.json and of
+the habit buckets built from it.
+
+The file is parsed once per process by get_registry. Category ids are kept
+as strings, as Plaid returns them, and every lookup table is immutable so
+the registry can be shared by all requests.
+"""
+
+import json
+import os
+from functools import lru_cache
+from types import MappingProxyType
+
+CATEGORIES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                               "categories.json")
+
+# habit name -> (hierarchy prefixes included, category ids included,
+#                category ids excluded)
+HABITS = {
+    "coffee": ((),
+               ("13005047",  # Cafe
+                "13005043",  # Coffee Shop
+                ),
+               ()),
+    "lunch": ((("Food and Drink", "Restaurants"), ),
+              (),
+              ("13005001",  # Winery
+               "13005019",  # Juice Bar
+               "13005024",  # Ice Cream
+               "13005037",  # Distillery
+               "13005043",  # Coffee Shop
+               "13005047",  # Cafe
+               )),
+    "transportation": ((),
+                       ("22016000",  # Taxi
+                        "22011000",  # Limos and Chauffeurs
+                        "22006001",  # Ride Share
+                        ),
+                       ()),
+}
+
+
+class CategoryRegistry:
+    """
+    Immutable lookup tables over the Plaid categories
+
+    hierarchy: category id -> tuple of category names
+    prefixes: hierarchy prefix tuple -> frozenset of the category ids
+              under it, e.g. ("Food and Drink", "Restaurants")
+    habit_ids: habit name -> frozenset of category ids
+    habit_of: category id -> habit name, for ids in a habit bucket
+    """
+
+    def __init__(self, categories, habits=HABITS):
+        """
+
+        :param categories: list of {"category_id", "hierarchy"} dictionaries
+        :param habits: habit definitions, see HABITS
+        """
+        hierarchy = {}
+        prefixes = {}
+        for category in categories:
+            path = tuple(category["hierarchy"])
+            hierarchy[category["category_id"]] = path
+            for i in range(1, len(path) + 1):
+                prefixes.setdefault(path[:i], set()).add(
+                    category["category_id"])
+        self.hierarchy = MappingProxyType(hierarchy)
+        self.prefixes = MappingProxyType(
+            {prefix: frozenset(ids) for prefix, ids in prefixes.items()})
+
+        habit_ids = {}
+        habit_of = {}
+        for habit_name, (included, ids, excluded) in habits.items():
+            bucket = set(ids)
+            for prefix in included:
+                bucket |= self.under(*prefix)
+            bucket = frozenset(bucket.difference(excluded))
+            habit_ids[habit_name] = bucket
+            for category_id in bucket:
+                if category_id in habit_of:
+                    raise ValueError(f"category {category_id} is in habits "
+                                     f"{habit_of[category_id]} and "
+                                     f"{habit_name}")
+                habit_of[category_id] = habit_name
+        self.habit_ids = MappingProxyType(habit_ids)
+        self.habit_of = MappingProxyType(habit_of)
+
+    def under(self, *names):
+        """Return the ids of the categories under a hierarchy prefix"""
+        return self.prefixes.get(tuple(names), frozenset())
+
+    def habit_category_ids(self, habit_name):
+        """Return the category ids of a habit, or None if undefined"""
+        return self.habit_ids.get(habit_name)
+
+    def habit_of_category(self, category_id):
+        """Return the habit of a category id (str or int), or None"""
+        return self.habit_of.get(str(category_id))
+
+
+@lru_cache(maxsize=None)
+def get_registry(categories_file=CATEGORIES_FILE):
+    """Return the registry of categories_file, parsed once per process"""
+    with open(categories_file) as f:
+        categories = json.load(f)["categories"]
+    return CategoryRegistry(categories)
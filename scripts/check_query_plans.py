@@ -0,0 +1,164 @@
+"""
+Check that the hot queries in app/routes.py and scripts/ use an index.
+
+Each query in HOT_QUERIES is built by the same function the application
+builds it with, and explained against the configured database, SQLite
+or Postgres. Only one-column lookups the routes and relationships make
+inline are spelled out here.
+Run it after a migration with:
+
+    python -m scripts.check_query_plans
+
+On Postgres, sequential scans are disabled for the check so that the
+planner reports an index whenever one is usable, even on small tables.
+"""
+
+import sys
+from datetime import date, datetime
+
+from app import classes, db
+from scripts.account_deletion import account_transactions_query, \
+    item_accounts_query
+from scripts.coin_transaction import available_lotteries_query, \
+    coin_log_query, lotteries_to_draw_query, lottery_entries_query, \
+    lottery_log_query
+from scripts.daily_activity import reply_counters_query
+from scripts.daily_spending import account_spending_query, \
+    rollup_keys_query
+from scripts.dashboard_summary import saving_summary_query
+from scripts.extract_habit import habit_stats_query
+from scripts.habit_schedule import due_habits_query
+from scripts.ingest_jobs import claim_job_query
+from scripts.insights_engine import daily_spending_query
+from scripts.outbox import claim_batch_query, latest_message_query
+
+USER_ID = 1
+TODAY = date(2020, 6, 3)
+NOW = datetime(2020, 6, 3, 12, 0)
+
+
+def _user_by_email():
+    # login: inline in app/routes.py
+    return classes.User.query.filter_by(email="test@test.com")
+
+
+def _user_by_phone():
+    # register: inline in app/routes.py
+    return classes.User.query.filter_by(phone="6158675309")
+
+
+def _user_habits():
+    # the user.habits relationship
+    return classes.Habits.query.filter_by(user_id=USER_ID)
+
+
+# (name, query, index names accepted in the plan or None for any index;
+# a list names several indexes that must all be read)
+HOT_QUERIES = [
+    ("coin savings", lambda: saving_summary_query(USER_ID),
+     "ix_coin_user_id_description_log_date"),
+    ("coin log", lambda: coin_log_query(USER_ID),
+     "ix_coin_user_id_description_log_date"),
+    ("habit spending",
+     lambda: habit_stats_query(USER_ID, date(2019, 10, 1),
+                               date(2019, 11, 1),
+                               ["coffee", "lunch", "transportation"]),
+     None),
+    ("daily spending",
+     lambda: daily_spending_query(USER_ID, ["coffee", "lunch"]), None),
+    ("spending rollup rows",
+     lambda: rollup_keys_query([1, 2], date(2019, 10, 1),
+                               date(2019, 11, 1)),
+     None),
+    ("account spending", lambda: account_spending_query(1),
+     "ix_transaction_account_id"),
+    ("account transactions", lambda: account_transactions_query(1, 5000),
+     "ix_transaction_account_id"),
+    ("available lotteries", lambda: available_lotteries_query(NOW),
+     "ix_lottery_start_date_end_date"),
+    ("lotteries to draw", lambda: lotteries_to_draw_query(NOW),
+     "ix_lottery_winner_user_id_end_date"),
+    ("bought lotteries", lambda: lottery_log_query(USER_ID),
+     "ix_user_lottery_log_user_id_lottery_id"),
+    ("user lottery log", lambda: lottery_log_query(USER_ID, 1),
+     ("ix_user_lottery_log_user_id_lottery_id",
+      "ix_user_lottery_log_lottery_id_user_id")),
+    ("lottery entries", lambda: lottery_entries_query([1, 2]),
+     "ix_user_lottery_log_lottery_id_user_id"),
+    ("plaid item accounts", lambda: item_accounts_query(1),
+     "ix_accounts_plaid_id"),
+    ("user by email", _user_by_email, None),
+    ("user by phone", _user_by_phone, None),
+    ("reply counters", lambda: reply_counters_query("+16158675309", TODAY),
+     ["ix_user_phone_e164",
+      ("uq_user_daily_activity_user_date",
+       "sqlite_autoindex_user_daily_activity_1")]),
+    ("due habits", lambda: due_habits_query(NOW), "ix_habits_next_fire_at"),
+    ("user habits", _user_habits, "ix_habits_user_id"),
+    ("outbox batch", lambda: claim_batch_query(NOW),
+     "ix_outbox_status_next_attempt_at"),
+    ("user verifications",
+     lambda: latest_message_query(USER_ID, "verification"),
+     "ix_outbox_user_id_kind"),
+    ("ingest job", lambda: claim_job_query(NOW),
+     "ix_ingest_job_status_next_attempt_at"),
+]
+
+
+def explain(query):
+    """Return the query plan of an ORM query as a single string"""
+    connection = db.session.connection()
+    compiled = query.statement.compile(dialect=connection.dialect)
+    if compiled.positional:
+        params = tuple(compiled.params[name]
+                       for name in compiled.positiontup)
+    else:
+        params = compiled.params
+
+    if connection.dialect.name == "sqlite":
+        rows = connection.execute("EXPLAIN QUERY PLAN " + str(compiled),
+                                  params)
+        return "\n".join(str(row[-1]) for row in rows)
+
+    connection.execute("SET LOCAL enable_seqscan = off")
+    rows = connection.execute("EXPLAIN " + str(compiled), params)
+    return "\n".join(row[0] for row in rows)
+
+
+def uses_index(plan, index_names):
+    """Return True if the plan reads through one of index_names, or
+    through any index if index_names is None. A list of index_names is
+    met if the plan reads through each of its items."""
+    if index_names is None:
+        return "INDEX" in plan.upper()
+    if isinstance(index_names, list):
+        return all(uses_index(plan, names) for names in index_names)
+    if isinstance(index_names, str):
+        index_names = (index_names, )
+    return any(name in plan for name in index_names)
+
+
+def check_query_plans():
+    """Return (name, uses expected index, plan) for every hot query"""
+    results = []
+    try:
+        for name, query, index_names in HOT_QUERIES:
+            plan = explain(query())
+            results.append((name, uses_index(plan, index_names), plan))
+    finally:
+        db.session.rollback()
+    return results
+
+
+def main():
+    failed = 0
+    for name, ok, plan in check_query_plans():
+        print(f"{'ok  ' if ok else 'FAIL'} {name}")
+        if not ok:
+            failed += 1
+            print("     " + plan.replace("\n", "\n     "))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
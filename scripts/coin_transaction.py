@@ -1,12 +1,72 @@
 """
-Helper functions for coin transactions, including add_login_coin,
-add_saving_coin, enter_lottery, and lottery_drawing.
+Helper functions for coin transactions, including record_coins,
+add_login_coin, add_saving_coin, enter_lottery, lottery_entries,
+weighted_choice, and lottery_drawing, and the queries of the coin log
+and lotteries shown on the dashboard.
 """
 
+import bisect
+import itertools
 import random
+import numpy as np
 import pytz
 from datetime import datetime
 from app import classes, db
+from scripts.daily_activity import increment_daily_activity
+from scripts.outbox import enqueue_messages
+
+# lotteries whose entries are aggregated by one query
+LOTTERY_BATCH_SIZE = 500
+# pools larger than this are drawn with NumPy
+NUMPY_THRESHOLD = 10000
+TZ = pytz.timezone("America/Los_Angeles")
+
+
+def record_coins(user, amount, description, log_date=None,
+                 conditions=(), **user_values):
+    """Add a coin transaction and apply it to the user's balance.
+
+    The balance is updated with coins = coins + amount in SQL, so
+    concurrent requests cannot lose updates, and a spend (negative amount)
+    is only applied if the balance stays non-negative. `conditions` are
+    extra SQL conditions on the user row and `user_values` extra columns
+    set on it by the same UPDATE. On Postgres the coin row is inserted by
+    the same statement, elsewhere both run in the current transaction.
+
+    Returns True if the transaction was applied. The caller is responsible
+    for committing the session.
+    """
+    if log_date is None:
+        log_date = datetime.now().astimezone(TZ).date()
+    users = classes.User.__table__
+    coins = classes.Coin.__table__
+
+    where = [users.c.user_id == user.id] + list(conditions)
+    if amount < 0:
+        where.append(users.c.coins + amount >= 0)
+    update = users.update().where(db.and_(*where)) \
+        .values(coins=users.c.coins + amount, **user_values)
+    columns = ["user_id", "coin_amount", "log_date", "description"]
+
+    if db.engine.dialect.name == "postgresql":
+        updated = update.returning(users.c.user_id).cte("updated_user")
+        insert = coins.insert().from_select(columns, db.select([
+            updated.c.user_id,
+            db.literal(amount, db.Integer),
+            db.literal(log_date, db.Date),
+            db.literal(description, db.String)]))
+        applied = db.session.execute(insert).rowcount == 1
+    else:
+        applied = db.session.execute(update).rowcount == 1
+        if applied:
+            db.session.execute(coins.insert().values(
+                user_id=user.id, coin_amount=amount, log_date=log_date,
+                description=description))
+
+    if applied:
+        # the in-memory balance is stale, reload it on next access
+        db.session.expire(user, ["coins"] + list(user_values))
+    return applied
 
 
 # update user coins when logging in
@@ -17,30 +77,23 @@ def add_login_coin(user):
     as a sign-up bonus. For regular user login, 2 coins are rewarded daily.
 
     If any changes occur, a new coin transaction will be added to coin
-    table and the coins column in user table will also be updated.
+    table and the coins and last_login_coin_date columns in user table
+    will also be updated.
     """
-    login_coin_date = db.session.query(db.func.max(classes.Coin.log_date)) \
-        .filter(classes.Coin.user == user,
-                classes.Coin.description.in_(["login", "registration"])) \
-        .scalar()
-    tz = pytz.timezone("America/Los_Angeles")
-
-    if login_coin_date is None:  # first time login
-        coin_amount = 10
-        description = "registration"
-    elif (datetime.now().astimezone(tz).date() - login_coin_date).days > 0:
-        # daily login
-        coin_amount = 2
-        description = "login"
-    else:
-        return
+    today = datetime.now().astimezone(TZ).date()
+    last_date = classes.User.last_login_coin_date
 
-    new_coin = classes.Coin(user=user, coin_amount=coin_amount,
-                            log_date=datetime.now().astimezone(tz).date(),
-                            description=description)
-    user.coins += coin_amount
-    db.session.add(new_coin)
+    if user.last_login_coin_date is None:  # first time login
+        applied = record_coins(user, 10, "registration", today,
+                               [last_date.is_(None)],
+                               last_login_coin_date=today)
+    elif user.last_login_coin_date < today:  # daily login
+        applied = record_coins(user, 2, "login", today, [last_date < today],
+                               last_login_coin_date=today)
+    else:
+        return False
     db.session.commit()
+    return applied
 
 
 # helper function to update user coins when replying "yes" to saving texts
@@ -48,78 +101,162 @@ def add_saving_coin(user):
     """Update user coins when replying "yes" to saving texts.
 
     When the user replies "yes" to saving text messages, 10 coins will be
-    added. A new coin transaction will be added to coin table and the coins
-    column in user table will also be updated.
+    added. A new coin transaction will be added to coin table, the coins
+    column in user table will also be updated, and the saving is counted
+    in the user's daily activity.
     """
-    tz = pytz.timezone("America/Los_Angeles")
-    new_coin = classes.Coin(user=user, coin_amount=10,
-                            log_date=datetime.now().astimezone(tz).date(),
-                            description="saving")
-    user.coins += 10
-    db.session.add(new_coin)
+    today = datetime.now().astimezone(TZ).date()
+    record_coins(user, 10, "saving", today)
+    increment_daily_activity("saves_recorded", [user.id], today)
     db.session.commit()
 
 
+def coin_log_query(user_id, limit=6):
+    """Return the query of a user's latest coin transactions"""
+    return classes.Coin.query.filter_by(user_id=user_id) \
+        .order_by(classes.Coin.id.desc()).limit(limit)
+
+
+def available_lotteries_query(now):
+    """Return the query of lotteries open at `now`"""
+    return classes.Lottery.query.filter(classes.Lottery.start_date <= now,
+                                        classes.Lottery.end_date >= now)
+
+
+def lottery_log_query(user_id, lottery_id=None):
+    """Return the query of a user's lottery entries, or of their entries
+    to one lottery"""
+    query = classes.UserLotteryLog.query.filter_by(user_id=user_id)
+    if lottery_id is not None:
+        query = query.filter_by(lottery_id=lottery_id)
+    return query
+
+
 # helper function to update user coins when entering a lottery
 def enter_lottery(user, lottery):
     """Update user coins when buying an entry to a lottery.
 
     When the user buys an entry to a lottery, coins corresponding to the
     lottery cost will be deducted from the total number of coins that the
-    user has.
+    user has, unless the user does not have enough coins.
 
     A new coin transaction will be added to coin table and the coins column
     in user table will also be updated. The user_lottery_log table will also
-    be updated.
+    be updated. Returns False if the user does not have enough coins.
     """
+    if not record_coins(user, -lottery.cost, "lottery"):
+        return False
+
     # check if the user has bought the lottery before
-    lottery_log = classes.UserLotteryLog.query.filter_by(
-        user=user, lottery=lottery).first()
-    if lottery_log:
-        lottery_log.entries += 1
-    else:  # the user buys the lottery for the first time
-        new_lottery_log = classes.UserLotteryLog(user=user, lottery=lottery)
-        db.session.add(new_lottery_log)
-
-    # update the user's coins
-    tz = pytz.timezone("America/Los_Angeles")
-    new_coin = classes.Coin(user=user, coin_amount=-lottery.cost,
-                            log_date=datetime.now().astimezone(tz).date(),
-                            description="lottery")
-    user.coins -= lottery.cost
-    db.session.add(new_coin)
+    log = classes.UserLotteryLog
+    updated = lottery_log_query(user.id, lottery.id) \
+        .update({log.entries: log.entries + 1}, synchronize_session=False)
+    if not updated:  # the user buys the lottery for the first time
+        db.session.add(log(user_id=user.id, lottery_id=lottery.id))
     db.session.commit()
+    return True
+
+
+# lottery drawing helpers
+def lottery_entries_query(lottery_ids):
+    """Return the query of (lottery_id, user_id, entries) rows of
+    lotteries, summed per user, ordered by lottery and user"""
+    log = classes.UserLotteryLog
+    return db.session.query(log.lottery_id, log.user_id,
+                            db.func.sum(log.entries)) \
+        .filter(log.lottery_id.in_(lottery_ids)) \
+        .group_by(log.lottery_id, log.user_id) \
+        .order_by(log.lottery_id, log.user_id)
+
+
+def lotteries_to_draw_query(now):
+    """Return the query of lotteries ended by `now` without a winner"""
+    return classes.Lottery.query.filter(
+        classes.Lottery.winner_user_id.is_(None),
+        classes.Lottery.end_date <= now)
+
+
+def lottery_entries(lottery_ids):
+    """Return {lottery_id: ([user_id, ...], [entries, ...])}.
+
+    Entries are summed per user in the database, with one query per
+    batch of LOTTERY_BATCH_SIZE lotteries.
+    """
+    pools = {}
+    for start in range(0, len(lottery_ids), LOTTERY_BATCH_SIZE):
+        batch = lottery_ids[start:start + LOTTERY_BATCH_SIZE]
+        for lottery_id, user_id, entries in lottery_entries_query(batch):
+            user_ids, weights = pools.setdefault(lottery_id, ([], []))
+            user_ids.append(user_id)
+            weights.append(int(entries))
+    return pools
+
+
+def weighted_choice(user_ids, weights, rng):
+    """Pick a user id with probability proportional to its weight.
+
+    A single random integer below the total weight is drawn from `rng`
+    and located in the cumulative sums with a binary search, so the cost
+    is O(participants) whatever the number of entries. Pools with more
+    than NUMPY_THRESHOLD participants are summed and searched with NumPy.
+    """
+    if len(user_ids) > NUMPY_THRESHOLD:
+        cumulative = np.cumsum(np.asarray(weights, dtype=np.int64))
+        pick = rng.randrange(int(cumulative[-1]))
+        return user_ids[int(np.searchsorted(cumulative, pick,
+                                            side="right"))]
+    cumulative = list(itertools.accumulate(weights))
+    pick = rng.randrange(cumulative[-1])
+    return user_ids[bisect.bisect_right(cumulative, pick)]
 
 
 # lottery drawing function
-def lottery_drawing():
+def lottery_drawing(seed=None):
     """Draw the winner for lotteries that have ended.
 
     First check which lotteries have ended without the winner drawn.
-    Then choose the winner, send message to the winner, and update
-    the lottery table.
+    Then choose the winner, update the lottery table, and queue a message
+    to the winner in the outbox. The winner is only written if the
+    lottery still has none, so when two drawings overlap only the one
+    that claims the lottery sends the message.
+
+    Winners are drawn with a cryptographically secure generator unless a
+    seed is given, in which case the draw is reproducible.
     """
-    tz = pytz.timezone("America/Los_Angeles")
-    current_time = datetime.now().astimezone(tz)
-    lottery_to_draw = classes.Lottery.query.filter(
-        classes.Lottery.winner_user_id.is_(None),
-        classes.Lottery.end_date <= str(current_time)).all()
+    rng = random.SystemRandom() if seed is None else random.Random(seed)
+    current_time = datetime.now().astimezone(TZ)
+    lottery_to_draw = lotteries_to_draw_query(str(current_time)).all()
 
+    pools = lottery_entries([lottery.id for lottery in lottery_to_draw])
+    lotteries = classes.Lottery.__table__
+    winners = []
     for lottery in lottery_to_draw:
-        participants = classes.UserLotteryLog.query.filter_by(
-            lottery=lottery).all()
-        participants = [p.user_id for p in participants
-                        for _ in range(p.entries)]
-
-        if participants:
-            lottery.winner_user_id = winner = random.choice(participants)
-            # send message to the winner
-            body = f"Congratulations! You've won the lottery for " \
-                   + f"{lottery.lottery_name}!"
-            twilio_client.messages.create(
-                body=body,
-                to=classes.User.query.filter_by(id=winner).first().phone,
-                from_="+16462573594")
+        if lottery.id in pools:
+            winner_user_id = weighted_choice(*pools[lottery.id], rng)
         else:
-            lottery.winner_user_id = -1
+            winner_user_id = -1
+        # claim the lottery, unless an overlapping drawing already did
+        claimed = db.session.execute(
+            lotteries.update()
+            .where(db.and_(lotteries.c.lottery_id == lottery.id,
+                           lotteries.c.winner_user_id.is_(None)))
+            .values(winner_user_id=winner_user_id)).rowcount == 1
+        if claimed and winner_user_id != -1:
+            winners.append((lottery, winner_user_id))
+        db.session.expire(lottery, ["winner_user_id"])
+
+    phones = dict(classes.User.query
+                  .with_entities(classes.User.id, classes.User.phone_e164)
+                  .filter(classes.User.id.in_(
+                      {winner_user_id for _, winner_user_id in winners}))) \
+        if winners else {}
+
+    # message to the winners
+    enqueue_messages([classes.Outbox(
+        user_id=winner_user_id, kind="lottery",
+        to_phone=phones[winner_user_id],
+        body=f"Congratulations! You've won the lottery for "
+             f"{lottery.lottery_name}!",
+        idempotency_key=f"lottery:{lottery.id}")
+        for lottery, winner_user_id in winners])
     db.session.commit()
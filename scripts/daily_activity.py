@@ -0,0 +1,89 @@
+"""
+Helper functions for the per-user daily counters in user_daily_activity,
+including local_today, increment_daily_activity and reply_counters_query.
+
+The counters let the SMS webhook check how many reminders a user got and
+how many savings they recorded today with one indexed read, instead of
+walking the user's habits and coin history.
+"""
+
+import pytz
+from collections import Counter
+from datetime import datetime
+from sqlalchemy.dialects import postgresql
+from app import classes, db
+
+TZ = pytz.timezone("America/Los_Angeles")
+
+
+def local_today():
+    """Return today's date in local (Los Angeles) time"""
+    return datetime.now().astimezone(TZ).date()
+
+
+def reply_counters_query(phone_e164, activity_date):
+    """Return the query of (user, reminders_sent, saves_recorded) of the
+    user with an E.164 phone number, counters None if the user has no
+    activity on activity_date"""
+    activity = classes.UserDailyActivity
+    return db.session.query(classes.User, activity.reminders_sent,
+                            activity.saves_recorded) \
+        .outerjoin(activity,
+                   (activity.user_id == classes.User.id) &
+                   (activity.activity_date == activity_date)) \
+        .filter(classes.User.phone_e164 == phone_e164)
+
+
+def increment_daily_activity(column, user_ids, activity_date=None):
+    """Add 1 to `column` of each user's row for activity_date.
+
+    :param column: "reminders_sent" or "saves_recorded"
+    :param user_ids: one entry per increment, ids may repeat
+    :param activity_date: local date, defaults to today
+
+    Missing rows are created. On Postgres all rows are upserted by one
+    INSERT ... ON CONFLICT DO UPDATE, so an outbox worker and the SMS
+    webhook counting the same user's first activity of the day cannot
+    race on the unique (user_id, activity_date). The caller is
+    responsible for committing the session.
+    """
+    if activity_date is None:
+        activity_date = local_today()
+    counts = Counter(user_ids)
+    if not counts:
+        return
+    activity = classes.UserDailyActivity
+    counter = getattr(activity, column)
+
+    if db.engine.dialect.name == "postgresql":
+        table = activity.__table__
+        # rows in key order, so concurrent upserts lock them in one order
+        insert = postgresql.insert(table).values([
+            {"user_id": user_id, "activity_date": activity_date,
+             "reminders_sent": 0, "saves_recorded": 0, column: count}
+            for user_id, count in sorted(counts.items())])
+        db.session.execute(insert.on_conflict_do_update(
+            constraint="uq_user_daily_activity_user_date",
+            set_={column: table.c[column] + insert.excluded[column]}))
+        return
+
+    existing = {user_id for user_id, in db.session.query(activity.user_id)
+                .filter(activity.activity_date == activity_date,
+                        activity.user_id.in_(counts))}
+
+    by_increment = {}
+    for user_id in existing:
+        by_increment.setdefault(counts[user_id], []).append(user_id)
+    for increment, ids in by_increment.items():
+        activity.query.filter(activity.activity_date == activity_date,
+                              activity.user_id.in_(ids)) \
+            .update({counter: counter + increment},
+                    synchronize_session=False)
+
+    new_rows = [{"user_id": user_id, "activity_date": activity_date,
+                 "reminders_sent": 0, "saves_recorded": 0,
+                 column: count}
+                for user_id, count in counts.items()
+                if user_id not in existing]
+    if new_rows:
+        db.session.execute(activity.__table__.insert(), new_rows)
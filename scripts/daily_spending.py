@@ -0,0 +1,195 @@
+"""
+Helper functions for the daily_spending rollup of transactions, including
+record_spending, remove_account_spending and rebuild_daily_spending.
+
+Each row holds the number and total amount of a user's transactions on a
+day for one habit bucket, so charts and insights read O(days) rows instead
+of every transaction. The rollup is kept up to date by add_transactions
+and delete_account. Buckets come from scripts/category_registry.py;
+after changing the habit definitions, or to backfill existing data, run:
+
+    python -m scripts.daily_spending
+"""
+
+import argparse
+from collections import defaultdict
+from datetime import datetime
+from decimal import Decimal
+
+from sqlalchemy import and_, bindparam
+from sqlalchemy.dialects import postgresql
+
+from app import classes, db
+from scripts.category_registry import CATEGORIES_FILE, get_registry
+
+OTHER = "other"
+REBUILD_CHUNK_SIZE = 500
+
+
+def spending_deltas(rows, sign=1, categories_file=CATEGORIES_FILE):
+    """Return {(user_id, date, bucket): [count, amount]} for rows of
+    (user_id, date, category_id, count, amount), multiplied by sign"""
+    registry = get_registry(categories_file)
+    deltas = defaultdict(lambda: [0, Decimal(0)])
+    for user_id, spending_date, category_id, count, amount in rows:
+        bucket = registry.habit_of_category(category_id) or OTHER
+        if isinstance(spending_date, datetime):
+            spending_date = spending_date.date()
+        delta = deltas[(user_id, spending_date, bucket)]
+        delta[0] += sign * count
+        delta[1] += sign * Decimal(str(amount))
+    return deltas
+
+
+def rollup_keys_query(user_ids, first, last):
+    """Return the query of (user_id, date, bucket) of the users' rollup
+    rows from first to last, inclusive"""
+    table = classes.DailySpending.__table__
+    return db.session.query(
+        table.c.user_id, table.c.spending_date, table.c.bucket).filter(
+        table.c.user_id.in_(user_ids),
+        table.c.spending_date.between(first, last))
+
+
+def apply_spending(deltas):
+    """Add count and amount deltas to the rollup.
+
+    On Postgres all rows are upserted by one INSERT ... ON CONFLICT DO
+    UPDATE, so concurrent ingest jobs of the same user cannot race on the
+    unique (user_id, spending_date, bucket). Elsewhere existing rows are
+    updated with one executemany statement and missing rows are bulk
+    inserted. Rows left without transactions are then deleted. The
+    caller is responsible for committing the session.
+    """
+    if not deltas:
+        return
+    table = classes.DailySpending.__table__
+    user_ids = {user_id for user_id, _, _ in deltas}
+    if db.engine.dialect.name == "postgresql":
+        # rows in key order, so concurrent upserts lock them in one order
+        insert = postgresql.insert(table).values([
+            {"user_id": user_id, "spending_date": spending_date,
+             "bucket": bucket, "trans_count": count, "trans_amount": amount}
+            for (user_id, spending_date, bucket), (count, amount)
+            in sorted(deltas.items())])
+        db.session.execute(insert.on_conflict_do_update(
+            constraint="uq_daily_spending_user_date_bucket",
+            set_={"trans_count": table.c.trans_count +
+                  insert.excluded.trans_count,
+                  "trans_amount": table.c.trans_amount +
+                  insert.excluded.trans_amount}))
+        _delete_empty_rows(table, user_ids, deltas)
+        return
+
+    dates = [spending_date for _, spending_date, _ in deltas]
+    existing = set(rollup_keys_query(user_ids, min(dates), max(dates)))
+
+    updates = [{"b_user_id": user_id, "b_date": spending_date,
+                "b_bucket": bucket, "b_count": count, "b_amount": amount}
+               for (user_id, spending_date, bucket), (count, amount)
+               in deltas.items()
+               if (user_id, spending_date, bucket) in existing]
+    if updates:
+        db.session.execute(
+            table.update()
+            .where(and_(table.c.user_id == bindparam("b_user_id"),
+                        table.c.spending_date == bindparam("b_date"),
+                        table.c.bucket == bindparam("b_bucket")))
+            .values(trans_count=table.c.trans_count + bindparam("b_count"),
+                    trans_amount=table.c.trans_amount +
+                    bindparam("b_amount")),
+            updates)
+
+    inserts = [{"user_id": user_id, "spending_date": spending_date,
+                "bucket": bucket, "trans_count": count,
+                "trans_amount": amount}
+               for (user_id, spending_date, bucket), (count, amount)
+               in deltas.items()
+               if (user_id, spending_date, bucket) not in existing
+               and count > 0]
+    if inserts:
+        db.session.execute(table.insert(), inserts)
+    _delete_empty_rows(table, user_ids, deltas)
+
+
+def _delete_empty_rows(table, user_ids, deltas):
+    if any(count < 0 for count, _ in deltas.values()):
+        db.session.execute(table.delete().where(and_(
+            table.c.user_id.in_(user_ids), table.c.trans_count <= 0)))
+
+
+def record_spending(user_id, transactions):
+    """Add transactions to the rollup.
+
+    :param user_id: user id
+    :param transactions: iterable of (date, category_id, amount)
+    """
+    apply_spending(spending_deltas(
+        (user_id, trans_date, category_id, 1, amount)
+        for trans_date, category_id, amount in transactions))
+
+
+def account_spending_query(account_id, transaction_ids=None):
+    """Return the query of (user_id, date, category_id, count, amount)
+    rows of an account's transactions, or of those in transaction_ids"""
+    transaction = classes.Transaction
+    rows = db.session.query(transaction.user_id, transaction.trans_date,
+                            transaction.category_id,
+                            db.func.count(transaction.id),
+                            db.func.sum(transaction.trans_amount)) \
+        .filter(transaction.account_id == account_id)
+    if transaction_ids is not None:
+        rows = rows.filter(transaction.id.in_(transaction_ids))
+    return rows.group_by(transaction.user_id, transaction.trans_date,
+                         transaction.category_id)
+
+
+def remove_account_spending(account_id, transaction_ids=None):
+    """Remove the transactions of an account, or only those of its
+    transactions in transaction_ids, from the rollup, before they are
+    deleted"""
+    apply_spending(spending_deltas(
+        account_spending_query(account_id, transaction_ids), sign=-1))
+
+
+def rebuild_daily_spending(chunk_size=REBUILD_CHUNK_SIZE):
+    """Rebuild the rollup from the transaction table, chunk_size users at
+    a time, committing after each chunk. Returns the number of rows."""
+    user_ids = [user_id for user_id, in
+                db.session.query(classes.User.id).order_by(classes.User.id)]
+    transaction = classes.Transaction
+    table = classes.DailySpending.__table__
+    total = 0
+    for start in range(0, len(user_ids), chunk_size):
+        chunk = user_ids[start:start + chunk_size]
+        db.session.execute(table.delete().where(table.c.user_id.in_(chunk)))
+        rows = db.session.query(transaction.user_id, transaction.trans_date,
+                                transaction.category_id,
+                                db.func.count(transaction.id),
+                                db.func.sum(transaction.trans_amount)) \
+            .filter(transaction.user_id.in_(chunk)) \
+            .group_by(transaction.user_id, transaction.trans_date,
+                      transaction.category_id)
+        inserts = [{"user_id": user_id, "spending_date": spending_date,
+                    "bucket": bucket, "trans_count": count,
+                    "trans_amount": amount}
+                   for (user_id, spending_date, bucket), (count, amount)
+                   in spending_deltas(rows).items()]
+        if inserts:
+            db.session.execute(table.insert(), inserts)
+        db.session.commit()
+        total += len(inserts)
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Rebuild the daily_spending rollup")
+    parser.add_argument("--chunk-size", type=int, default=REBUILD_CHUNK_SIZE,
+                        help="number of users rebuilt per transaction")
+    args = parser.parse_args()
+    print(f"{rebuild_daily_spending(args.chunk_size)} rows")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Dashboard summary of a user's savings, computed with one SQL statement.
+
+saving_summary groups the user's "saving" coins by day in the database;
+the chart series, this-week and last-week counts and total number of
+saves are all derived from those per-day rows, so the cost of a
+dashboard render depends on the number of saving days, not on the size
+of the coin history.
+"""
+
+import pytz
+from collections import namedtuple
+from datetime import datetime
+from app import classes, db
+
+TZ = pytz.timezone("America/Los_Angeles")
+
+SavingSummary = namedtuple("SavingSummary", ["daily", "this_week",
+                                             "last_week", "num_saved"])
+SavingSummary.__doc__ = """Savings of a user.
+
+daily: [(date, coins saved that day, number of saves that day), ...]
+       ordered by date
+this_week: number of saves in the last 7 days
+last_week: number of saves 8 to 14 days ago
+num_saved: total number of saves
+"""
+
+
+def saving_summary_query(user_id):
+    """Return the query of (date, coins, number of saves) rows of a
+    user's "saving" coins, one per day, ordered by date"""
+    coin = classes.Coin
+    return db.session.query(coin.log_date,
+                            db.func.sum(coin.coin_amount),
+                            db.func.count(coin.id)) \
+        .filter(coin.user_id == user_id, coin.description == "saving") \
+        .group_by(coin.log_date) \
+        .order_by(coin.log_date)
+
+
+def saving_summary(user_id, today=None):
+    """Return the SavingSummary of a user.
+
+    :param user_id: user id
+    :param today: local date the weeks are counted from, defaults to today
+    """
+    if today is None:
+        today = datetime.now().astimezone(TZ).date()
+    daily = saving_summary_query(user_id).all()
+
+    this_week = last_week = num_saved = 0
+    for log_date, coins, count in daily:
+        days = (today - log_date).days
+        if days <= 7:
+            this_week += count
+        elif days <= 14:
+            last_week += count
+        num_saved += count
+    return SavingSummary(daily, this_week, last_week, num_saved)
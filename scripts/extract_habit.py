@@ -1,11 +1,100 @@
-import ast
 import numpy as np
-import collections
 import matplotlib
 import matplotlib.pyplot as plt
 import mpld3
+from collections import namedtuple
 from datetime import datetime
-from app import classes
+from app import classes, db
+from scripts.category_registry import CATEGORIES_FILE, get_registry
+from scripts.fragment_cache import graph_cache
+
+HabitStats = namedtuple("HabitStats", ["num", "tot_amount", "avg_amount",
+                                       "num_per_day"])
+HabitStats.__doc__ = """Spending on a habit over a period.
+
+num: number of transactions
+tot_amount: total amount spent
+avg_amount: average amount of a transaction
+num_per_day: number of transactions on each weekday, Monday first
+"""
+
+
+def _as_date(value):
+    # trans_date is a date; comparing it with a datetime drops the first
+    # day on SQLite, which compares both as strings
+    return value.date() if isinstance(value, datetime) else value
+
+
+def next_month(date):
+    """Return the first day of the month after date"""
+    return datetime(year=date.year + date.month // 12,
+                    month=date.month % 12 + 1, day=1)
+
+
+def reduction_projection(stats, window=30):
+    """Return (recommended number of purchases, yearly saving) for cutting
+    a habit by 20% over a period of `window` days"""
+    recommended = int(round(stats.num * 0.8))
+    periods_per_year = round(365 / window)
+    return recommended, round((stats.num - recommended) *
+                              periods_per_year * stats.avg_amount, 2)
+
+
+def habit_stats_query(user_id, start, end, habit_names):
+    """Return the query of (habit, weekday, count, total amount) rows of a
+    user's spending in [start, end), weekday counted from Sunday = 0"""
+    spending = classes.DailySpending
+    weekday = db.extract("dow", spending.spending_date)
+    return db.session.query(
+        spending.bucket,
+        weekday.label("weekday"),
+        db.func.sum(spending.trans_count),
+        db.func.sum(spending.trans_amount)) \
+        .filter(spending.user_id == user_id,
+                spending.spending_date >= _as_date(start),
+                spending.spending_date < _as_date(end),
+                spending.bucket.in_(habit_names)) \
+        .group_by(spending.bucket, db.text("weekday"))
+
+
+def habit_stats(user_id, start, end, categories_file=CATEGORIES_FILE,
+                habit_names=None):
+    """Return {habit name: HabitStats} of a user's spending in [start, end).
+
+    All the habits are computed by one query over the daily_spending
+    rollup grouped by (habit, weekday); habits without transactions are
+    left out.
+
+    :param user_id: user id
+    :param start: first day of the period
+    :param end: day after the period
+    :param categories_file: path of the Plaid categories json
+    :param habit_names: habits to compute, defaults to every defined habit
+    """
+    registry = get_registry(categories_file)
+    if habit_names is None:
+        habit_names = list(registry.habit_ids)
+    habit_names = [name for name in habit_names
+                   if registry.habit_category_ids(name) is not None]
+    if not habit_names:
+        return {}
+    rows = habit_stats_query(user_id, start, end, habit_names)
+
+    num_per_day = {}
+    tot_amount = {}
+    for habit_name, dow, count, amount in rows:
+        num_per_day.setdefault(habit_name, [0] * 7)[(int(dow) + 6) % 7] = \
+            int(count)
+        tot_amount[habit_name] = tot_amount.get(habit_name, 0) + \
+            float(amount)
+
+    stats = {}
+    for habit_name, counts in num_per_day.items():
+        num = sum(counts)
+        stats[habit_name] = HabitStats(
+            num, round(tot_amount[habit_name], 2),
+            round(tot_amount[habit_name] / num, 2), tuple(counts))
+    return stats
 
 
 class Insights:
@@ -14,105 +103,74 @@ class Insights:
 
     """
 
-    def __init__(self, user_id, date, categories_file, habit_name, thresh):
+    def __init__(self, user_id, date, categories_file, habit_name, thresh,
+                 stats=None):
         """
 
         :param user_id: user id
         :param date: beginning of the month to analyze
-        :param categories_file:
+        :param categories_file: path of the Plaid categories json
         :param habit_name: string
         :param thresh: int
+        :param stats: HabitStats of the month if already computed, see
+        Insights.for_user
         """
         self.user_id = user_id
         self.date = date
         self.categories_file = categories_file
         self.habit_name = habit_name
         self.thresh = thresh
-        self.transactions = self.get_habits_transactions()
-        if self.transactions is not None:
-            self.num = len(self.transactions)
-            self.tot_amount = self.total_amount(self.transactions)
-            self.avg_amount = self.average_amount(self.transactions)
-            self.recommended = int(round(self.num * 0.8))
-            self.yearly_saving = round((self.num - self.recommended) * 12 *
-                                       self.avg_amount, 2)
-            self.graph = self.num_per_day_graph(self.transactions)
-
-    @staticmethod
-    def parse_plaid_data(plaid_data):
-        """
-        Parse a string from plaid into python object
-        :param plaid_data: name of the file (str)
-        :return: list of dictionary
-        """
-        plaid_data = plaid_data.replace('\n', '')
-        data = ast.literal_eval(plaid_data)
-        return data
+        if stats is None:
+            stats = habit_stats(user_id, date, next_month(date),
+                                categories_file, [habit_name]) \
+                .get(habit_name)
+        # Not defined habit or below the threshold
+        if stats is not None and stats.num < thresh:
+            stats = None
+        self.stats = stats
+        if self.stats is not None:
+            self.num = stats.num
+            self.tot_amount = stats.tot_amount
+            self.avg_amount = stats.avg_amount
+            self.recommended, self.yearly_saving = \
+                reduction_projection(stats)
+            self.graph = graph_cache.get_or_create(
+                (self.user_id, self.habit_name, self.date.strftime("%Y-%m"),
+                 stats.num_per_day),
+                lambda: self.num_per_day_graph(stats.num_per_day))
 
-    def get_habits_transactions(self):
+    @classmethod
+    def for_user(cls, user_id, date, thresholds,
+                 categories_file=CATEGORIES_FILE):
         """
-        Return habits transactions if above the threshold and number
-        of time spent on habit.
-        Otherwise, return None.
+        Return the Insights of every habit above its threshold, computed
+        with a single query.
+        :param user_id: user id
+        :param date: beginning of the month to analyze
+        :param thresholds: {habit name: threshold}, in display order
+        :param categories_file: path of the Plaid categories json
         """
-        data = open(self.categories_file).read()
-        categories = self.parse_plaid_data(data)
-
-        if self.habit_name == 'coffee':
-            id_list = ['13005047',  # Cafe
-                       '13005043'  # Coffee Shop
-                       ]
-        elif self.habit_name == 'lunch':
-            # ids for restaurants
-            id_restaurants = [x['category_id']
-                              for x in categories['categories']
-                              if 'Restaurants' in x['hierarchy']]
-            # Ids to remove from restaurants
-            id_to_remove = ['13005001',  # winery
-                            '13005019',  # Juice Bar
-                            '13005024',  # Ice Cream
-                            '13005037',  # Distillery
-                            '13005043',  # Coffee Shop
-                            '13005047'  # Cafe
-                            ]
-            id_list = list(set(id_restaurants).difference(set(id_to_remove)))
-        elif self.habit_name == 'transportation':
-            id_list = ['22016000',  # Taxi
-                       '22011000',  # Limos and Chauffeurs
-                       '22006001'  # Ride share
-                       ]
-        else:
-            # Not defined habit
-            return None
-        # Get the transactions from that user, for the specified month and
-        # for the expenses from the category ids
-        end_date = datetime(year=self.date.year, month=self.date.month + 1,
-                            day=1)
-        transactions = classes.Transaction.query.filter_by(
-            user_id=self.user_id)\
-            .filter((classes.Transaction.trans_date >= self.date) &
-                    (classes.Transaction.trans_date < end_date) &
-                    (classes.Transaction.category_id.in_(id_list))).all()
-        ct = len(transactions)
-        if ct < self.thresh:
-            return None
-        return transactions
-
-    def num_per_day_graph(self, transactions):
+        all_stats = habit_stats(user_id, date, next_month(date),
+                                categories_file, list(thresholds))
+        insights_list = []
+        for habit_name, thresh in thresholds.items():
+            stats = all_stats.get(habit_name)
+            if stats is None:
+                continue
+            insights = cls(user_id, date, categories_file, habit_name,
+                           thresh, stats)
+            if insights.stats is not None:
+                insights_list.append(insights)
+        return insights_list
+
+    def num_per_day_graph(self, num_per_day):
         """
         Return the number of time user spent on habit on each day of the week
-        :param transactions: list of transactions
+        :param num_per_day: number of transactions on each weekday, Monday
+        first
         """
-        map_day = {0: 'Mon', 1: 'Tues', 2: 'Wed', 3: 'Thurs',
-                   4: 'Fri', 5: 'Sat', 6: 'Sun'}
-        num_per_day = collections.Counter([x.trans_date.weekday()
-                                           for x in transactions])
-        for x in map_day.keys():
-            if x not in num_per_day.keys():
-                num_per_day[x] = 0
-        sorted_num_per_day = sorted(num_per_day.items())
-        day = [map_day[x[0]] for x in sorted_num_per_day]
-        freq = [x[1] for x in sorted_num_per_day]
+        day = ['Mon', 'Tues', 'Wed', 'Thurs', 'Fri', 'Sat', 'Sun']
+        freq = list(num_per_day)
         matplotlib.use('Agg')
         fig = plt.figure(figsize=(6, 3))
         plt.bar(day, freq, align='center', alpha=0.5, color='#327AB7')
@@ -122,23 +180,3 @@ class Insights:
         output = mpld3.fig_to_html(fig)
         plt.close()
         return output
-
-    @staticmethod
-    def total_amount(transactions):
-        """
-        Return the total amount spent on the habit.
-        :param transactions: list of transactions
-        """
-        tot_amount = round(sum([float(x.trans_amount) for x in transactions]),
-                           2)
-        return tot_amount
-
-    @staticmethod
-    def average_amount(transactions):
-        """
-        Return the average spent on habit
-        :param transactions: list of transactions
-        """
-        avg_amount = round(np.mean([float(x.trans_amount)
-                                    for x in transactions]), 2)
-        return avg_amount
@@ -0,0 +1,310 @@
+"""
+Fake Plaid data for benchmarks and tests, in the shape returned by the
+Plaid API, served in process by FakePlaidClient, a stand-in for
+plaid.Client, or over HTTP by FakePlaidServer, which
+scripts.http_transport.PooledPlaidClient (or LocalPlaidClient) can
+reach.
+
+Like Plaid, the fakes emit TRANSACTIONS webhooks when transactions are
+added, so the webhook flow can be exercised offline. FakePlaidServer is
+started, together with the Twilio stand-in, by scripts.stand_in_server.
+"""
+
+import itertools
+import json
+import random
+import threading
+from datetime import date, timedelta
+
+import plaid
+import plaid.errors
+import requests
+from plaid.requester import post_request
+from plaid.utils import urljoin
+
+from scripts.stand_in_server import StandInServer
+
+# (category_id, category hierarchy, typical amount)
+CATEGORIES = [
+    ("13005043", ["Food and Drink", "Restaurants", "Coffee Shop"], 4.5),
+    ("13005047", ["Food and Drink", "Restaurants", "Cafe"], 6),
+    ("13005000", ["Food and Drink", "Restaurants"], 14),
+    ("22016000", ["Travel", "Taxi"], 18),
+    ("22006001", ["Travel", "Car Service", "Ride Share"], 12),
+    ("19047000", ["Shops", "Supermarkets and Groceries"], 45),
+    ("18061000", ["Service", "Subscription"], 10),
+]
+
+
+def fake_accounts(n, seed=0):
+    """Return n accounts as returned by Accounts.get"""
+    rng = random.Random(seed)
+    return [{"account_id": f"acc{seed}x{i}{rng.randrange(10 ** 6):06d}",
+             "name": f"Plaid Checking {i}",
+             "type": "depository",
+             "subtype": "checking"}
+            for i in range(n)]
+
+
+def fake_transactions(n, account_ids=("acc",), end=date(2020, 5, 1),
+                      days=3 * 365, seed=0):
+    """Return n transactions as returned by Transactions.get, newest first,
+    spread over `days` days before `end` and over account_ids"""
+    rng = random.Random(seed)
+    transactions = []
+    for i in range(n):
+        category_id, category, amount = rng.choice(CATEGORIES)
+        trans_date = end - timedelta(days=rng.randrange(days))
+        transactions.append({
+            "transaction_id": f"txn{seed}x{i:08d}",
+            "account_id": account_ids[i % len(account_ids)],
+            "date": trans_date.isoformat(),
+            "authorized_date": (trans_date -
+                                timedelta(days=1)).isoformat(),
+            "amount": round(amount * rng.uniform(0.5, 1.5), 2),
+            "category": category,
+            "category_id": category_id,
+            "pending": False,
+            "pending_transaction_id": None,
+            "name": "Merchant",
+            "location": {"address": "1 Main St", "city": "San Francisco",
+                         "region": "CA", "country": "US",
+                         "postal_code": "94105", "lon": None,
+                         "lat": None}})
+    transactions.sort(key=lambda transaction: transaction["date"],
+                      reverse=True)
+    return transactions
+
+
+class FakeTransactions:
+    """Transactions endpoint of FakePlaidClient"""
+
+    def __init__(self, client):
+        self.client = client
+
+    def get(self, access_token, start_date, end_date, account_ids=None,
+            count=100, offset=0):
+        self.client.request("Transactions.get", start_date, end_date,
+                            tuple(account_ids or ()), offset)
+        transactions = [
+            transaction for transaction in self.client.transactions
+            if start_date <= transaction["date"] <= end_date and
+            (account_ids is None or transaction["account_id"] in account_ids)]
+        return {"accounts": self.client.accounts,
+                "item": self.client.item(),
+                "transactions": [dict(transaction) for transaction in
+                                 transactions[offset:offset + count]],
+                "total_transactions": len(transactions)}
+
+
+class FakeAccounts:
+    """Accounts endpoint of FakePlaidClient"""
+
+    def __init__(self, client):
+        self.client = client
+
+    def get(self, access_token, account_ids=None):
+        self.client.request("Accounts.get")
+        return {"accounts": [account for account in self.client.accounts
+                             if account_ids is None or
+                             account["account_id"] in account_ids],
+                "item": self.client.item()}
+
+
+def webhook_payload(item_id, webhook_code, new_transactions=0):
+    """Return the body of a TRANSACTIONS webhook as Plaid posts it"""
+    return {"webhook_type": "TRANSACTIONS",
+            "webhook_code": webhook_code,
+            "item_id": item_id,
+            "error": None,
+            "new_transactions": new_transactions}
+
+
+class FakePlaidClient:
+    """
+    Stand-in for plaid.Client over the accounts and transactions of one
+    plaid item
+
+    calls: log of the requests made, for assertions
+    errors: (error type, error code) raised by the next requests, e.g.
+            ("ITEM_ERROR", "PRODUCT_NOT_READY")
+    webhook: called with the body of each webhook emitted, e.g. to post
+             it to the plaid_webhook route
+    """
+
+    def __init__(self, transactions=(), webhook=None, accounts=(),
+                 item_id="item"):
+        self.transactions = list(transactions)
+        self.accounts = list(accounts)
+        self.item_id = item_id
+        self.calls = []
+        self.errors = []
+        self.webhook = webhook
+        self.Transactions = FakeTransactions(self)
+        self.Accounts = FakeAccounts(self)
+
+    def request(self, *call):
+        """Log a request, raising the next of `errors` if any"""
+        self.calls.append(call)
+        if self.errors:
+            error_type, error_code = self.errors.pop(0)
+            raise plaid.errors.PlaidError.from_response({
+                "error_type": error_type, "error_code": error_code,
+                "error_message": error_code, "display_message": None,
+                "request_id": "", "causes": []})
+
+    def item(self):
+        return {"item_id": self.item_id, "webhook": "", "error": None,
+                "available_products": [], "billed_products":
+                ["transactions"], "institution_id": "ins_fake"}
+
+    def fire_webhook(self, item_id, webhook_code, new_transactions=0):
+        if self.webhook is not None:
+            self.webhook(webhook_payload(item_id, webhook_code,
+                                         new_transactions))
+
+    def link_item(self, item_id=None):
+        """Emit the webhooks Plaid sends once a newly linked item's recent
+        and then full transaction history are ready"""
+        item_id = item_id or self.item_id
+        self.fire_webhook(item_id, "INITIAL_UPDATE", len(self.transactions))
+        self.fire_webhook(item_id, "HISTORICAL_UPDATE",
+                          len(self.transactions))
+
+    def post_transactions(self, transactions, item_id=None):
+        """Add new transactions and emit DEFAULT_UPDATE, as Plaid does when
+        it finds new transactions for an item"""
+        self.transactions = sorted(
+            list(transactions) + self.transactions,
+            key=lambda transaction: transaction["date"], reverse=True)
+        self.fire_webhook(item_id or self.item_id, "DEFAULT_UPDATE",
+                          len(transactions))
+
+
+class FakePlaidServer(StandInServer):
+    """
+    Local HTTP stand-in for the Plaid API: /item/public_token/exchange,
+    /accounts/get, /transactions/get and /item/remove
+
+    Exchanging public token "public-fake-<n>" links item "item-<n>" with
+    the accounts fake_accounts(accounts, seed=n), so a load test can post
+    the same account ids to access_plaid_token, and `volume` transactions
+    from fake_transactions(volume, account_ids, seed=n). Other public
+    tokens get the next unused n. Requests with an unknown access token
+    are served from `client`, a single item over `transactions`.
+    Webhooks emitted by the items are posted to webhook_url. See
+    StandInServer for latency, error_rate and record/replay.
+    """
+
+    def __init__(self, transactions=(), latency=0.0, host="127.0.0.1",
+                 port=0, webhook_url=None, accounts=2, volume=1000,
+                 **kwargs):
+        super().__init__(latency=latency, host=host, port=port, **kwargs)
+        self.accounts = accounts
+        self.volume = volume
+        self.webhook_url = webhook_url
+        self.client = FakePlaidClient(transactions, self._webhook())
+        self.items = {}
+        self._seeds = itertools.count(1)
+
+    def _webhook(self):
+        return self.post_webhook if self.webhook_url is not None else None
+
+    def post_webhook(self, payload):
+        requests.post(self.webhook_url, json=payload, timeout=10)
+
+    def linked_items(self):
+        with self.lock:
+            return list(self.items.values())
+
+    def link(self, public_token):
+        """Create the item of a public token; return its access token"""
+        prefix = "public-fake-"
+        with self.lock:
+            if public_token.startswith(prefix) and \
+                    public_token[len(prefix):].isdigit():
+                seed = int(public_token[len(prefix):])
+            else:
+                seed = next(self._seeds)
+            accounts = fake_accounts(self.accounts, seed)
+            item = FakePlaidClient(
+                fake_transactions(self.volume,
+                                  [account["account_id"]
+                                   for account in accounts],
+                                  date.today(), seed=seed),
+                self._webhook(), accounts, f"item-{seed}")
+            access_token = f"access-fake-{seed}"
+            self.items[access_token] = item
+        # as Plaid, once the transactions are ready
+        threading.Thread(target=item.link_item, daemon=True).start()
+        return access_token, item
+
+    def parse(self, headers, body):
+        return json.loads(body or b"{}")
+
+    def request_key(self, path, request):
+        return {name: value for name, value in request.items()
+                if name not in ("client_id", "secret")}
+
+    def error(self):
+        return {"error_type": "API_ERROR",
+                "error_code": "INTERNAL_SERVER_ERROR",
+                "error_message": "an unexpected error occurred",
+                "display_message": None, "request_id": "", "causes": []}
+
+    def handle(self, path, request):
+        request_id = f"fake-{self.random.randrange(10 ** 9)}"
+        if path == "/item/public_token/exchange":
+            access_token, item = self.link(request.get("public_token", ""))
+            return 200, {"access_token": access_token,
+                         "item_id": item.item_id, "request_id": request_id}
+
+        access_token = request.get("access_token")
+        with self.lock:
+            item = self.items.get(access_token, self.client)
+        options = request.get("options", {})
+        try:
+            if path == "/transactions/get":
+                response = item.Transactions.get(
+                    access_token, request["start_date"],
+                    request["end_date"],
+                    account_ids=options.get("account_ids"),
+                    count=options.get("count", 100),
+                    offset=options.get("offset", 0))
+            elif path == "/accounts/get":
+                response = item.Accounts.get(
+                    access_token, options.get("account_ids"))
+            elif path == "/item/remove":
+                with self.lock:
+                    self.items.pop(access_token, None)
+                response = {"removed": True}
+            else:
+                return 404, {
+                    "error_type": "INVALID_REQUEST",
+                    "error_code": "NOT_FOUND",
+                    "error_message": f"unknown endpoint {path}",
+                    "display_message": None, "request_id": request_id,
+                    "causes": []}
+        except plaid.errors.PlaidError as e:
+            return 400, {"error_type": e.type, "error_code": e.code,
+                         "error_message": str(e),
+                         "display_message": e.display_message,
+                         "request_id": request_id, "causes": []}
+        return 200, dict(response, request_id=request_id)
+
+
+class LocalPlaidClient(plaid.Client):
+    """plaid.Client sending its requests to `base_url`"""
+
+    def __init__(self, base_url, **kwargs):
+        kwargs.setdefault("client_id", "client_id")
+        kwargs.setdefault("secret", "secret")
+        kwargs.setdefault("public_key", "public_key")
+        kwargs.setdefault("environment", "sandbox")
+        super().__init__(**kwargs)
+        self.base_url = base_url
+
+    def _post(self, path, data, is_json):
+        return post_request(urljoin(self.base_url, path), data=data,
+                            timeout=self.timeout, is_json=is_json,
+                            headers={})
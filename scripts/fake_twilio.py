@@ -0,0 +1,103 @@
+"""
+Local HTTP stand-in for the Twilio API endpoints the app calls, the
+Messages resource and Verify's Verifications and VerificationCheck,
+reached by pointing scripts.http_transport.PooledTwilioHttpClient at
+its url. It is started, together with the Plaid stand-in, by
+scripts.stand_in_server.
+"""
+
+import re
+from datetime import datetime
+from urllib.parse import parse_qsl
+
+from scripts.stand_in_server import StandInServer
+
+MESSAGES_PATH = re.compile(r"^/2010-04-01/Accounts/(\w+)/Messages\.json$")
+VERIFICATIONS_PATH = re.compile(r"^/v2/Services/(\w+)/Verifications$")
+VERIFICATION_CHECK_PATH = re.compile(
+    r"^/v2/Services/(\w+)/VerificationCheck$")
+VERIFY_UPSTREAM = "https://verify.twilio.com"
+
+
+class FakeTwilioServer(StandInServer):
+    """
+    Local HTTP stand-in for Twilio
+
+    Sent messages are recorded in `messages`. Every verification is
+    approved with `verify_code`. See StandInServer for latency,
+    error_rate and record/replay.
+    """
+
+    def __init__(self, latency=0.0, host="127.0.0.1", port=0,
+                 verify_code="123456", **kwargs):
+        super().__init__(latency=latency, host=host, port=port, **kwargs)
+        self.verify_code = verify_code
+        self.messages = []
+        self.verifications = {}
+
+    def upstream_url(self, path):
+        if path.startswith("/v2/"):
+            return VERIFY_UPSTREAM + path
+        return super().upstream_url(path)
+
+    def parse(self, headers, body):
+        return dict(parse_qsl(body.decode()))
+
+    def request_key(self, path, request):
+        return request
+
+    def error(self):
+        return {"code": 20500, "message": "Internal Server Error",
+                "more_info": "https://www.twilio.com/docs/errors/20500",
+                "status": 500}
+
+    def _sid(self, prefix):
+        with self.lock:
+            return prefix + "%032x" % self.random.getrandbits(128)
+
+    def handle(self, path, request):
+        now = datetime.utcnow().strftime("%a, %d %b %Y %H:%M:%S +0000")
+        match = MESSAGES_PATH.match(path)
+        if match:
+            message = {"sid": self._sid("SM"), "account_sid": match.group(1),
+                       "to": request.get("To"), "from": request.get("From"),
+                       "body": request.get("Body"), "status": "queued",
+                       "num_segments": "1", "direction": "outbound-api",
+                       "date_created": now, "date_updated": now,
+                       "date_sent": None, "error_code": None,
+                       "error_message": None, "price": None,
+                       "api_version": "2010-04-01"}
+            with self.lock:
+                self.messages.append(message)
+            return 201, message
+
+        match = VERIFICATIONS_PATH.match(path)
+        if match:
+            verification = {"sid": self._sid("VE"),
+                            "service_sid": match.group(1),
+                            "to": request.get("To"),
+                            "channel": request.get("Channel"),
+                            "status": "pending", "valid": False,
+                            "date_created": now, "date_updated": now}
+            with self.lock:
+                self.verifications[request.get("To")] = verification
+            return 201, verification
+
+        match = VERIFICATION_CHECK_PATH.match(path)
+        if match:
+            with self.lock:
+                verification = self.verifications.get(request.get("To"))
+            if verification is None:
+                return 404, {"code": 20404, "status": 404,
+                             "message": "The requested resource was not "
+                                        "found",
+                             "more_info": "https://www.twilio.com/docs/"
+                                          "errors/20404"}
+            approved = request.get("Code") == self.verify_code
+            return 200, dict(verification,
+                             status="approved" if approved else "pending",
+                             valid=approved, date_updated=now)
+
+        return 404, {"code": 20404, "status": 404,
+                     "message": f"unknown endpoint {path}",
+                     "more_info": "https://www.twilio.com/docs/errors/20404"}
@@ -0,0 +1,64 @@
+"""
+Benchmark of plaid_methods.methods.get_transactions against a local
+FakePlaidServer, comparing serial page fetching with fetching the pages
+after the first concurrently. Run it with:
+
+    python -m scripts.fetch_benchmark --transactions 10000 --latency 0.2
+
+--latency is the simulated round trip of one Transactions.get call.
+"""
+
+import argparse
+import time
+
+from plaid_methods.methods import FETCH_CONCURRENCY, PAGE_SIZE, \
+    get_transactions
+from scripts.fake_plaid import FakePlaidServer, LocalPlaidClient, \
+    fake_transactions
+
+
+def fetch_seconds(client, page_size, concurrency, expected):
+    """Return the seconds taken to fetch all transactions of the fake
+    account"""
+    start = time.perf_counter()
+    transactions = get_transactions(client, "2000-01-01", "2100-01-01",
+                                    access_token="token", account_id="acc",
+                                    page_size=page_size,
+                                    concurrency=concurrency)
+    seconds = time.perf_counter() - start
+    assert [transaction["transaction_id"]
+            for transaction in transactions] == expected
+    return seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Plaid transactions fetch benchmark")
+    parser.add_argument("--transactions", type=int, default=10000)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--page-size", type=int, default=PAGE_SIZE)
+    parser.add_argument("--concurrency", type=int, default=FETCH_CONCURRENCY)
+    args = parser.parse_args()
+
+    transactions = fake_transactions(args.transactions)
+    expected = [transaction["transaction_id"]
+                for transaction in transactions]
+    with FakePlaidServer(transactions, latency=args.latency) as server:
+        client = LocalPlaidClient(server.url)
+        runs = [("serial, 100 per page", 100, 1),
+                (f"serial, {args.page_size} per page", args.page_size, 1),
+                (f"{args.concurrency} concurrent, {args.page_size} per page",
+                 args.page_size, args.concurrency)]
+        print(f"{args.transactions} transactions, "
+              f"{args.latency * 1000:.0f} ms per request")
+        baseline = None
+        for name, page_size, concurrency in runs:
+            seconds = fetch_seconds(client, page_size, concurrency,
+                                    expected)
+            baseline = baseline or seconds
+            print(f"{name:>32}: {seconds:7.2f} s "
+                  f"({baseline / seconds:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Cache of rendered HTML fragments, such as the Insights charts.
+
+Fragments are kept in memory with LRU eviction and, if a directory is
+configured (FRAGMENT_CACHE_DIR), also on disk so that every worker process
+can reuse them. Keys start with the user id so all the fragments of a user
+can be dropped when their transactions change. Since keys also include the
+data a fragment was drawn from, a worker that missed an invalidation can
+never serve a stale chart; its old entries simply stop being read and age
+out.
+"""
+
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+
+from app import application
+
+
+class FragmentCache:
+    """
+    LRU cache of str fragments keyed by (user_id, *parts) tuples
+
+    """
+
+    def __init__(self, maxsize=256, directory=None):
+        """
+
+        :param maxsize: number of fragments kept in memory
+        :param directory: directory shared by workers, or None for memory
+        only
+        """
+        self.maxsize = maxsize
+        self.directory = directory
+        self.fragments = OrderedDict()
+        self.lock = threading.Lock()
+
+    def _path(self, key):
+        user_id, *parts = key
+        name = hashlib.sha1(repr(parts).encode()).hexdigest()
+        return os.path.join(self.directory, str(user_id), name + ".html")
+
+    def get(self, key):
+        """Return the fragment stored under key, or None"""
+        with self.lock:
+            if key in self.fragments:
+                self.fragments.move_to_end(key)
+                return self.fragments[key]
+        if self.directory is None:
+            return None
+        try:
+            with open(self._path(key)) as f:
+                fragment = f.read()
+        except OSError:
+            return None
+        self._remember(key, fragment)
+        return fragment
+
+    def set(self, key, fragment):
+        """Store fragment under key"""
+        self._remember(key, fragment)
+        if self.directory is None:
+            return
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # write then rename, so other workers never read a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, "w") as f:
+            f.write(fragment)
+        os.replace(tmp_path, path)
+
+    def get_or_create(self, key, create):
+        """Return the fragment under key, calling create() on a miss"""
+        fragment = self.get(key)
+        if fragment is None:
+            fragment = create()
+            self.set(key, fragment)
+        return fragment
+
+    def invalidate_user(self, user_id):
+        """Drop every fragment of a user"""
+        with self.lock:
+            for key in [key for key in self.fragments if key[0] == user_id]:
+                del self.fragments[key]
+        if self.directory is not None:
+            shutil.rmtree(os.path.join(self.directory, str(user_id)),
+                          ignore_errors=True)
+
+    def clear(self):
+        """Drop every fragment held in memory"""
+        with self.lock:
+            self.fragments.clear()
+
+    def _remember(self, key, fragment):
+        with self.lock:
+            self.fragments[key] = fragment
+            self.fragments.move_to_end(key)
+            while len(self.fragments) > self.maxsize:
+                self.fragments.popitem(last=False)
+
+
+graph_cache = FragmentCache(application.config["FRAGMENT_CACHE_SIZE"],
+                            application.config["FRAGMENT_CACHE_DIR"])
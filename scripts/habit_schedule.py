@@ -0,0 +1,159 @@
+"""
+Helper functions for habit reminder scheduling, including next_fire_time,
+schedule_habit, save_habits, due_habits and queue_reminders.
+
+Every habit keeps the UTC time of its next reminder in habits.next_fire_at,
+so the dispatcher only has to select the rows that are due instead of
+checking the schedule of every habit on every tick.
+"""
+
+import pytz
+from datetime import datetime, timedelta
+from sqlalchemy.orm import joinedload
+from app import classes, db
+from scripts.outbox import enqueue_messages
+
+TZ = pytz.timezone("America/Los_Angeles")
+DAYS_OF_WEEK = {"weekday": (0, 1, 2, 3, 4),
+                "weekend": (5, 6),
+                "everyday": (0, 1, 2, 3, 4, 5, 6)}
+# columns of a habit edited in the habit table, and those of its schedule
+HABIT_COLUMNS = ("habit_name", "habit_category", "time_hour", "time_minute",
+                 "time_day_of_week")
+SCHEDULE_COLUMNS = {"time_hour", "time_minute", "time_day_of_week"}
+
+
+def next_fire_time(time_day_of_week, time_hour, time_minute, after=None):
+    """Return the next reminder time strictly after `after`.
+
+    The habit schedule is interpreted in local (Los Angeles) time, while
+    both `after` and the returned value are naive UTC datetimes, which is
+    how they are stored in the database.
+
+    :param time_day_of_week: "weekday", "weekend" or "everyday"
+    :param time_hour: hour of the reminder (0-23)
+    :param time_minute: minute of the reminder (0-59)
+    :param after: naive UTC datetime, defaults to the current time
+    """
+    if after is None:
+        after = datetime.utcnow()
+    local_after = pytz.utc.localize(after).astimezone(TZ)
+    days = DAYS_OF_WEEK[time_day_of_week]
+
+    # a matching day always exists within the next 8 calendar days
+    for offset in range(8):
+        day = local_after.date() + timedelta(days=offset)
+        if day.weekday() not in days:
+            continue
+        local_fire = TZ.localize(datetime(day.year, day.month, day.day,
+                                          int(time_hour), int(time_minute)))
+        fire_at = local_fire.astimezone(pytz.utc).replace(tzinfo=None)
+        if fire_at > after:
+            return fire_at
+
+
+def schedule_habit(habit, after=None):
+    """Set habit.next_fire_at to the habit's next reminder after `after`.
+
+    Should be called whenever a habit is created, its schedule is edited
+    or its reminder has been fired. The caller is responsible for
+    committing the session.
+    """
+    habit.next_fire_at = next_fire_time(habit.time_day_of_week,
+                                        habit.time_hour,
+                                        habit.time_minute,
+                                        after)
+    return habit.next_fire_at
+
+
+def save_habits(user_id, rows, now=None):
+    """Bring a user's habits in line with the rows of the habit table.
+
+    Rows are dicts of habit columns whose "id" is the id of an existing
+    habit of the user, or None for a new one. New habits are bulk
+    inserted, changed ones bulk updated and habits missing from rows
+    deleted, and only new habits or habits whose schedule changed are
+    rescheduled. The caller is responsible for committing the session,
+    so the whole save is one transaction. Returns the number of
+    (inserted, updated, deleted) habits.
+
+    :param now: naive UTC datetime, defaults to the current time
+    """
+    existing = {habit.id: habit for habit in
+                classes.Habits.query.filter_by(user_id=user_id)}
+    inserts, updates, kept = [], [], set()
+    for row in rows:
+        values = {column: row[column] for column in HABIT_COLUMNS}
+        habit = existing.get(row.get("id"))
+        if habit is None or habit.id in kept:
+            values["user_id"] = user_id
+            values["next_fire_at"] = next_fire_time(
+                values["time_day_of_week"], values["time_hour"],
+                values["time_minute"], now)
+            inserts.append(values)
+            continue
+
+        kept.add(habit.id)
+        changed = {column: value for column, value in values.items()
+                   if getattr(habit, column) != value}
+        if not changed:
+            continue
+        if changed.keys() & SCHEDULE_COLUMNS:
+            changed["next_fire_at"] = next_fire_time(
+                values["time_day_of_week"], values["time_hour"],
+                values["time_minute"], now)
+        changed["id"] = habit.id
+        updates.append(changed)
+
+    deleted = [habit_id for habit_id in existing if habit_id not in kept]
+    if inserts:
+        db.session.bulk_insert_mappings(classes.Habits, inserts)
+    if updates:
+        db.session.bulk_update_mappings(classes.Habits, updates)
+    if deleted:
+        classes.Habits.query.filter(classes.Habits.id.in_(deleted)) \
+            .delete(synchronize_session=False)
+    return len(inserts), len(updates), len(deleted)
+
+
+def due_habits_query(now):
+    """Return the query of habits due at `now`, with their users loaded"""
+    return classes.Habits.query \
+        .options(joinedload(classes.Habits.user)) \
+        .filter(classes.Habits.next_fire_at <= now) \
+        .order_by(classes.Habits.next_fire_at)
+
+
+def due_habits(now=None):
+    """Return habits whose reminder is due, with their users loaded.
+
+    Uses the index on habits.next_fire_at, so the cost depends on the
+    number of due reminders rather than the total number of habits.
+
+    :param now: naive UTC datetime, defaults to the current time
+    """
+    if now is None:
+        now = datetime.utcnow()
+    return due_habits_query(now).all()
+
+
+def queue_reminders(habits, now=None):
+    """Queue the reminder of each habit in the outbox and reschedule it.
+
+    The idempotency key is made of the habit id and the fire time being
+    served, so the /send_message route and the reminder scheduler daemon
+    never queue the same reminder twice. Habits must have their user
+    loaded. The caller is responsible for committing the session.
+    """
+    if now is None:
+        now = datetime.utcnow()
+    messages = []
+    for habit in habits:
+        body = f"Would you like to save $5 on {habit.habit_category} " + \
+               "today? Respond Y/N"
+        messages.append(classes.Outbox(
+            user_id=habit.user_id, kind="reminder",
+            to_phone=habit.user.phone_e164, body=body, idempotency_key=f"reminder:{habit.id}:"
+                                       f"{habit.next_fire_at:%Y-%m-%dT%H:%M}"))
+        schedule_habit(habit, now)
+    return enqueue_messages(messages)
@@ -0,0 +1,246 @@
+"""
+Pooled keep-alive HTTP transport shared by the Plaid and Twilio clients,
+including HttpTransport, PooledPlaidClient, PooledTwilioHttpClient,
+new_plaid_client and new_twilio_client.
+
+plaid-python opens a new connection, and pays a new TLS handshake, for
+every call, and each TwilioHttpClient keeps its own unbounded session.
+Both clients here send their requests through one HttpTransport, which
+keeps a bounded pool of connections per host with connect and read
+timeouts, a retry budget and pool usage counters.
+
+The requests session behind a transport is created on first use, and
+again in a process forked after that, so workers of a preloading WSGI
+server never share sockets.
+"""
+
+import json
+import os
+import threading
+from urllib.parse import urlsplit
+
+import plaid
+import requests
+import twilio.rest
+from plaid.errors import PlaidError
+from plaid.utils import urljoin
+from plaid.version import __version__ as plaid_version
+from requests.adapters import HTTPAdapter
+from twilio.http.http_client import TwilioHttpClient
+from urllib3.util.retry import Retry
+
+from app import application
+
+# host pools kept per session; each holds up to pool_size connections
+POOL_HOSTS = 10
+# responses retried within the retry budget; the request was not served
+RETRY_STATUSES = (429,)
+
+
+class HttpTransport:
+    """
+    Bounded, keep-alive connection pools for outbound HTTP
+
+    pool_size: connections kept open per host
+    connect_timeout, read_timeout: seconds
+    retries: retry budget of a request. Only failed connects and
+             RETRY_STATUSES responses are retried, since the request was
+             never processed, so non-idempotent POSTs are safe to retry.
+    pool_block: wait for a free connection rather than opening (and then
+                discarding) one beyond pool_size
+    """
+
+    def __init__(self, pool_size=10, connect_timeout=3.05, read_timeout=30,
+                 retries=2, backoff=0.5, pool_block=False):
+        self.pool_size = pool_size
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.pool_block = pool_block
+        self._lock = threading.Lock()
+        self._session = None
+        self._adapter = None
+        self._pid = None
+        self._counters = {}
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(pool_size=config["HTTP_POOL_SIZE"],
+                   connect_timeout=config["HTTP_CONNECT_TIMEOUT"],
+                   read_timeout=config["HTTP_READ_TIMEOUT"],
+                   retries=config["HTTP_RETRIES"],
+                   pool_block=config["HTTP_POOL_BLOCK"])
+
+    @property
+    def timeout(self):
+        return (self.connect_timeout, self.read_timeout)
+
+    @property
+    def session(self):
+        """The requests session of this process"""
+        pid = os.getpid()
+        if self._pid != pid:
+            with self._lock:
+                if self._pid != pid:
+                    self._open_session()
+                    self._pid = pid
+        return self._session
+
+    def _open_session(self):
+        retry = Retry(total=self.retries, connect=self.retries, read=0,
+                      status=self.retries, other=0,
+                      status_forcelist=RETRY_STATUSES,
+                      allowed_methods=None, backoff_factor=self.backoff,
+                      raise_on_status=False)
+        self._adapter = HTTPAdapter(pool_connections=POOL_HOSTS,
+                                    pool_maxsize=self.pool_size,
+                                    max_retries=retry,
+                                    pool_block=self.pool_block)
+        session = requests.Session()
+        session.mount("https://", self._adapter)
+        session.mount("http://", self._adapter)
+        session.hooks["response"].append(self._count_response)
+        # a session inherited from the parent process is dropped, not
+        # closed, as its sockets are still the parent's
+        self._session = session
+        self._counters = {"responses": 0, "retries": 0, "errors": 0}
+
+    def _count_response(self, response, *args, **kwargs):
+        retries = getattr(response.raw, "retries", None)
+        with self._lock:
+            self._counters["responses"] += 1
+            if retries is not None:
+                self._counters["retries"] += len(retries.history)
+
+    def request(self, method, url, **kwargs):
+        """Send a request through the pool, with the transport's
+        timeouts unless given"""
+        kwargs.setdefault("timeout", self.timeout)
+        session = self.session
+        try:
+            return session.request(method, url, **kwargs)
+        except requests.RequestException:
+            with self._lock:
+                self._counters["errors"] += 1
+            raise
+
+    def stats(self):
+        """
+        Return the pool usage counters of this process:
+        hosts: hosts with a connection pool
+        requests: requests sent on the wire, retries included
+        connections_opened: connections (and TLS handshakes) made
+        connections_reused: requests sent on an already open connection
+        responses, retries, errors: responses received, retries spent on
+        them, and requests that failed with an exception
+        """
+        if self._pid != os.getpid():
+            return {"hosts": 0, "requests": 0, "connections_opened": 0,
+                    "connections_reused": 0, "responses": 0,
+                    "retries": 0, "errors": 0}
+        pool_manager = self._adapter.poolmanager
+        pools = [pool_manager.pools[key] for key in pool_manager.pools.keys()]
+        sent = sum(pool.num_requests for pool in pools)
+        opened = sum(pool.num_connections for pool in pools)
+        with self._lock:
+            counters = dict(self._counters)
+        counters.update(hosts=len(pools), requests=sent,
+                        connections_opened=opened,
+                        connections_reused=sent - opened)
+        return counters
+
+    def close(self):
+        """Close the connections of this process's session"""
+        with self._lock:
+            if self._pid == os.getpid():
+                self._session.close()
+            self._session = self._adapter = self._pid = None
+
+
+class PooledPlaidClient(plaid.Client):
+    """plaid.Client sending its requests through an HttpTransport, to
+    base_url rather than https://<environment>.plaid.com if given"""
+
+    def __init__(self, client_id, secret, public_key, environment,
+                 transport, base_url=None, **kwargs):
+        super().__init__(client_id, secret, public_key, environment,
+                         **kwargs)
+        self.transport = transport
+        self.base_url = base_url or f"https://{environment}.plaid.com"
+
+    def _post(self, path, data, is_json):
+        headers = {"User-Agent": f"Plaid Python v{plaid_version}"}
+        if self.api_version is not None:
+            headers["Plaid-Version"] = self.api_version
+        if self.client_app is not None:
+            headers["Plaid-Client-App"] = self.client_app
+        response = self.transport.request(
+            "POST", urljoin(self.base_url, path), json=data, headers=headers)
+
+        # as plaid.requester.http_request
+        if is_json or \
+                response.headers.get("Content-Type") == "application/json":
+            try:
+                body = json.loads(response.text)
+            except ValueError:
+                raise PlaidError.from_response({
+                    "error_message": response.text,
+                    "error_type": "API_ERROR",
+                    "error_code": "INTERNAL_SERVER_ERROR",
+                    "display_message": None,
+                    "request_id": "",
+                    "causes": []})
+            if body.get("error_type"):
+                raise PlaidError.from_response(body)
+            return body
+        return response.content
+
+
+class PooledTwilioHttpClient(TwilioHttpClient):
+    """TwilioHttpClient sending its requests through an HttpTransport.
+
+    timeout defaults to the transport's (connect, read) timeouts. If
+    base_url is given, it replaces the scheme and host of every Twilio
+    url, e.g. to reach a local stand-in server.
+    """
+
+    def __init__(self, transport, timeout=None, base_url=None, **kwargs):
+        super().__init__(pool_connections=False, **kwargs)
+        self.transport = transport
+        self.timeout = timeout or transport.timeout
+        self.base_url = base_url
+
+    def request(self, method, url, *args, **kwargs):
+        # the session of the current process, see HttpTransport.session
+        self.session = self.transport.session
+        if self.base_url is not None:
+            url = self.base_url.rstrip("/") + urlsplit(url).path
+        return super().request(method, url, *args, **kwargs)
+
+
+# transport shared by the clients of this process
+transport = HttpTransport.from_config(application.config)
+
+
+def new_plaid_client():
+    """Return a Plaid client configured from the environment, sending
+    its requests to PLAID_BASE_URL if set"""
+    return PooledPlaidClient(os.environ["PLAID_CLIENT_ID"],
+                             os.environ["PLAID_SECRET"],
+                             os.environ["PLAID_PUBLIC_KEY"],
+                             os.environ["PLAID_ENV"], transport,
+                             application.config["PLAID_BASE_URL"])
+
+
+def new_twilio_client(read_timeout=None):
+    """Return a Twilio client configured from the environment, sending
+    its requests to TWILIO_BASE_URL if set"""
+    timeout = None
+    if read_timeout is not None:
+        timeout = (transport.connect_timeout, read_timeout)
+    return twilio.rest.Client(
+        os.environ["TWILIO_ACCOUNT_SID"],
+        os.environ["TWILIO_AUTH_TOKEN"],
+        http_client=PooledTwilioHttpClient(
+            transport, timeout, application.config["TWILIO_BASE_URL"]))
@@ -0,0 +1,79 @@
+"""
+Benchmark of Plaid transaction ingestion in records per second, comparing
+the bulk path of plaid_methods.add_plaid_data.add_transactions with
+building one ORM Transaction per record. Run it with:
+
+    python -m scripts.ingest_benchmark --records 20000
+
+Everything is written inside a transaction that is rolled back, so it can
+be pointed at a development database.
+"""
+
+import argparse
+import time
+from datetime import datetime
+
+from app import classes, db
+from plaid_methods.add_plaid_data import add_transactions
+from scripts.fake_plaid import fake_transactions
+
+
+def orm_add_transactions(transactions, user, account):
+    """Ingest transactions one ORM object at a time, as add_transactions
+    used to"""
+    for transaction in transactions:
+        loc = transaction['location']
+        db.session.add(classes.Transaction(
+            user=user, account=account,
+            trans_date=datetime.strptime(transaction['date'], "%Y-%m-%d"),
+            post_date=datetime.strptime(transaction['authorized_date'],
+                                        "%Y-%m-%d"),
+            trans_amount=transaction['amount'],
+            merchant_category=';'.join(transaction['category']),
+            merchant_address=loc['address'],
+            merchant_city=loc['city'],
+            merchant_state=loc['region'],
+            merchant_country=loc['country'],
+            merchant_postal_code=loc['postal_code'],
+            merchant_longitude=loc['lon'],
+            merchant_latitude=loc['lat'],
+            category_id=transaction['category_id']))
+    db.session.flush()
+
+
+def records_per_second(ingest, transactions):
+    """Return the records per second of ingest(transactions, user,
+    account), rolling everything back afterwards"""
+    try:
+        user = classes.User("Bench", "Mark", "benchmark@example.com",
+                            "0000000000", "password")
+        account = classes.Accounts(account_plaid_id="benchmark",
+                                   account_name="checking",
+                                   account_type="depository",
+                                   account_subtype="checking", user=user)
+        db.session.add_all([user, account])
+        db.session.flush()
+        start = time.perf_counter()
+        ingest(transactions, user, account)
+        return len(transactions) / (time.perf_counter() - start)
+    finally:
+        db.session.rollback()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Plaid transaction ingestion benchmark")
+    parser.add_argument("--records", type=int, default=20000)
+    args = parser.parse_args()
+
+    transactions = fake_transactions(args.records)
+    orm = records_per_second(orm_add_transactions, transactions)
+    bulk = records_per_second(
+        lambda *args: add_transactions(*args, commit=False), transactions)
+    print(f"{args.records} records")
+    print(f"orm objects: {orm:10.0f} records/s")
+    print(f"bulk insert: {bulk:10.0f} records/s ({bulk / orm:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
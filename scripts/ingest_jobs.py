@@ -0,0 +1,209 @@
+"""
+Background ingestion of Plaid transactions, including enqueue_ingest,
+handle_webhook, claim_job, run_job, job_status and run_worker.
+
+Linking a bank account only exchanges the public token and stores the
+accounts; the transaction download and ingest are queued in the
+ingest_job table and run by a separate worker process. Plaid's
+transactions webhooks queue further jobs for the item, so new
+transactions arrive without relinking or polling. A running job commits
+its progress (pages fetched, rows written) so the dashboard can poll it.
+Start a worker with:
+
+    python -m scripts.ingest_jobs
+"""
+
+import argparse
+import os
+import socket
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, or_
+
+from app import classes, db
+from plaid_methods.sync import sync_item
+from scripts.http_transport import new_plaid_client
+from scripts.outbox import retry_delay
+
+MAX_ATTEMPTS = 5
+# a claim older than this is considered abandoned by a crashed worker
+CLAIM_LEASE_SECONDS = 900
+# plaid error codes after which a job is retried rather than failed
+RETRY_ERRORS = {"NO_PRODUCT_READY", "PRODUCT_NOT_READY",
+                "RATE_LIMIT_EXCEEDED", "INTERNAL_SERVER_ERROR",
+                "PLANNED_MAINTENANCE", "INSTITUTION_DOWN",
+                "INSTITUTION_NOT_RESPONDING"}
+# TRANSACTIONS webhook codes that queue a sync of the item; the job kind
+# is the lower-cased code, and a historical_update job syncs the whole
+# history instead of the days since the last sync
+SYNC_WEBHOOK_CODES = {"INITIAL_UPDATE", "HISTORICAL_UPDATE",
+                      "DEFAULT_UPDATE"}
+
+
+def enqueue_ingest(plaid_item, kind="link"):
+    """Add an IngestJob syncing the accounts of plaid_item to the session.
+
+    If a job for the item is already pending it is returned instead, so
+    repeated requests queue the work once; it becomes a full
+    historical_update sync if either job is one. The caller is
+    responsible for committing the session.
+    """
+    if plaid_item.id is None:
+        db.session.flush()
+    job = classes.IngestJob.query.filter_by(
+        plaid_item_id=plaid_item.id, status="pending").first()
+    if job is None:
+        job = classes.IngestJob(user_id=plaid_item.user_id,
+                                plaid_item_id=plaid_item.id, kind=kind)
+        db.session.add(job)
+    elif kind == "historical_update":
+        job.kind = kind
+    return job
+
+
+def handle_webhook(payload):
+    """Queue a sync of the item a Plaid TRANSACTIONS webhook is about.
+
+    Returns the job, or None if the webhook is not one that calls for a
+    sync or the item is unknown. The caller is responsible for committing
+    the session.
+    """
+    if payload.get("webhook_type") != "TRANSACTIONS" or \
+            payload.get("webhook_code") not in SYNC_WEBHOOK_CODES:
+        return None
+    plaid_item = classes.PlaidItems.query.filter_by(
+        item_id=payload.get("item_id")).first()
+    if plaid_item is None:
+        return None
+    return enqueue_ingest(plaid_item, payload["webhook_code"].lower())
+
+
+def claim_job_query(now):
+    """Return the query locking the jobs ready to run at `now`, in the
+    order they are claimed"""
+    lease_expired = now - timedelta(seconds=CLAIM_LEASE_SECONDS)
+    job_table = classes.IngestJob
+    return job_table.query.filter(
+        or_(and_(job_table.status == "pending",
+                 job_table.next_attempt_at <= now),
+            and_(job_table.status == "running",
+                 job_table.claimed_at < lease_expired))) \
+        .order_by(job_table.next_attempt_at) \
+        .with_for_update(skip_locked=True)
+
+
+def claim_job(worker_id, now=None):
+    """Claim the next job that is ready to run, or return None.
+
+    Pending jobs whose next_attempt_at has passed are claimed, as are
+    jobs left "running" by a worker that died. On Postgres the row is
+    locked with SKIP LOCKED, so concurrent workers claim different jobs.
+    """
+    if now is None:
+        now = datetime.utcnow()
+    job = claim_job_query(now).first()
+    if job is None:
+        db.session.rollback()
+        return None
+
+    job.status = "running"
+    job.claimed_by = worker_id
+    job.claimed_at = now
+    job.attempts += 1
+    job.pages_fetched = 0
+    job.rows_written = 0
+    db.session.commit()
+    return job
+
+
+def run_job(job, client):
+    """Sync the accounts of a claimed job's plaid item and record the
+    outcome.
+
+    Each page fetched is committed to job.pages_fetched as it arrives,
+    together with a fresh claimed_at, so a sync running for longer than
+    CLAIM_LEASE_SECONDS is not reclaimed by another worker.
+    Jobs failing with a network error or a transient plaid error are
+    rescheduled with exponential backoff until MAX_ATTEMPTS is reached,
+    after which, as on any other plaid error, they are marked "failed".
+    """
+    def on_page(transactions):
+        job.pages_fetched += 1
+        job.claimed_at = datetime.utcnow()
+        db.session.commit()
+
+    error, retry = None, False
+    try:
+        counts = sync_item(client, job.plaid_item, job.plaid_item.accounts,
+                           on_page=on_page,
+                           full=job.kind == "historical_update")
+    except Exception as e:
+        db.session.rollback()
+        error, retry = repr(e), True
+    else:
+        if isinstance(counts, str):
+            error, retry = counts, counts in RETRY_ERRORS
+
+    now = datetime.utcnow()
+    job.claimed_by = None
+    job.claimed_at = None
+    if error is None:
+        job.status = "done"
+        job.rows_written = sum(sum(account_counts)
+                               for account_counts in counts.values())
+        job.finished_at = now
+    else:
+        job.last_error = error[:500]
+        if retry and job.attempts < MAX_ATTEMPTS:
+            job.status = "pending"
+            job.next_attempt_at = now + retry_delay(job.attempts)
+        else:
+            job.status = "failed"
+            job.finished_at = now
+    db.session.commit()
+    return job
+
+
+def job_status(job):
+    """Return the polling endpoint's view of a job"""
+    return {"id": job.id,
+            "kind": job.kind,
+            "status": job.status,
+            "attempts": job.attempts,
+            "pages_fetched": job.pages_fetched,
+            "rows_written": job.rows_written,
+            "last_error": job.last_error,
+            "created_at": job.created_at.isoformat(),
+            "finished_at": job.finished_at and job.finished_at.isoformat()}
+
+
+def run_worker(client, poll_interval=1.0, once=False):
+    """Claim and run jobs until stopped.
+
+    Sleeps for poll_interval seconds whenever no job is ready. With
+    once=True, returns after the first empty poll instead.
+    """
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    while True:
+        job = claim_job(worker_id)
+        if job is not None:
+            run_job(job, client)
+            continue
+        if once:
+            return
+        time.sleep(poll_interval)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Plaid ingestion worker")
+    parser.add_argument("--poll-interval", type=float, default=1.0)
+    parser.add_argument("--once", action="store_true",
+                        help="exit once no job is ready")
+    args = parser.parse_args()
+
+    run_worker(new_plaid_client(), args.poll_interval, args.once)
+
+
+if __name__ == "__main__":
+    main()
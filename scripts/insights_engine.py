@@ -0,0 +1,175 @@
+"""
+Vectorised spending insights over a user's whole transaction history.
+
+InsightsEngine.load reads the user's habit rows of the daily_spending
+rollup once into typed columnar arrays: days as datetime64[D], amounts as
+float64, counts and habits as small integer codes. Rolling windows
+(30/90/365 days by default) and month-by-month trends are then computed
+with np.bincount over those arrays, so a user with years of history costs
+one query over O(days) rows and a few array passes.
+"""
+
+import numpy as np
+import pandas as pd
+from datetime import datetime, timedelta
+
+import pytz
+
+from app import classes, db
+from scripts.category_registry import CATEGORIES_FILE, get_registry
+from scripts.extract_habit import HabitStats, Insights, \
+    reduction_projection
+
+TZ = pytz.timezone("America/Los_Angeles")
+
+WINDOWS = (30, 90, 365)
+
+
+def daily_spending_query(user_id, habit_names):
+    """Return the query of (date, amount, habit, count) rollup rows of a
+    user's habits"""
+    spending = classes.DailySpending
+    return db.session.query(spending.spending_date, spending.trans_amount,
+                            spending.bucket, spending.trans_count) \
+        .filter(spending.user_id == user_id,
+                spending.bucket.in_(habit_names))
+
+
+class InsightsEngine:
+    """
+    Habit transactions of a user as columnar arrays
+
+    days: transaction dates; datetime64[D] array
+    amounts: transaction amounts; float64 array
+    habits: index of the transaction's habit in habit_names; int array
+    habit_names: list of habit names
+    counts: number of transactions each entry stands for, when entries
+            are daily totals; int array, defaults to ones
+    """
+
+    def __init__(self, user_id, days, amounts, habits, habit_names,
+                 counts=None):
+        self.user_id = user_id
+        self.days = np.asarray(days, dtype="datetime64[D]")
+        self.amounts = np.asarray(amounts, dtype=np.float64)
+        self.habits = np.asarray(habits, dtype=np.int64)
+        self.habit_names = list(habit_names)
+        if counts is None:
+            counts = np.ones(len(self.days))
+        self.counts = np.asarray(counts, dtype=np.float64)
+
+    @classmethod
+    def load(cls, user_id, categories_file=CATEGORIES_FILE,
+             habit_names=None):
+        """Load the daily habit spending of a user with a single query"""
+        registry = get_registry(categories_file)
+        if habit_names is None:
+            habit_names = list(registry.habit_ids)
+        habit_names = [name for name in habit_names
+                       if registry.habit_category_ids(name) is not None]
+        rows = daily_spending_query(user_id, habit_names).all()
+        if not rows:
+            return cls(user_id, [], [], [], habit_names, [])
+        codes = {name: i for i, name in enumerate(habit_names)}
+        days, amounts, buckets, counts = zip(*rows)
+        return cls(user_id, days, amounts, [codes[b] for b in buckets],
+                   habit_names, counts)
+
+    def default_as_of(self):
+        """Return the day after the latest transaction, but no later than
+        tomorrow, so windows end with the user's latest data"""
+        tomorrow = datetime.now().astimezone(TZ).date() + timedelta(days=1)
+        if len(self.days) == 0:
+            return tomorrow
+        return min(self.days.max().astype(object) + timedelta(days=1),
+                   tomorrow)
+
+    def window_stats(self, as_of=None, windows=WINDOWS):
+        """Return {window: {habit name: HabitStats}} for the transactions
+        in the `window` days before as_of (excluded).
+
+        Habits without transactions in a window are left out.
+        """
+        if as_of is None:
+            as_of = self.default_as_of()
+        windows = sorted(windows)
+        n_windows, n_habits = len(windows), len(self.habit_names)
+
+        age = (np.datetime64(as_of, "D") - self.days).astype(np.int64)
+        inside = (age >= 1) & (age <= windows[-1])
+        age = age[inside]
+        habits = self.habits[inside]
+        weekdays = (self.days[inside].astype(np.int64) + 3) % 7
+        # smallest window each transaction falls in; windows are nested,
+        # so cumulative sums over this axis give each window's totals
+        smallest = np.searchsorted(windows, age)
+
+        flat = (smallest * n_habits + habits) * 7 + weekdays
+        num_per_day = np.bincount(
+            flat, weights=self.counts[inside],
+            minlength=n_windows * n_habits * 7) \
+            .reshape(n_windows, n_habits, 7).cumsum(axis=0).astype(np.int64)
+        tot_amount = np.bincount(
+            flat // 7, weights=self.amounts[inside],
+            minlength=n_windows * n_habits) \
+            .reshape(n_windows, n_habits).cumsum(axis=0)
+
+        stats = {}
+        for w, window in enumerate(windows):
+            stats[window] = {}
+            for h, habit_name in enumerate(self.habit_names):
+                num = int(num_per_day[w, h].sum())
+                if num == 0:
+                    continue
+                stats[window][habit_name] = HabitStats(
+                    num, round(float(tot_amount[w, h]), 2),
+                    round(float(tot_amount[w, h]) / num, 2),
+                    tuple(int(count) for count in num_per_day[w, h]))
+        return stats
+
+    def monthly(self):
+        """Return a DataFrame of the number of purchases and amount spent
+        on each habit in every month, from the first to the last month
+        with a transaction"""
+        columns = ["month", "habit", "num", "tot_amount"]
+        if len(self.days) == 0:
+            return pd.DataFrame(columns=columns)
+        months = self.days.astype("datetime64[M]")
+        first = months.min()
+        n_months = int((months.max() - first).astype(np.int64)) + 1
+        n_habits = len(self.habit_names)
+
+        flat = self.habits * n_months + (months - first).astype(np.int64)
+        num = np.bincount(flat, weights=self.counts,
+                          minlength=n_habits * n_months).astype(np.int64)
+        tot_amount = np.bincount(flat, weights=self.amounts,
+                                 minlength=n_habits * n_months)
+        month_range = first + np.arange(n_months)
+        return pd.DataFrame({
+            "month": np.tile(month_range, n_habits).astype("datetime64[ns]"),
+            "habit": np.repeat(self.habit_names, n_months),
+            "num": num,
+            "tot_amount": tot_amount.round(2)}, columns=columns)
+
+    def insights(self, thresholds, window=30, as_of=None,
+                 categories_file=CATEGORIES_FILE):
+        """
+        Return the Insights of every habit above its threshold over the
+        `window` days before as_of
+        :param thresholds: {habit name: threshold}, in display order
+        """
+        if as_of is None:
+            as_of = self.default_as_of()
+        stats = self.window_stats(as_of, [window])[window]
+        start = as_of - timedelta(days=window)
+        insights_list = []
+        for habit_name, thresh in thresholds.items():
+            if habit_name not in stats:
+                continue
+            insights = Insights(self.user_id, start, categories_file,
+                                habit_name, thresh, stats[habit_name])
+            if insights.stats is not None:
+                insights.recommended, insights.yearly_saving = \
+                    reduction_projection(insights.stats, window)
+                insights_list.append(insights)
+        return insights_list
@@ -0,0 +1,256 @@
+"""
+Durable outbox for outbound SMS, including enqueue_messages,
+add_saving_suggestions, claim_batch, deliver_batch and run_worker.
+
+Web requests only insert rows into the outbox table; a separate worker
+process claims them in batches, sends them through the dispatch pool in
+scripts.sms_dispatch, retries failures with exponential backoff and marks
+them delivered. Start a worker with:
+
+    python -m scripts.outbox
+"""
+
+import argparse
+import os
+import random
+import socket
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, or_
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.exc import SQLAlchemyError
+
+from app import application, classes, db
+from scripts.daily_activity import increment_daily_activity
+from scripts.http_transport import new_twilio_client, \
+    transport as http_transport
+from scripts.sms_dispatch import SmsMessage, TwilioTransport, \
+    dispatch_messages
+
+MAX_ATTEMPTS = 5
+RETRY_BASE_SECONDS = 30
+RETRY_MAX_SECONDS = 3600
+# a claim older than this is considered abandoned by a crashed worker
+CLAIM_LEASE_SECONDS = 300
+# seconds by which the twilio read timeout undercuts the dispatch timeout,
+# so a slow send fails on its socket before the dispatcher abandons it
+SOCKET_TIMEOUT_MARGIN = 1
+
+
+def enqueue_messages(messages):
+    """Add unsaved Outbox objects to the session, skipping duplicates.
+
+    A message whose idempotency_key is already in the outbox (or appears
+    twice in `messages`) is dropped, so a redelivered cron tick cannot
+    text a user twice. On Postgres the messages are inserted with ON
+    CONFLICT DO NOTHING, so overlapping ticks skip each other's messages
+    instead of failing on the unique key; the returned objects are then
+    not added to the session. Elsewhere existing keys are read first.
+    The caller is responsible for committing the session. Returns the
+    messages that were added.
+    """
+    unique = {}
+    for message in messages:
+        unique.setdefault(message.idempotency_key, message)
+    if not unique:
+        return []
+
+    if db.engine.dialect.name == "postgresql":
+        table = classes.Outbox.__table__
+        insert = postgresql.insert(table).values([
+            {"user_id": message.user_id, "kind": message.kind,
+             "to_phone": message.to_phone, "body": message.body,
+             "idempotency_key": message.idempotency_key}
+            for message in unique.values()]) \
+            .on_conflict_do_nothing(index_elements=["idempotency_key"]) \
+            .returning(table.c.idempotency_key)
+        inserted = {key for key, in db.session.execute(insert)}
+        return [message for key, message in unique.items()
+                if key in inserted]
+
+    seen = {key for key, in db.session.query(
+        classes.Outbox.idempotency_key).filter(
+        classes.Outbox.idempotency_key.in_(list(unique)))}
+    added = [message for key, message in unique.items() if key not in seen]
+    db.session.add_all(added)
+    return added
+
+
+def add_saving_suggestions(user_ids):
+    """Increment user.saving_suggestions once per entry in user_ids.
+
+    Users are grouped by increment, so a batch of reminders costs one
+    UPDATE statement in the common case of one reminder per user. The
+    caller is responsible for committing the session.
+    """
+    by_increment = {}
+    for user_id, count in Counter(user_ids).items():
+        by_increment.setdefault(count, []).append(user_id)
+
+    for count, ids in by_increment.items():
+        classes.User.query.filter(classes.User.id.in_(ids)).update(
+            {classes.User.saving_suggestions:
+             classes.User.saving_suggestions + count},
+            synchronize_session=False)
+
+
+def claim_batch_query(now, batch_size=100):
+    """Return the query locking up to batch_size messages ready to be
+    sent at `now`"""
+    lease_expired = now - timedelta(seconds=CLAIM_LEASE_SECONDS)
+    outbox = classes.Outbox
+    return outbox.query.filter(
+        or_(and_(outbox.status == "pending",
+                 outbox.next_attempt_at <= now),
+            and_(outbox.status == "sending",
+                 outbox.claimed_at < lease_expired))) \
+        .order_by(outbox.next_attempt_at) \
+        .limit(batch_size) \
+        .with_for_update(skip_locked=True)
+
+
+def latest_message_query(user_id, kind):
+    """Return the query of a user's messages of a kind, latest first"""
+    return classes.Outbox.query.filter_by(user_id=user_id, kind=kind) \
+        .order_by(classes.Outbox.id.desc())
+
+
+def claim_batch(worker_id, batch_size=100, now=None):
+    """Claim up to batch_size messages that are ready to be sent.
+
+    Pending messages whose next_attempt_at has passed are claimed, as are
+    messages left in "sending" by a worker that died. On Postgres the rows
+    are locked with SKIP LOCKED, so concurrent workers claim disjoint
+    batches.
+    """
+    if now is None:
+        now = datetime.utcnow()
+    messages = claim_batch_query(now, batch_size).all()
+
+    for message in messages:
+        message.status = "sending"
+        message.claimed_by = worker_id
+        message.claimed_at = now
+    db.session.commit()
+    return messages
+
+
+def retry_delay(attempts):
+    """Return the backoff before the next attempt, with jitter"""
+    delay = min(RETRY_BASE_SECONDS * 2 ** (attempts - 1), RETRY_MAX_SECONDS)
+    return timedelta(seconds=delay + random.uniform(0, RETRY_BASE_SECONDS))
+
+
+def deliver_batch(messages, transport, max_workers=8, timeout=10):
+    """Send claimed messages and record the outcome of each one.
+
+    Delivered reminders are counted in user.saving_suggestions and in the
+    user's reminders_sent counter for the day. Failed
+    messages are rescheduled with exponential backoff until MAX_ATTEMPTS
+    is reached, after which they are marked "failed". Messages whose send
+    timed out may have been delivered, so they are marked "unknown" and
+    never retried automatically.
+
+    The outcomes are committed before the counters are updated, in a
+    transaction of their own, so a failing counter update can neither
+    leave sent messages in "sending" to be claimed and sent again nor
+    stop the worker; the counts of that batch are then lost.
+    """
+    results = dispatch_messages(
+        [SmsMessage(to=message.to_phone, body=message.body,
+                    user_id=message.user_id, kind=message.kind)
+         for message in messages],
+        transport, max_workers, timeout)
+
+    now = datetime.utcnow()
+    delivered_reminders = []
+    for message, result in zip(messages, results):
+        message.attempts += 1
+        message.claimed_by = None
+        message.claimed_at = None
+        if result.ok:
+            message.status = "delivered"
+            message.provider_sid = result.sid
+            message.delivered_at = now
+            if message.kind == "reminder":
+                delivered_reminders.append(message.user_id)
+        else:
+            message.last_error = repr(result.error)[:500]
+            if result.timed_out:
+                message.status = "unknown"
+            elif message.attempts >= MAX_ATTEMPTS:
+                message.status = "failed"
+            else:
+                message.status = "pending"
+                message.next_attempt_at = now + retry_delay(message.attempts)
+
+    db.session.commit()
+
+    try:
+        add_saving_suggestions(delivered_reminders)
+        increment_daily_activity("reminders_sent", delivered_reminders)
+        db.session.commit()
+    except SQLAlchemyError:
+        db.session.rollback()
+        application.logger.exception("reminder counters not updated")
+    return results
+
+
+def socket_timeout(timeout):
+    """Return the twilio read timeout for a dispatch timeout, so that
+    connecting and reading give up before the dispatcher does"""
+    read_timeout = timeout - http_transport.connect_timeout - \
+        SOCKET_TIMEOUT_MARGIN
+    if read_timeout <= 0:
+        raise ValueError(f"SMS_TIMEOUT of {timeout}s leaves no time to read "
+                         f"after a {http_transport.connect_timeout}s connect")
+    return read_timeout
+
+
+def run_worker(transport, batch_size=100, poll_interval=1.0,
+               max_workers=8, timeout=10, once=False):
+    """Claim and deliver batches until stopped.
+
+    Sleeps for poll_interval seconds whenever the outbox is empty. With
+    once=True, returns after the first empty poll instead. An error is
+    logged and the session rolled back, and the worker carries on after
+    poll_interval seconds; with once=True the error is raised.
+    """
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    while True:
+        try:
+            messages = claim_batch(worker_id, batch_size)
+            if messages:
+                deliver_batch(messages, transport, max_workers, timeout)
+                continue
+        except Exception:
+            db.session.rollback()
+            if once:
+                raise
+            application.logger.exception("outbox batch failed")
+        else:
+            if once:
+                return
+        time.sleep(poll_interval)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Outbound SMS worker")
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--poll-interval", type=float, default=1.0)
+    parser.add_argument("--once", action="store_true",
+                        help="exit once the outbox is empty")
+    args = parser.parse_args()
+
+    timeout = application.config["SMS_TIMEOUT"]
+    transport = TwilioTransport(
+        new_twilio_client(socket_timeout(timeout)),
+        verify_service=os.environ["VERIFICATION_SID"])
+    run_worker(transport, args.batch_size, args.poll_interval,
+               application.config["SMS_MAX_WORKERS"], timeout, args.once)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""
+Long-running habit reminder scheduler, replacing the cron-polled
+/send_message route. Start it with:
+
+    python -m scripts.reminder_scheduler
+
+Habits are loaded once into a heap ordered by their next reminder time,
+i.e. by minute of the week. Afterwards only habits whose updated_at is
+past the last one seen, less an overlap of `lag` seconds for rows that
+commit late or were stamped by a host with a slower clock, are read
+back, and due habits are re-read by id
+just before their reminder is queued, which also drops deleted habits.
+Since habits.next_fire_at is persisted, reminders missed while the
+scheduler was down are queued as soon as it starts again.
+"""
+
+import argparse
+import heapq
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy.orm import joinedload
+
+from app import application, classes, db
+from scripts.habit_schedule import queue_reminders
+
+# seconds of updated_at re-read before the watermark on each poll
+WATERMARK_LAG_SECONDS = 300
+
+
+class ReminderScheduler:
+    """Heap of (next_fire_at, habit_id) kept in sync with the habits table
+
+    `scheduled` maps each habit id to the fire time of its live heap
+    entry; heap entries that no longer match it are stale and skipped.
+    Habits re-read within the `lag` overlap are pushed again only if
+    their fire time changed.
+    """
+
+    def __init__(self, lag=WATERMARK_LAG_SECONDS):
+        self.heap = []
+        self.scheduled = {}
+        self.watermark = None
+        self.lag = timedelta(seconds=lag)
+
+    def push(self, habit_id, fire_at):
+        """Schedule habit_id at fire_at, replacing any earlier entry"""
+        if fire_at is None:
+            self.scheduled.pop(habit_id, None)
+            return
+        if self.scheduled.get(habit_id) == fire_at:
+            return
+        self.scheduled[habit_id] = fire_at
+        heapq.heappush(self.heap, (fire_at, habit_id))
+
+    def _apply(self, rows):
+        for habit_id, fire_at, updated_at in rows:
+            self.push(habit_id, fire_at)
+            if updated_at is not None and \
+                    (self.watermark is None or updated_at > self.watermark):
+                self.watermark = updated_at
+
+    def load(self):
+        """Load the schedule of every habit"""
+        habits = classes.Habits
+        self._apply(habits.query.with_entities(
+            habits.id, habits.next_fire_at, habits.updated_at))
+        db.session.commit()
+
+    def apply_changes(self):
+        """Pick up habits created or edited since the last call"""
+        if self.watermark is None:
+            return self.load()
+        habits = classes.Habits
+        self._apply(habits.query.with_entities(
+            habits.id, habits.next_fire_at, habits.updated_at)
+            .filter(habits.updated_at >= self.watermark - self.lag))
+        db.session.commit()
+
+    def pop_due(self, now):
+        """Remove and return {habit_id: fire_at} of habits due at `now`"""
+        due = {}
+        while self.heap and self.heap[0][0] <= now:
+            fire_at, habit_id = heapq.heappop(self.heap)
+            if self.scheduled.get(habit_id) == fire_at:
+                del self.scheduled[habit_id]
+                due[habit_id] = fire_at
+        return due
+
+    def fire_due(self, now=None):
+        """Queue the reminders due at `now` and reschedule their habits.
+
+        Returns the number of reminders queued. If queueing fails, the
+        session is rolled back, the due habits are pushed back at their
+        fire times, so the next call retries them, and the error is
+        raised.
+        """
+        if now is None:
+            now = datetime.utcnow()
+        due_ids = self.pop_due(now)
+        if not due_ids:
+            return 0
+
+        try:
+            habits = classes.Habits.query \
+                .options(joinedload(classes.Habits.user)) \
+                .filter(classes.Habits.id.in_(list(due_ids))).all()
+            # habits edited since they were loaded are rescheduled as is
+            due = [habit for habit in habits
+                   if habit.next_fire_at is not None
+                   and habit.next_fire_at <= now]
+            queued = queue_reminders(due, now)
+            rescheduled = [(habit.id, habit.next_fire_at)
+                           for habit in habits]
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            for habit_id, fire_at in due_ids.items():
+                self.push(habit_id, fire_at)
+            raise
+
+        for habit_id, fire_at in rescheduled:
+            self.push(habit_id, fire_at)
+        return len(queued)
+
+    def next_wakeup(self, default):
+        """Return the earlier of the next fire time and `default`"""
+        while self.heap and \
+                self.scheduled.get(self.heap[0][1]) != self.heap[0][0]:
+            heapq.heappop(self.heap)
+        if self.heap:
+            return min(self.heap[0][0], default)
+        return default
+
+    def run(self, poll_interval=15):
+        """Fire reminders on time, polling for habit changes in between.
+
+        An error is logged and the session rolled back, and the loop
+        carries on after poll_interval seconds.
+        """
+        self.load()
+        while True:
+            try:
+                self.fire_due()
+                wakeup = self.next_wakeup(
+                    datetime.utcnow() + timedelta(seconds=poll_interval))
+                time.sleep(max(0, (wakeup - datetime.utcnow())
+                               .total_seconds()))
+                self.apply_changes()
+            except Exception:
+                db.session.rollback()
+                application.logger.exception("reminder scheduler failed")
+                time.sleep(poll_interval)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Habit reminder scheduler")
+    parser.add_argument("--poll-interval", type=float, default=15,
+                        help="seconds between checks for habit changes")
+    args = parser.parse_args()
+    ReminderScheduler().run(args.poll_interval)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+"""
+SMS dispatch engine used for habit reminders, lottery notices and
+phone verifications,
+including SmsMessage, DispatchResult, DispatchTimeout, TwilioTransport,
+FakeTransport and dispatch_messages.
+
+Messages are fanned out over a bounded thread pool so one slow provider
+call does not hold up the rest of the batch. The module has no database
+dependency, so throughput can be measured offline against FakeTransport:
+
+    python -m scripts.sms_dispatch --messages 500 --latency 0.2
+"""
+
+import argparse
+import random
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+FROM_NUMBER = "+16462573594"
+
+
+class SmsMessage(namedtuple("SmsMessage", ["to", "body", "user_id",
+                                           "kind"])):
+    """Outbound message; kind "verification" starts a phone verification
+    instead of sending `body`"""
+
+    def __new__(cls, to, body, user_id=None, kind="sms"):
+        return super().__new__(cls, to, body, user_id, kind)
+
+
+class DispatchTimeout(TimeoutError):
+    """A send that got no response in time. It is not cancelled, so the
+    provider may still accept it."""
+
+
+class DispatchResult(namedtuple("DispatchResult",
+                                ["message", "sid", "error"])):
+    """Outcome of sending one message: the provider sid or the error"""
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    @property
+    def timed_out(self):
+        """Whether the outcome is unknown, the message may have been
+        delivered; such a message must not be sent again blindly"""
+        return isinstance(self.error, DispatchTimeout)
+
+
+class TwilioTransport:
+    """Send messages through a twilio.rest.Client.
+
+    The per-request socket timeout is configured on the client's
+    http_client, e.g. scripts.http_transport.PooledTwilioHttpClient.
+    """
+
+    def __init__(self, client, from_=FROM_NUMBER, verify_service=None):
+        self.client = client
+        self.from_ = from_
+        self.verify_service = verify_service
+
+    def send(self, to, body):
+        message = self.client.messages.create(body=body, to=to,
+                                              from_=self.from_)
+        return message.sid
+
+    def start_verification(self, to):
+        verification = self.client.verify \
+            .services(self.verify_service) \
+            .verifications \
+            .create(to=to, channel="sms")
+        return verification.sid
+
+
+class FakeTransport:
+    """Local stand-in for the SMS provider.
+
+    Each send sleeps for `latency` seconds and fails with probability
+    `failure_rate`. Sent messages are recorded in `sent`.
+    """
+
+    def __init__(self, latency=0.0, failure_rate=0.0, seed=None):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.sent = []
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def send(self, to, body):
+        time.sleep(self.latency)
+        with self._lock:
+            if self._random.random() < self.failure_rate:
+                raise RuntimeError("fake transport failure")
+            self.sent.append((to, body))
+            return "SM{:032d}".format(len(self.sent))
+
+    def start_verification(self, to):
+        return self.send(to, None)
+
+
+def dispatch_messages(messages, transport, max_workers=8, timeout=10):
+    """Send messages concurrently and return one DispatchResult each.
+
+    At most `max_workers` messages are in flight at a time. A message
+    that has been in flight for longer than `timeout` seconds is
+    reported with a DispatchTimeout error (see DispatchResult.timed_out)
+    but not cancelled: its send keeps running in the background and may
+    still be delivered. Retrying it gives at-least-once delivery, so
+    callers that must not send twice should treat it as an unknown
+    outcome rather than a failure. Keep the transport's own socket
+    timeout below `timeout` so that sends fail before they are abandoned.
+    Results are returned in the same order as `messages`.
+    """
+    messages = list(messages)
+    results = [None] * len(messages)
+    if not messages:
+        return results
+
+    started = {}
+
+    def _send(index, message):
+        started[index] = time.monotonic()
+        if message.kind == "verification":
+            return transport.start_verification(message.to)
+        return transport.send(message.to, message.body)
+
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    futures = {executor.submit(_send, i, message): i
+               for i, message in enumerate(messages)}
+    pending = set(futures)
+    try:
+        while pending:
+            done, pending = wait(pending, timeout=timeout / 10,
+                                 return_when=FIRST_COMPLETED)
+            for future in done:
+                i = futures[future]
+                try:
+                    results[i] = DispatchResult(messages[i],
+                                                future.result(), None)
+                except Exception as e:
+                    results[i] = DispatchResult(messages[i], None, e)
+
+            now = time.monotonic()
+            for future in list(pending):
+                i = futures[future]
+                if i in started and now - started[i] > timeout:
+                    pending.discard(future)
+                    results[i] = DispatchResult(
+                        messages[i], None,
+                        DispatchTimeout(f"no response after {timeout}s"))
+    finally:
+        executor.shutdown(wait=False)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure SMS dispatch throughput against a fake "
+                    "transport")
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.1)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--timeout", type=float, default=10)
+    args = parser.parse_args()
+
+    messages = [SmsMessage(to=f"+1555{i:07d}", body="benchmark",
+                           user_id=i) for i in range(args.messages)]
+    for workers in (1, args.workers):
+        transport = FakeTransport(args.latency, args.failure_rate)
+        start = time.monotonic()
+        results = dispatch_messages(messages, transport, workers,
+                                    args.timeout)
+        elapsed = time.monotonic() - start
+        failed = sum(not result.ok for result in results)
+        timed_out = sum(result.timed_out for result in results)
+        print(f"workers={workers}: {len(messages)} messages in "
+              f"{elapsed:.2f}s ({len(messages) / elapsed:.1f} msg/s), "
+              f"{failed} failed, {timed_out} of them timed out")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+"""
+Local stand-in HTTP servers for the third-party APIs the app calls, for
+measuring ingestion and messaging offline, including StandInServer,
+RecordReplay and main. The stand-ins themselves are FakePlaidServer in
+scripts/fake_plaid.py and FakeTwilioServer in scripts/fake_twilio.py.
+
+Every stand-in adds `latency` seconds to each request and fails a
+fraction `error_rate` of them with the API's own 500 error. With a
+RecordReplay the responses served are recorded to a JSON lines file,
+forwarding requests to the real API first if `upstream` is set, or
+replayed from one.
+
+Start a Plaid and a Twilio stand-in with:
+
+    python -m scripts.stand_in_server --latency 0.1 --error-rate 0.01 \
+        --accounts 3 --transactions 5000
+
+and point the app at them with PLAID_BASE_URL=http://127.0.0.1:8001 and
+TWILIO_BASE_URL=http://127.0.0.1:8002 (see config.py).
+"""
+
+import abc
+import argparse
+import itertools
+import json
+import os
+import random
+import threading
+import time
+from datetime import date
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+import requests
+
+
+class RecordReplay:
+    """
+    Responses of a stand-in recorded to, or replayed from, a JSON lines
+    file of {"key", "status", "response"} objects
+
+    mode: "record" appends every response served to the file; "replay"
+          answers requests with the recorded responses for the same key,
+          in recorded order and repeating the last one
+    """
+
+    def __init__(self, path, mode):
+        if mode not in ("record", "replay"):
+            raise ValueError(mode)
+        self.path = path
+        self.mode = mode
+        self._lock = threading.Lock()
+        self._recorded = {}
+        if mode == "replay":
+            with open(path) as recording:
+                for line in recording:
+                    entry = json.loads(line)
+                    self._recorded.setdefault(entry["key"], []).append(
+                        (entry["status"], entry["response"]))
+
+    def record(self, key, status, response):
+        with self._lock, open(self.path, "a") as recording:
+            recording.write(json.dumps({"key": key, "status": status,
+                                        "response": response}) + "\n")
+
+    def replay(self, key):
+        """Return the next recorded (status, response) for key, or None"""
+        with self._lock:
+            responses = self._recorded.get(key)
+            if not responses:
+                return None
+            return responses.pop(0) if len(responses) > 1 else responses[0]
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class _StandInHandler(BaseHTTPRequestHandler):
+    # keep-alive, as the real apis
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        status, response = self.server.stand_in.serve(
+            self.path, dict(self.headers), body)
+        payload = json.dumps(response).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StandInServer(abc.ABC):
+    """
+    Base class of the stand-in servers, run in a background thread
+
+    Subclasses implement parse (request body to a dict), request_key
+    (the part of a request identifying its response in a recording),
+    handle (a parsed request to (status, response)) and error (the API's
+    500 response). Use a server as a context manager; `url` is its base
+    url.
+    """
+
+    def __init__(self, latency=0.0, error_rate=0.0, host="127.0.0.1",
+                 port=0, record_replay=None, upstream=None, seed=None):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.record_replay = record_replay
+        self.upstream = upstream
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.httpd = _ThreadingHTTPServer((host, port), _StandInHandler)
+        self.httpd.stand_in = self
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever,
+                                       args=(0.05,), daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def serve(self, path, headers, body):
+        """Return the (status, response) of a request"""
+        time.sleep(self.latency)
+        request = self.parse(headers, body)
+        key = path + " " + json.dumps(self.request_key(path, request),
+                                      sort_keys=True)
+        if self.record_replay is not None and \
+                self.record_replay.mode == "replay":
+            replayed = self.record_replay.replay(key)
+            if replayed is not None:
+                return replayed
+
+        with self.lock:
+            failed = self.random.random() < self.error_rate
+        if failed:
+            status, response = 500, self.error()
+        elif self.upstream is not None:
+            status, response = self.forward(path, headers, body)
+        else:
+            status, response = self.handle(path, request)
+
+        if self.record_replay is not None and \
+                self.record_replay.mode == "record":
+            self.record_replay.record(key, status, response)
+        return status, response
+
+    def upstream_url(self, path):
+        return self.upstream.rstrip("/") + path
+
+    def forward(self, path, headers, body):
+        """Send a request on to the real API"""
+        forwarded = {name: value for name, value in headers.items()
+                     if name.lower() in ("content-type", "authorization")}
+        response = requests.post(self.upstream_url(path), data=body,
+                                 headers=forwarded, timeout=60)
+        return response.status_code, response.json()
+
+    @abc.abstractmethod
+    def parse(self, headers, body):
+        """Return the request body as a dict"""
+
+    @abc.abstractmethod
+    def request_key(self, path, request):
+        """Return the part of a request identifying its response in a
+        recording"""
+
+    @abc.abstractmethod
+    def handle(self, path, request):
+        """Return the (status, response) of a parsed request"""
+
+    @abc.abstractmethod
+    def error(self):
+        """Return the API's 500 response"""
+
+
+def main():
+    # imported here as both modules build on this one
+    from scripts.fake_plaid import FakePlaidServer, fake_transactions
+    from scripts.fake_twilio import FakeTwilioServer
+
+    parser = argparse.ArgumentParser(
+        description="Local Plaid and Twilio stand-in servers")
+    parser.add_argument("--plaid-port", type=int, default=8001)
+    parser.add_argument("--twilio-port", type=int, default=8002)
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="seconds added to each request")
+    parser.add_argument("--error-rate", type=float, default=0.0,
+                        help="fraction of requests failing with a 500")
+    parser.add_argument("--accounts", type=int, default=2,
+                        help="accounts of each linked plaid item")
+    parser.add_argument("--transactions", type=int, default=1000,
+                        help="transactions of each linked plaid item")
+    parser.add_argument("--record", metavar="DIR",
+                        help="record responses to DIR/plaid.jsonl and "
+                             "DIR/twilio.jsonl")
+    parser.add_argument("--replay", metavar="DIR",
+                        help="replay responses recorded in DIR")
+    parser.add_argument("--plaid-upstream",
+                        help="forward plaid requests to this url, e.g. "
+                             "https://sandbox.plaid.com, when recording")
+    parser.add_argument("--webhook-url",
+                        help="url of the app's plaid_webhook route")
+    parser.add_argument("--update-interval", type=float, default=60,
+                        help="seconds between new transactions posted to "
+                             "each linked item, with --webhook-url")
+    args = parser.parse_args()
+
+    def record_replay(name):
+        if args.record:
+            return RecordReplay(os.path.join(args.record, name), "record")
+        if args.replay:
+            return RecordReplay(os.path.join(args.replay, name), "replay")
+        return None
+
+    plaid_server = FakePlaidServer(
+        latency=args.latency, error_rate=args.error_rate,
+        port=args.plaid_port, accounts=args.accounts,
+        volume=args.transactions, webhook_url=args.webhook_url,
+        record_replay=record_replay("plaid.jsonl"),
+        upstream=args.plaid_upstream if args.record else None)
+    twilio_server = FakeTwilioServer(
+        latency=args.latency, error_rate=args.error_rate,
+        port=args.twilio_port, record_replay=record_replay("twilio.jsonl"))
+    with plaid_server, twilio_server:
+        print(f"plaid stand-in listening on {plaid_server.url}")
+        print(f"twilio stand-in listening on {twilio_server.url}")
+        # seeds of the new transactions, distinct from the items' seeds
+        seeds = itertools.count(10 ** 6)
+        while True:
+            time.sleep(args.update_interval)
+            if args.webhook_url is None:
+                continue
+            for item in plaid_server.linked_items():
+                item.post_transactions(fake_transactions(
+                    3, [account["account_id"] for account in item.accounts],
+                    date.today(), days=1, seed=next(seeds)))
+
+
+if __name__ == "__main__":
+    main()
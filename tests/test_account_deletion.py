@@ -0,0 +1,116 @@
+from app import application, classes, db
+from plaid_methods.add_plaid_data import add_transactions
+from scripts.account_deletion import delete_account
+from tests.test_daily_spending import plaid_transaction
+import unittest
+from datetime import date
+from sqlalchemy.orm import Query
+from unittest import mock
+
+
+class TestAccountDeletion(unittest.TestCase):
+    """Class for testing the deletion of linked accounts"""
+
+    def setUp(self):
+        """Initialization for the test cases
+
+        This is executed prior to each test.
+        """
+        application.config['TESTING'] = True
+        db.drop_all()
+        db.create_all()
+
+        self.user = classes.User(first_name="first", last_name="last",
+                                 email="test@gmail.com", phone="9876543210",
+                                 password="password")
+        self.plaid_item = classes.PlaidItems(user=self.user,
+                                             item_id="item",
+                                             access_token="access")
+        self.accounts = [classes.Accounts(account_plaid_id=f"account{i}",
+                                          account_name="checking",
+                                          account_type="depository",
+                                          account_subtype="checking",
+                                          user=self.user,
+                                          plaid_item=self.plaid_item)
+                         for i in range(2)]
+        db.session.add_all([self.user, self.plaid_item] + self.accounts)
+        db.session.commit()
+        self.account_ids = [account.id for account in self.accounts]
+
+        add_transactions([plaid_transaction(f'2019-10-0{day}', day,
+                                            '13005043')
+                          for day in range(1, 8)],
+                         self.user, self.accounts[0])
+        add_transactions([plaid_transaction('2019-10-02', 1.25, '13005043')],
+                         self.user, self.accounts[1])
+
+    def tearDown(self):
+        """Clean-up for the test cases
+
+        This is executed after each test.
+        """
+        db.session.remove()
+
+    def rollup(self):
+        return {(row.spending_date, row.bucket):
+                (row.trans_count, float(row.trans_amount))
+                for row in classes.DailySpending.query}
+
+    ####################################################################
+    # Deletion Tests
+    ####################################################################
+    def test_delete_account_in_chunks(self):
+        access_token = delete_account(self.accounts[0], chunk_size=2)
+        self.assertIsNone(access_token)
+
+        self.assertIsNone(classes.Accounts.query.get(self.account_ids[0]))
+        self.assertEqual(classes.Transaction.query.filter_by(
+            account_id=self.account_ids[0]).count(), 0)
+        self.assertEqual(classes.Transaction.query.filter_by(
+            account_id=self.account_ids[1]).count(), 1)
+        self.assertEqual(self.rollup(),
+                         {(date(2019, 10, 2), 'coffee'): (1, 1.25)})
+        # the item still has an account
+        self.assertEqual(classes.PlaidItems.query.count(), 1)
+
+    def test_transactions_synced_after_last_chunk(self):
+        synced = []
+        with_for_update = Query.with_for_update
+
+        def sync_then_lock(query, *args, **kwargs):
+            # a sync commits a transaction after the last chunk is deleted
+            if not synced:
+                synced.append(True)
+                add_transactions([plaid_transaction('2019-10-09', 3,
+                                                    '13005043')],
+                                 self.user, self.accounts[0])
+            return with_for_update(query, *args, **kwargs)
+
+        with mock.patch.object(Query, "with_for_update", sync_then_lock):
+            delete_account(self.accounts[0])
+
+        self.assertTrue(synced)
+        self.assertEqual(classes.Transaction.query.filter_by(
+            account_id=self.account_ids[0]).count(), 0)
+        # the late transaction was taken out of the rollup too
+        self.assertEqual(self.rollup(),
+                         {(date(2019, 10, 2), 'coffee'): (1, 1.25)})
+
+    def test_delete_last_account_of_item(self):
+        db.session.add(classes.IngestJob(user_id=self.user.id,
+                                         plaid_item_id=self.plaid_item.id))
+        db.session.commit()
+
+        self.assertIsNone(delete_account(self.accounts[0]))
+        account = classes.Accounts.query.get(self.account_ids[1])
+        self.assertEqual(delete_account(account), "access")
+
+        self.assertEqual(classes.Accounts.query.count(), 0)
+        self.assertEqual(classes.Transaction.query.count(), 0)
+        self.assertEqual(classes.PlaidItems.query.count(), 0)
+        self.assertEqual(classes.IngestJob.query.count(), 0)
+        self.assertEqual(self.rollup(), {})
+
+
+if __name__ == "__main__":
+    unittest.main()
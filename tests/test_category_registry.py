@@ -0,0 +1,50 @@
+from scripts.category_registry import CategoryRegistry, get_registry
+import unittest
+
+
+class TestCategoryRegistry(unittest.TestCase):
+    """Class for testing the Plaid category registry"""
+
+    def setUp(self):
+        """Initialization for the test cases
+
+        This is executed prior to each test.
+        """
+        self.registry = get_registry()
+
+    def test_parsed_once(self):
+        self.assertIs(get_registry(), self.registry)
+
+    def test_prefix_index(self):
+        restaurants = self.registry.under("Food and Drink", "Restaurants")
+        self.assertIn("13005043", restaurants)
+        self.assertTrue(restaurants <= self.registry.under("Food and Drink"))
+        self.assertEqual(self.registry.under("Not a category"), frozenset())
+
+    def test_habit_buckets(self):
+        self.assertEqual(self.registry.habit_category_ids("coffee"),
+                         frozenset(["13005047", "13005043"]))
+        lunch = self.registry.habit_category_ids("lunch")
+        self.assertNotIn("13005043", lunch)
+        self.assertEqual(
+            lunch,
+            self.registry.under("Food and Drink", "Restaurants") -
+            {"13005001", "13005019", "13005024", "13005037", "13005043",
+             "13005047"})
+        self.assertIsNone(self.registry.habit_category_ids("gym"))
+
+    def test_habit_of_category(self):
+        self.assertEqual(self.registry.habit_of_category(13005047), "coffee")
+        self.assertEqual(self.registry.habit_of_category("22016000"),
+                         "transportation")
+        self.assertIsNone(self.registry.habit_of_category("10000000"))
+
+    def test_overlapping_habits(self):
+        categories = [{"category_id": "1", "hierarchy": ["A"]}]
+        habits = {"a": ((("A", ), ), (), ()), "b": ((), ("1", ), ())}
+        with self.assertRaises(ValueError):
+            CategoryRegistry(categories, habits)
+
+
+if __name__ == "__main__":
+    unittest.main()
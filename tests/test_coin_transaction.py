@@ -0,0 +1,144 @@
+from app import application, classes, db
+from scripts import coin_transaction
+from scripts.coin_transaction import lottery_drawing, lottery_entries, \
+    weighted_choice, add_login_coin, enter_lottery, record_coins
+import random
+import unittest
+from collections import Counter
+from datetime import datetime
+from unittest import mock
+
+
+class TestCoinTransaction(unittest.TestCase):
+    """Class for testing the coin transaction helpers"""
+
+    def setUp(self):
+        """Initialization for the test cases
+
+        This is executed prior to each test.
+        """
+        application.config['TESTING'] = True
+        application.config['WTF_CSRF_ENABLED'] = False
+        application.config['DEBUG'] = False
+        db.drop_all()
+        db.create_all()
+
+        self.users = [classes.User(first_name="first", last_name="last",
+                                   email=f"test{i}@gmail.com",
+                                   phone=f"987654321{i}",
+                                   password="password")
+                      for i in range(3)]
+        db.session.add_all(self.users)
+        db.session.commit()
+
+    def tearDown(self):
+        """Clean-up for the test cases
+
+        This is executed after each test.
+        """
+        db.session.remove()
+
+    def add_lottery(self, name, entries):
+        lottery = classes.Lottery(lottery_name=name,
+                                  start_date=datetime(2020, 5, 1),
+                                  end_date=datetime(2020, 5, 2),
+                                  category="test", cost=10)
+        db.session.add(lottery)
+        for user, count in zip(self.users, entries):
+            if count:
+                db.session.add(classes.UserLotteryLog(
+                    user=user, lottery=lottery, entries=count))
+        db.session.commit()
+        return lottery
+
+    ####################################################################
+    # Ledger Tests
+    ####################################################################
+    def test_login_coins_once_per_day(self):
+        user = self.users[0]
+        self.assertTrue(add_login_coin(user))
+        self.assertFalse(add_login_coin(user))
+        self.assertEqual(user.coins, 10)
+        self.assertIsNotNone(user.last_login_coin_date)
+        self.assertEqual(classes.Coin.query.one().description,
+                         "registration")
+
+    def test_spend_never_goes_negative(self):
+        user = self.users[0]
+        record_coins(user, 15, "saving")
+        db.session.commit()
+        lottery = self.add_lottery("lottery", [0, 0, 0])
+
+        self.assertTrue(enter_lottery(user, lottery))
+        self.assertFalse(enter_lottery(user, lottery))
+        self.assertEqual(user.coins, 5)
+        self.assertEqual(classes.Coin.query.count(), 2)
+        self.assertEqual(classes.UserLotteryLog.query.one().entries, 1)
+
+        record_coins(user, 10, "saving")
+        self.assertTrue(enter_lottery(user, lottery))
+        self.assertEqual(classes.UserLotteryLog.query.one().entries, 2)
+
+    ####################################################################
+    # Lottery Tests
+    ####################################################################
+    def test_weighted_choice_follows_entries(self):
+        rng = random.Random(0)
+        picks = Counter(weighted_choice([1, 2, 3], [1, 0, 3], rng)
+                        for _ in range(4000))
+        self.assertEqual(picks[2], 0)
+        self.assertAlmostEqual(picks[3] / picks[1], 3, delta=0.4)
+
+    def test_weighted_choice_with_numpy(self):
+        threshold = coin_transaction.NUMPY_THRESHOLD
+        coin_transaction.NUMPY_THRESHOLD = 0
+        try:
+            pick = weighted_choice([1, 2, 3], [0, 5, 0], random.Random(0))
+        finally:
+            coin_transaction.NUMPY_THRESHOLD = threshold
+        self.assertEqual(pick, 2)
+
+    def test_lottery_entries(self):
+        first = self.add_lottery("first", [2, 0, 1])
+        second = self.add_lottery("second", [0, 0, 0])
+        pools = lottery_entries([first.id, second.id])
+        self.assertEqual(pools, {first.id: ([self.users[0].id,
+                                             self.users[2].id], [2, 1])})
+
+    def test_lottery_drawing(self):
+        won = self.add_lottery("won", [0, 4, 0])
+        empty = self.add_lottery("empty", [0, 0, 0])
+        lottery_drawing(seed=1)
+
+        self.assertEqual(won.winner_user_id, self.users[1].id)
+        self.assertEqual(empty.winner_user_id, -1)
+        message = classes.Outbox.query.one()
+        self.assertEqual(message.to_phone, self.users[1].phone_e164)
+        self.assertEqual(message.idempotency_key, f"lottery:{won.id}")
+
+    def test_overlapping_drawings_notify_the_winner(self):
+        lottery = self.add_lottery("overlap", [1, 1, 1])
+        lottery_id = lottery.id
+        overlapped = []
+        entries = coin_transaction.lottery_entries
+
+        def draw_then_entries(lottery_ids):
+            # a redelivered tick draws the same lottery in between
+            if not overlapped:
+                overlapped.append(True)
+                lottery_drawing(seed=2)
+            return entries(lottery_ids)
+
+        with mock.patch.object(coin_transaction, "lottery_entries",
+                               draw_then_entries):
+            lottery_drawing(seed=5)
+
+        self.assertTrue(overlapped)
+        winner_user_id = classes.Lottery.query.get(lottery_id).winner_user_id
+        self.assertEqual(winner_user_id, self.users[0].id)
+        message = classes.Outbox.query.one()
+        self.assertEqual(message.user_id, winner_user_id)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+from app import application, classes, db
+from plaid_methods.add_plaid_data import add_transactions
+from scripts.daily_spending import rebuild_daily_spending, \
+    remove_account_spending
+import unittest
+from datetime import date
+
+
+def plaid_transaction(trans_date, amount, category_id):
+    location = dict(address=None, city=None, region=None, country=None,
+                    postal_code=None, lon=None, lat=None)
+    return {'date': trans_date, 'authorized_date': None, 'amount': amount,
+            'category': ['Food and Drink'], 'location': location,
+            'category_id': category_id}
+
+
+class TestDailySpending(unittest.TestCase):
+    """Class for testing the daily_spending rollup"""
+
+    def setUp(self):
+        """Initialization for the test cases
+
+        This is executed prior to each test.
+        """
+        application.config['TESTING'] = True
+        db.drop_all()
+        db.create_all()
+
+        self.user = classes.User(first_name="first", last_name="last",
+                                 email="test@gmail.com", phone="9876543210",
+                                 password="password")
+        db.session.add(self.user)
+        self.accounts = [classes.Accounts(account_plaid_id=f"account{i}",
+                                          account_name="checking",
+                                          account_type="depository",
+                                          account_subtype="checking",
+                                          user=self.user)
+                         for i in range(2)]
+        db.session.add_all(self.accounts)
+        db.session.commit()
+
+    def tearDown(self):
+        """Clean-up for the test cases
+
+        This is executed after each test.
+        """
+        db.session.remove()
+
+    def rollup(self):
+        return {(row.spending_date, row.bucket):
+                (row.trans_count, float(row.trans_amount))
+                for row in classes.DailySpending.query}
+
+    ####################################################################
+    # Rollup Tests
+    ####################################################################
+    def test_add_transactions_updates_rollup(self):
+        add_transactions([plaid_transaction('2019-10-02', 4.5, '13005043'),
+                          plaid_transaction('2019-10-02', 3.25, '13005047'),
+                          plaid_transaction('2019-10-02', 20, '10000000')],
+                         self.user, self.accounts[0])
+        add_transactions([plaid_transaction('2019-10-02', 1.25, '13005043'),
+                          plaid_transaction('2019-10-03', 12, '13005000')],
+                         self.user, self.accounts[1])
+        expected = {(date(2019, 10, 2), 'coffee'): (3, 9.0),
+                    (date(2019, 10, 2), 'other'): (1, 20.0),
+                    (date(2019, 10, 3), 'lunch'): (1, 12.0)}
+        self.assertEqual(self.rollup(), expected)
+
+        # the incremental rollup matches one rebuilt from transactions
+        self.assertEqual(rebuild_daily_spending(chunk_size=1), 3)
+        self.assertEqual(self.rollup(), expected)
+
+    def test_remove_account_spending(self):
+        add_transactions([plaid_transaction('2019-10-02', 4.5, '13005043'),
+                          plaid_transaction('2019-10-03', 12, '13005000')],
+                         self.user, self.accounts[0])
+        add_transactions([plaid_transaction('2019-10-02', 1.25, '13005043')],
+                         self.user, self.accounts[1])
+        remove_account_spending(self.accounts[0].id)
+        db.session.commit()
+        self.assertEqual(self.rollup(),
+                         {(date(2019, 10, 2), 'coffee'): (1, 1.25)})
+
+
+if __name__ == "__main__":
+    unittest.main()
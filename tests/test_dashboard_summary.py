@@ -0,0 +1,89 @@
+from app import application, classes, db
+from app.plotly_dashboard import percent_saved_series, \
+    saving_history_series, select_past_week
+from scripts.dashboard_summary import saving_summary
+import unittest
+from datetime import date, timedelta
+
+
+class TestDashboardSummary(unittest.TestCase):
+    """Class for testing the dashboard saving summary"""
+
+    def setUp(self):
+        """Initialization for the test cases
+
+        This is executed prior to each test.
+        """
+        application.config['TESTING'] = True
+        db.drop_all()
+        db.create_all()
+
+        self.user = classes.User(first_name="first", last_name="last",
+                                 email="test@gmail.com", phone="9876543210",
+                                 password="password")
+        db.session.add(self.user)
+        db.session.commit()
+        self.today = date(2020, 6, 3)
+
+    def tearDown(self):
+        """Clean-up for the test cases
+
+        This is executed after each test.
+        """
+        db.session.remove()
+
+    def add_coins(self, days_ago, amount=10, description="saving"):
+        db.session.add(classes.Coin(
+            user_id=self.user.id, coin_amount=amount,
+            log_date=self.today - timedelta(days=days_ago),
+            description=description))
+
+    ####################################################################
+    # Summary Tests
+    ####################################################################
+    def test_summary_groups_by_day(self):
+        for days_ago in [0, 0, 3, 9, 20]:
+            self.add_coins(days_ago)
+        self.add_coins(0, amount=2, description="login")
+        db.session.commit()
+
+        summary = saving_summary(self.user.id, self.today)
+        self.assertEqual(
+            [tuple(row) for row in summary.daily],
+            [(self.today - timedelta(days=20), 10, 1),
+             (self.today - timedelta(days=9), 10, 1),
+             (self.today - timedelta(days=3), 10, 1),
+             (self.today, 20, 2)])
+        self.assertEqual(summary.this_week, 3)
+        self.assertEqual(summary.last_week, 1)
+        self.assertEqual(summary.num_saved, 5)
+        self.assertEqual(select_past_week(summary.this_week,
+                                          summary.last_week), (200, 30))
+
+    def test_summary_without_savings(self):
+        summary = saving_summary(self.user.id, self.today)
+        self.assertEqual(tuple(summary), ([], 0, 0, 0))
+        self.assertEqual(select_past_week(0, 0), (0, 0))
+        self.assertIsNone(saving_history_series(summary.daily))
+
+    def test_saving_history_series(self):
+        self.add_coins(10)
+        self.add_coins(3)
+        self.add_coins(3)
+        db.session.commit()
+        series = saving_history_series(
+            saving_summary(self.user.id, self.today).daily, self.today)
+        self.assertEqual(series["date"][:3],
+                         ["2020-05-24", "2020-05-31", "2020-06-01"])
+        self.assertEqual(series["coins"][:3], [10, 30, 30])
+        self.assertEqual(series["date"][-1], "2020-06-03")
+        self.assertEqual(series["coins"][-1], 30)
+        self.assertEqual(series["range"], ["2020-05-27", "2020-06-03"])
+
+    def test_percent_saved_series(self):
+        self.assertEqual(percent_saved_series(3, 5),
+                         {"labels": ["Saved", "Unsaved"], "values": [3, 2]})
+
+
+if __name__ == "__main__":
+    unittest.main()
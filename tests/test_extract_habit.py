@@ -0,0 +1,109 @@
+from app import application, classes, db
+from scripts.daily_spending import rebuild_daily_spending
+from scripts.category_registry import CATEGORIES_FILE
+from scripts.extract_habit import HabitStats, Insights, habit_stats
+from scripts.fragment_cache import graph_cache
+import collections
+import unittest
+from datetime import date, datetime
+from unittest import mock
+
+
+class TestExtractHabit(unittest.TestCase):
+    """Class for testing the spending insights"""
+
+    def setUp(self):
+        """Initialization for the test cases
+
+        This is executed prior to each test.
+        """
+        application.config['TESTING'] = True
+        db.drop_all()
+        db.create_all()
+        graph_cache.clear()
+
+        self.user = classes.User(first_name="first", last_name="last",
+                                 email="test@gmail.com", phone="9876543210",
+                                 password="password")
+        db.session.add(self.user)
+        db.session.commit()
+        self.month = datetime(2019, 10, 1)
+
+        # 2019-10-01 is a Tuesday
+        for day, amount, category_id in [
+                (1, 4.5, 13005043),    # coffee shop
+                (1, 3.5, 13005047),    # cafe
+                (7, 2.0, 13005043),    # coffee shop, Monday
+                (2, 12.25, 13005000),  # restaurant
+                (3, 30.0, 22016000),   # taxi
+                (31, 9.0, 13005043),   # coffee shop, last day
+                (15, 50.0, 10000000),  # bank fees
+                ]:
+            self.add_transaction(date(2019, 10, day), amount, category_id)
+        self.add_transaction(date(2019, 11, 1), 4.0, 13005043)
+        db.session.commit()
+        rebuild_daily_spending()
+
+    def tearDown(self):
+        """Clean-up for the test cases
+
+        This is executed after each test.
+        """
+        db.session.remove()
+        graph_cache.clear()
+
+    def add_transaction(self, trans_date, amount, category_id):
+        db.session.add(classes.Transaction(
+            user=self.user, trans_amount=amount, category_id=category_id,
+            trans_date=trans_date))
+
+    ####################################################################
+    # Stats Tests
+    ####################################################################
+    def test_habit_stats(self):
+        stats = habit_stats(self.user.id, self.month, datetime(2019, 11, 1))
+        self.assertEqual(stats["coffee"],
+                         HabitStats(4, 19.0, 4.75, (1, 2, 0, 1, 0, 0, 0)))
+        self.assertEqual(stats["lunch"],
+                         HabitStats(1, 12.25, 12.25, (0, 0, 1, 0, 0, 0, 0)))
+        self.assertEqual(stats["transportation"].num_per_day,
+                         (0, 0, 0, 1, 0, 0, 0))
+
+    def test_habit_stats_subset(self):
+        stats = habit_stats(self.user.id, self.month, datetime(2019, 11, 1),
+                            habit_names=["lunch", "gym"])
+        self.assertEqual(list(stats), ["lunch"])
+
+    ####################################################################
+    # Insights Tests
+    ####################################################################
+    def test_insights_for_user(self):
+        thresholds = collections.OrderedDict(
+            [('transportation', 1), ('coffee', 4), ('lunch', 2)])
+        with mock.patch.object(Insights, "num_per_day_graph",
+                               return_value="graph"):
+            insights_list = Insights.for_user(self.user.id, self.month,
+                                              thresholds)
+        self.assertEqual([insights.habit_name for insights in insights_list],
+                         ['transportation', 'coffee'])
+        coffee = insights_list[1]
+        self.assertEqual(coffee.num, 4)
+        self.assertEqual(coffee.tot_amount, 19.0)
+        self.assertEqual(coffee.avg_amount, 4.75)
+        self.assertEqual(coffee.recommended, 3)
+        self.assertEqual(coffee.yearly_saving, 57.0)
+        self.assertEqual(coffee.graph, "graph")
+
+    def test_single_insights(self):
+        with mock.patch.object(Insights, "num_per_day_graph",
+                               return_value="graph"):
+            insights = Insights(self.user.id, self.month, CATEGORIES_FILE,
+                                'coffee', 5)
+            self.assertIsNone(insights.stats)
+            insights = Insights(self.user.id, self.month, CATEGORIES_FILE,
+                                'gym', 0)
+            self.assertIsNone(insights.stats)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,107 @@
+from app import application, classes, db
+from scripts.daily_spending import rebuild_daily_spending
+from scripts.category_registry import CATEGORIES_FILE
+from scripts.extract_habit import Insights
+from scripts.fragment_cache import FragmentCache, graph_cache
+from plaid_methods.add_plaid_data import add_transactions
+import shutil
+import tempfile
+import unittest
+from datetime import date, datetime
+from unittest import mock
+
+
+class TestFragmentCache(unittest.TestCase):
+    """Class for testing the rendered fragment cache"""
+
+    def setUp(self):
+        """Initialization for the test cases
+
+        This is executed prior to each test.
+        """
+        application.config['TESTING'] = True
+        db.drop_all()
+        db.create_all()
+        graph_cache.clear()
+
+        self.user = classes.User(first_name="first", last_name="last",
+                                 email="test@gmail.com", phone="9876543210",
+                                 password="password")
+        db.session.add(self.user)
+        db.session.commit()
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """Clean-up for the test cases
+
+        This is executed after each test.
+        """
+        db.session.remove()
+        graph_cache.clear()
+        shutil.rmtree(self.directory)
+
+    def add_coffee(self, day):
+        db.session.add(classes.Transaction(
+            user=self.user, trans_amount=4.5, category_id=13005043,
+            trans_date=date(2019, 10, day)))
+        db.session.commit()
+        rebuild_daily_spending()
+
+    def insights(self):
+        return Insights(self.user.id, datetime(2019, 10, 1), CATEGORIES_FILE,
+                        'coffee', 1)
+
+    ####################################################################
+    # Cache Tests
+    ####################################################################
+    def test_lru_eviction(self):
+        cache = FragmentCache(maxsize=2)
+        cache.set((1, "a"), "A")
+        cache.set((1, "b"), "B")
+        cache.get((1, "a"))
+        cache.set((1, "c"), "C")
+        self.assertEqual(cache.get((1, "a")), "A")
+        self.assertIsNone(cache.get((1, "b")))
+        self.assertEqual(cache.get((1, "c")), "C")
+
+    def test_disk_shared_between_caches(self):
+        FragmentCache(directory=self.directory).set((1, "a"), "A")
+        other = FragmentCache(directory=self.directory)
+        self.assertEqual(other.get((1, "a")), "A")
+        other.invalidate_user(1)
+        self.assertIsNone(FragmentCache(directory=self.directory)
+                          .get((1, "a")))
+
+    def test_invalidate_user(self):
+        cache = FragmentCache()
+        cache.set((1, "a"), "A")
+        cache.set((2, "a"), "B")
+        cache.invalidate_user(1)
+        self.assertIsNone(cache.get((1, "a")))
+        self.assertEqual(cache.get((2, "a")), "B")
+
+    ####################################################################
+    # Insights Tests
+    ####################################################################
+    def test_repeat_insights_skip_rendering(self):
+        self.add_coffee(2)
+        with mock.patch.object(Insights, "num_per_day_graph",
+                               return_value="graph") as render:
+            self.assertEqual(self.insights().graph, "graph")
+            self.assertEqual(self.insights().graph, "graph")
+            self.assertEqual(render.call_count, 1)
+
+            # new transactions change the key of the chart
+            self.add_coffee(3)
+            self.insights()
+            self.assertEqual(render.call_count, 2)
+
+    def test_add_transactions_invalidates_user(self):
+        graph_cache.set((self.user.id, "coffee", "2019-10", "digest"), "old")
+        add_transactions([], self.user, None)
+        self.assertIsNone(
+            graph_cache.get((self.user.id, "coffee", "2019-10", "digest")))
+
+
+if __name__ == "__main__":
+    unittest.main()
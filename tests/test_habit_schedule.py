@@ -0,0 +1,127 @@
+from app import application, classes, db
+from scripts.habit_schedule import next_fire_time, schedule_habit, \
+    save_habits, due_habits
+import unittest
+from datetime import datetime
+
+
+class TestHabitSchedule(unittest.TestCase):
+    """Class for testing the habit reminder schedule"""
+
+    def setUp(self):
+        """Initialization for the test cases
+
+        This is executed prior to each test.
+        """
+        application.config['TESTING'] = True
+        application.config['WTF_CSRF_ENABLED'] = False
+        application.config['DEBUG'] = False
+        db.drop_all()
+        db.create_all()
+
+        self.test_user = classes.User(first_name="first",
+                                      last_name="last",
+                                      email="test@gmail.com",
+                                      phone="9876543210",
+                                      password="password")
+        db.session.add(self.test_user)
+        db.session.commit()
+
+    def tearDown(self):
+        """Clean-up for the test cases
+
+        This is executed after each test.
+        """
+        db.session.remove()
+
+    ####################################################################
+    # Schedule Tests
+    ####################################################################
+    def test_next_fire_time_same_day(self):
+        # Wednesday 2020-05-20 08:00 PDT == 15:00 UTC
+        after = datetime(2020, 5, 20, 15, 0)
+        fire_at = next_fire_time("weekday", 10, 25, after)
+        # 10:25 PDT == 17:25 UTC
+        self.assertEqual(fire_at, datetime(2020, 5, 20, 17, 25))
+
+    def test_next_fire_time_skips_to_weekend(self):
+        # Wednesday 2020-05-20 08:00 PDT
+        after = datetime(2020, 5, 20, 15, 0)
+        fire_at = next_fire_time("weekend", 7, 0, after)
+        # Saturday 2020-05-23 07:00 PDT == 14:00 UTC
+        self.assertEqual(fire_at, datetime(2020, 5, 23, 14, 0))
+
+    def test_next_fire_time_is_strictly_after(self):
+        after = datetime(2020, 5, 20, 17, 25)
+        fire_at = next_fire_time("everyday", 10, 25, after)
+        self.assertEqual(fire_at, datetime(2020, 5, 21, 17, 25))
+
+    def test_due_habits(self):
+        now = datetime(2020, 5, 20, 17, 30)
+        due = classes.Habits(user=self.test_user, habit_name="coffee",
+                             habit_category="Coffee", time_minute=25,
+                             time_hour=10, time_day_of_week="weekday")
+        schedule_habit(due, datetime(2020, 5, 20, 15, 0))
+        not_due = classes.Habits(user=self.test_user, habit_name="lunch",
+                                 habit_category="Lunch", time_minute=0,
+                                 time_hour=12, time_day_of_week="weekday")
+        schedule_habit(not_due, datetime(2020, 5, 20, 15, 0))
+        db.session.add_all([due, not_due])
+        db.session.commit()
+
+        habits = due_habits(now)
+        self.assertEqual([h.habit_name for h in habits], ["coffee"])
+
+        # once fired, the habit is rescheduled to the next weekday
+        schedule_habit(habits[0], now)
+        db.session.commit()
+        self.assertEqual(due_habits(now), [])
+        self.assertEqual(habits[0].next_fire_at,
+                         datetime(2020, 5, 21, 17, 25))
+
+    def test_save_habits(self):
+        now = datetime(2020, 5, 20, 15, 0)
+        habits = [classes.Habits(user=self.test_user, habit_name=name,
+                                 habit_category="Coffee", time_minute=0,
+                                 time_hour=hour, time_day_of_week="weekday")
+                  for name, hour in [("renamed", 9), ("moved", 10),
+                                     ("deleted", 11), ("unchanged", 12)]]
+        for habit in habits:
+            schedule_habit(habit, now)
+        db.session.add_all(habits)
+        db.session.commit()
+        renamed, moved, deleted, unchanged = [habit.id for habit in habits]
+        fire_times = {habit.id: habit.next_fire_at for habit in habits}
+
+        def row(habit_id, name, hour):
+            return {"id": habit_id, "habit_name": name,
+                    "habit_category": "Coffee", "time_hour": hour,
+                    "time_minute": 0, "time_day_of_week": "weekday"}
+
+        later = datetime(2020, 5, 20, 18, 0)
+        counts = save_habits(self.test_user.id,
+                             [row(renamed, "coffee", 9),
+                              row(moved, "moved", 13),
+                              row(unchanged, "unchanged", 12),
+                              row(None, "new", 14)], later)
+        db.session.commit()
+        self.assertEqual(counts, (1, 2, 1))
+
+        saved = {habit.habit_name: habit for habit in
+                 classes.Habits.query.filter_by(user_id=self.test_user.id)}
+        self.assertEqual(sorted(saved), ["coffee", "moved", "new",
+                                         "unchanged"])
+        self.assertIsNone(classes.Habits.query.get(deleted))
+        # only the new habit and the moved one are rescheduled
+        self.assertEqual(saved["coffee"].next_fire_at, fire_times[renamed])
+        self.assertEqual(saved["unchanged"].next_fire_at,
+                         fire_times[unchanged])
+        # 13:00 PDT == 20:00 UTC, 14:00 PDT == 21:00 UTC
+        self.assertEqual(saved["moved"].next_fire_at,
+                         datetime(2020, 5, 20, 20, 0))
+        self.assertEqual(saved["new"].next_fire_at,
+                         datetime(2020, 5, 20, 21, 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,109 @@
+from app import application
+from plaid.errors import InvalidRequestError
+from plaid_methods import methods
+from scripts.fake_plaid import FakePlaidServer, fake_transactions
+from scripts.http_transport import HttpTransport, PooledPlaidClient, \
+    PooledTwilioHttpClient
+import json
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from unittest import mock
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        status = self.server.statuses.pop(0) if self.server.statuses \
+            else 201
+        payload = json.dumps({"sid": "SM123", "status": "queued"}).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestHttpTransport(unittest.TestCase):
+    """Class for testing the pooled HTTP transport"""
+
+    def setUp(self):
+        """Initialization for the test cases
+
+        This is executed prior to each test.
+        """
+        application.config['TESTING'] = True
+        self.transport = HttpTransport(pool_size=2, retries=2, backoff=0)
+
+        self.stub = HTTPServer(("127.0.0.1", 0), StubHandler)
+        self.stub.statuses = []
+        threading.Thread(target=self.stub.serve_forever, args=(0.05,),
+                         daemon=True).start()
+        self.stub_url = "http://127.0.0.1:%d" % self.stub.server_address[1]
+
+    def tearDown(self):
+        """Clean-up for the test cases
+
+        This is executed after each test.
+        """
+        self.transport.close()
+        self.stub.shutdown()
+        self.stub.server_close()
+
+    ####################################################################
+    # Transport Tests
+    ####################################################################
+    def test_plaid_requests_reuse_connection(self):
+        transactions = fake_transactions(250)
+        with FakePlaidServer(transactions) as server:
+            client = PooledPlaidClient("id", "secret", "key", "sandbox",
+                                       self.transport, base_url=server.url)
+            fetched = methods.get_transactions(
+                client, "2000-01-01", "2100-01-01", "token", "acc",
+                page_size=50, concurrency=1)
+            with self.assertRaises(InvalidRequestError):
+                client.Categories.get()
+        self.assertEqual(len(fetched), 250)
+        stats = self.transport.stats()
+        self.assertEqual(stats["requests"], 6)
+        self.assertEqual(stats["connections_opened"], 1)
+        self.assertEqual(stats["connections_reused"], 5)
+
+    def test_twilio_requests_through_pool(self):
+        http_client = PooledTwilioHttpClient(self.transport)
+        self.assertEqual(http_client.timeout, self.transport.timeout)
+        for _ in range(3):
+            response = http_client.request(
+                "POST", self.stub_url + "/2010-04-01/Messages.json",
+                data={"Body": "hi"})
+            self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.transport.stats()["connections_opened"], 1)
+
+    def test_throttled_request_retried(self):
+        self.stub.statuses = [429]
+        response = self.transport.request("POST", self.stub_url)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.transport.stats()["retries"], 1)
+
+        # the budget is spent after `retries` retries
+        self.stub.statuses = [429] * 3
+        response = self.transport.request("POST", self.stub_url)
+        self.assertEqual(response.status_code, 429)
+
+    def test_new_session_after_fork(self):
+        session = self.transport.session
+        self.assertIs(self.transport.session, session)
+        with mock.patch("scripts.http_transport.os.getpid",
+                        return_value=-1):
+            forked = self.transport.session
+            self.assertIsNot(forked, session)
+            self.assertEqual(self.transport.stats()["requests"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
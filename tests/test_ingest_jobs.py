@@ -0,0 +1,190 @@
+from app import application, classes, db
+from scripts.daily_activity import local_today
+from scripts.fake_plaid import FakePlaidClient, fake_transactions, \
+    webhook_payload
+from scripts import ingest_jobs
+from scripts.ingest_jobs import enqueue_ingest, claim_job, run_job, \
+    run_worker, CLAIM_LEASE_SECONDS, MAX_ATTEMPTS
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+
+
+class TestIngestJobs(unittest.TestCase):
+    """Class for testing the background Plaid ingestion jobs"""
+
+    def setUp(self):
+        """Initialization for the test cases
+
+        This is executed prior to each test.
+        """
+        application.config['TESTING'] = True
+        application.config['WTF_CSRF_ENABLED'] = False
+        application.config['DEBUG'] = False
+        application.config['PLAID_PAGE_SIZE'] = 50
+        self.app = application.test_client()
+        db.drop_all()
+        db.create_all()
+
+        self.user = classes.User(first_name="first", last_name="last",
+                                 email="test@gmail.com", phone="9876543210",
+                                 password="password")
+        self.item = classes.PlaidItems(user=self.user, access_token="token",
+                                       item_id="item")
+        self.account = classes.Accounts(account_plaid_id="acc",
+                                        account_name="checking",
+                                        account_type="depository",
+                                        account_subtype="checking",
+                                        user=self.user,
+                                        plaid_item=self.item)
+        db.session.add_all([self.user, self.item, self.account])
+        db.session.commit()
+
+        self.client = FakePlaidClient(
+            fake_transactions(120, end=local_today(), days=60))
+
+    def tearDown(self):
+        """Clean-up for the test cases
+
+        This is executed after each test.
+        """
+        application.config['PLAID_PAGE_SIZE'] = 500
+        db.session.remove()
+
+    ####################################################################
+    # Ingest Job Tests
+    ####################################################################
+    def test_enqueue_once_per_item(self):
+        first = enqueue_ingest(self.item)
+        db.session.commit()
+        self.assertIs(enqueue_ingest(self.item), first)
+        db.session.commit()
+        self.assertEqual(classes.IngestJob.query.count(), 1)
+        self.assertEqual(first.user_id, self.user.id)
+
+    def test_job_records_progress(self):
+        enqueue_ingest(self.item)
+        db.session.commit()
+        job = claim_job("worker")
+        self.assertEqual((job.status, job.attempts), ("running", 1))
+        self.assertIsNone(claim_job("other worker"))
+
+        run_job(job, self.client)
+        self.assertEqual(job.status, "done")
+        self.assertEqual(job.pages_fetched, 3)
+        self.assertEqual(job.rows_written, 120)
+        self.assertIsNotNone(job.finished_at)
+        self.assertEqual(len(self.account.transaction), 120)
+
+    def test_long_sync_keeps_its_claim(self):
+        enqueue_ingest(self.item)
+        db.session.commit()
+        job = claim_job("worker")
+        # the sync has been running for longer than the lease
+        job.claimed_at -= timedelta(seconds=CLAIM_LEASE_SECONDS + 60)
+        db.session.commit()
+        reclaimed = []
+        sync_item = ingest_jobs.sync_item
+
+        def sync_then_reclaim(*args, on_page, **kwargs):
+            def page_then_reclaim(transactions):
+                on_page(transactions)
+                reclaimed.append(claim_job("other worker"))
+            return sync_item(*args, on_page=page_then_reclaim, **kwargs)
+
+        with mock.patch.object(ingest_jobs, "sync_item", sync_then_reclaim):
+            run_job(job, self.client)
+        self.assertEqual(reclaimed, [None] * 3)
+        self.assertEqual((job.status, job.attempts), ("done", 1))
+
+    def test_transient_error_is_retried(self):
+        job = enqueue_ingest(self.item)
+        db.session.commit()
+        self.client.errors = [("API_ERROR", "INTERNAL_SERVER_ERROR")]
+        run_job(claim_job("worker"), self.client)
+        self.assertEqual(job.status, "pending")
+        self.assertEqual(job.last_error, "INTERNAL_SERVER_ERROR")
+        self.assertGreater(job.next_attempt_at, datetime.utcnow())
+        self.assertIsNone(claim_job("worker"))
+
+        job.next_attempt_at = datetime.utcnow()
+        db.session.commit()
+        run_worker(self.client, once=True)
+        self.assertEqual((job.status, job.attempts), ("done", 2))
+
+    def test_failed_after_max_attempts(self):
+        job = enqueue_ingest(self.item)
+        db.session.commit()
+        self.client.errors = [("API_ERROR", "INTERNAL_SERVER_ERROR")] * \
+            MAX_ATTEMPTS
+        for _ in range(MAX_ATTEMPTS):
+            run_job(claim_job("worker", now=datetime.utcnow() +
+                              timedelta(days=1)), self.client)
+        self.assertEqual(job.status, "failed")
+        self.assertIsNotNone(job.finished_at)
+
+    def test_permanent_error_fails(self):
+        job = enqueue_ingest(self.item)
+        db.session.commit()
+        self.client.errors = [("ITEM_ERROR", "ITEM_LOGIN_REQUIRED")]
+        run_job(claim_job("worker"), self.client)
+        self.assertEqual((job.status, job.last_error),
+                         ("failed", "ITEM_LOGIN_REQUIRED"))
+
+    def test_status_endpoint(self):
+        enqueue_ingest(self.item)
+        db.session.commit()
+        job_id = classes.IngestJob.query.one().id
+        with self.app:
+            self.app.post('/login', data=dict(email='test@gmail.com',
+                                              password='password'))
+            pending = self.app.get('/dashboard/ingest_jobs.json').get_json()
+            run_job(claim_job("worker"), self.client)
+            done = self.app.get('/dashboard/ingest_jobs.json').get_json()
+        self.assertEqual(pending['jobs'][0]['status'], 'pending')
+        self.assertEqual(done['jobs'][0]['id'], job_id)
+        self.assertEqual(done['jobs'][0]['status'], 'done')
+        self.assertEqual(done['jobs'][0]['rows_written'], 120)
+
+    ####################################################################
+    # Webhook Tests
+    ####################################################################
+    def post_webhook(self, payload):
+        return self.app.post('/plaid/webhook', json=payload).get_json()
+
+    def transaction_count(self):
+        return classes.Transaction.query.count()
+
+    def test_webhooks_schedule_syncs(self):
+        self.client.webhook = self.post_webhook
+        self.client.link_item("item")
+        job = classes.IngestJob.query.one()
+        self.assertEqual(job.kind, "historical_update")
+        run_worker(self.client, once=True)
+        self.assertEqual(self.transaction_count(), 120)
+        self.assertEqual(self.client.calls[-1][1],
+                         application.config["PLAID_SYNC_START"])
+
+        self.client.post_transactions(
+            fake_transactions(3, end=local_today(), days=1, seed=1), "item")
+        job = classes.IngestJob.query.filter_by(status="pending").one()
+        self.assertEqual(job.kind, "default_update")
+        run_worker(self.client, once=True)
+        self.assertEqual(self.transaction_count(), 123)
+        # only the days since the last sync are fetched again
+        self.assertGreater(self.client.calls[-1][1],
+                           application.config["PLAID_SYNC_START"])
+
+    def test_unrelated_webhooks_ignored(self):
+        self.assertEqual(
+            self.post_webhook(webhook_payload("other item", "DEFAULT_UPDATE")),
+            {"queued": False})
+        self.assertEqual(
+            self.post_webhook(dict(webhook_payload("item", "DEFAULT_UPDATE"),
+                                   webhook_type="ITEM")),
+            {"queued": False})
+        self.assertEqual(classes.IngestJob.query.count(), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
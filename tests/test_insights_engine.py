@@ -0,0 +1,152 @@
+from app import application, classes, db
+from scripts.daily_spending import rebuild_daily_spending
+from scripts.extract_habit import HabitStats, next_month
+from scripts.fragment_cache import graph_cache
+from scripts.insights_engine import InsightsEngine
+import collections
+import unittest
+import numpy as np
+from datetime import date, datetime, timedelta
+from unittest import mock
+
+
+class TestInsightsEngine(unittest.TestCase):
+    """Class for testing the vectorised insights engine"""
+
+    def setUp(self):
+        """Initialization for the test cases
+
+        This is executed prior to each test.
+        """
+        application.config['TESTING'] = True
+        db.drop_all()
+        db.create_all()
+        graph_cache.clear()
+
+        self.user = classes.User(first_name="first", last_name="last",
+                                 email="test@gmail.com", phone="9876543210",
+                                 password="password")
+        db.session.add(self.user)
+        db.session.commit()
+
+    def tearDown(self):
+        """Clean-up for the test cases
+
+        This is executed after each test.
+        """
+        db.session.remove()
+        graph_cache.clear()
+
+    def add_transaction(self, trans_date, amount, category_id):
+        db.session.add(classes.Transaction(
+            user=self.user, trans_amount=amount, category_id=category_id,
+            trans_date=trans_date))
+
+    ####################################################################
+    # Engine Tests
+    ####################################################################
+    def test_load_and_windows(self):
+        as_of = date(2019, 11, 1)
+        for days_ago, amount, category_id in [
+                (1, 4.0, 13005043),    # coffee, Thursday
+                (30, 6.0, 13005047),   # cafe, Wednesday
+                (31, 5.0, 13005043),   # coffee, outside 30 days
+                (200, 20.0, 22016000),  # taxi
+                (400, 9.0, 13005043),  # outside every window
+                (2, 50.0, 10000000),   # bank fees, not a habit
+                ]:
+            self.add_transaction(as_of - timedelta(days=days_ago), amount,
+                                 category_id)
+        self.add_transaction(as_of, 7.0, 13005043)  # excluded, as_of
+        db.session.commit()
+        rebuild_daily_spending()
+
+        engine = InsightsEngine.load(self.user.id)
+        self.assertEqual(len(engine.days), 6)
+        stats = engine.window_stats(as_of)
+        self.assertEqual(stats[30], {
+            "coffee": HabitStats(2, 10.0, 5.0, (0, 0, 1, 1, 0, 0, 0))})
+        self.assertEqual(stats[90]["coffee"].num, 3)
+        self.assertNotIn("transportation", stats[90])
+        self.assertEqual(stats[365]["transportation"].tot_amount, 20.0)
+        self.assertEqual(engine.default_as_of(), as_of + timedelta(days=1))
+
+    def test_windows_match_naive(self):
+        rng = np.random.RandomState(0)
+        n = 5000
+        as_of = date(2020, 6, 1)
+        days = np.datetime64(as_of, "D") - rng.randint(0, 800, n)
+        amounts = rng.uniform(1, 30, n).round(2)
+        habits = rng.randint(0, 3, n)
+        names = ["coffee", "lunch", "transportation"]
+        engine = InsightsEngine(1, days, amounts, habits, names)
+        stats = engine.window_stats(as_of)
+
+        for window in (30, 90, 365):
+            for h, name in enumerate(names):
+                num_per_day = [0] * 7
+                total = 0.0
+                for day, amount, habit in zip(days.astype(object), amounts,
+                                              habits):
+                    if habit == h and 1 <= (as_of - day).days <= window:
+                        num_per_day[day.weekday()] += 1
+                        total += amount
+                self.assertEqual(stats[window][name].num_per_day,
+                                 tuple(num_per_day))
+                self.assertAlmostEqual(stats[window][name].tot_amount,
+                                       round(total, 2))
+
+    def test_monthly(self):
+        for trans_date, amount, category_id in [
+                (date(2019, 11, 3), 4.0, 13005043),
+                (date(2019, 11, 20), 6.0, 13005043),
+                (date(2020, 1, 5), 12.0, 13005000)]:
+            self.add_transaction(trans_date, amount, category_id)
+        db.session.commit()
+        rebuild_daily_spending()
+
+        monthly = InsightsEngine.load(self.user.id).monthly() \
+            .set_index(["habit", "month"])
+        self.assertEqual(len(monthly), 9)
+        self.assertEqual(monthly.loc[("coffee", "2019-11-01"), "num"], 2)
+        self.assertEqual(
+            monthly.loc[("coffee", "2019-11-01"), "tot_amount"], 10.0)
+        self.assertEqual(monthly.loc[("coffee", "2019-12-01"), "num"], 0)
+        self.assertEqual(monthly.loc[("lunch", "2020-01-01"), "num"], 1)
+
+    def test_empty(self):
+        engine = InsightsEngine.load(self.user.id)
+        self.assertEqual(engine.window_stats(date(2020, 1, 1)),
+                         {30: {}, 90: {}, 365: {}})
+        self.assertTrue(engine.monthly().empty)
+        self.assertEqual(engine.insights({'coffee': 1}), [])
+
+    def test_insights(self):
+        as_of = date(2019, 11, 1)
+        for days_ago in range(1, 11):
+            self.add_transaction(as_of - timedelta(days=days_ago), 5.0,
+                                 13005043)
+        db.session.commit()
+        rebuild_daily_spending()
+        thresholds = collections.OrderedDict([('coffee', 8), ('lunch', 1)])
+        with mock.patch("scripts.extract_habit.Insights.num_per_day_graph",
+                        return_value="graph"):
+            insights_list = InsightsEngine.load(self.user.id).insights(
+                thresholds, 30, as_of)
+            self.assertEqual(len(insights_list), 1)
+            self.assertEqual(insights_list[0].recommended, 8)
+            self.assertEqual(insights_list[0].yearly_saving, 120.0)
+
+            # over 90 days the projection counts 4 periods per year
+            insights_list = InsightsEngine.load(self.user.id).insights(
+                thresholds, 90, as_of)
+            self.assertEqual(insights_list[0].yearly_saving, 40.0)
+
+    def test_next_month(self):
+        self.assertEqual(next_month(date(2019, 12, 1)), datetime(2020, 1, 1))
+        self.assertEqual(next_month(date(2019, 10, 1)),
+                         datetime(2019, 11, 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
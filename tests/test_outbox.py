@@ -0,0 +1,166 @@
+from app import application, classes, db
+from scripts.habit_schedule import schedule_habit
+from scripts.outbox import enqueue_messages, claim_batch, deliver_batch, \
+    run_worker, socket_timeout, MAX_ATTEMPTS
+from scripts.http_transport import transport as http_transport
+from scripts.sms_dispatch import FakeTransport
+from scripts import outbox
+from sqlalchemy.exc import OperationalError
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+
+
+class TestOutbox(unittest.TestCase):
+    """Class for testing the outbound SMS outbox"""
+
+    def setUp(self):
+        """Initialization for the test cases
+
+        This is executed prior to each test.
+        """
+        application.config['TESTING'] = True
+        application.config['WTF_CSRF_ENABLED'] = False
+        application.config['DEBUG'] = False
+        self.app = application.test_client()
+        db.drop_all()
+        db.create_all()
+
+        self.test_user = classes.User(first_name="first",
+                                      last_name="last",
+                                      email="test@gmail.com",
+                                      phone="9876543210",
+                                      password="password")
+        db.session.add(self.test_user)
+        db.session.commit()
+
+    def tearDown(self):
+        """Clean-up for the test cases
+
+        This is executed after each test.
+        """
+        db.session.remove()
+
+    def message(self, key, kind="reminder"):
+        return classes.Outbox(user_id=self.test_user.id, kind=kind,
+                              to_phone=self.test_user.phone, body="hi",
+                              idempotency_key=key)
+
+    ####################################################################
+    # Outbox Tests
+    ####################################################################
+    def test_enqueue_is_idempotent(self):
+        enqueue_messages([self.message("a"), self.message("a")])
+        db.session.commit()
+        added = enqueue_messages([self.message("a"), self.message("b")])
+        db.session.commit()
+        self.assertEqual([m.idempotency_key for m in added], ["b"])
+        self.assertEqual(classes.Outbox.query.count(), 2)
+
+    def test_deliver_marks_delivered(self):
+        enqueue_messages([self.message("a"), self.message("b", "lottery")])
+        db.session.commit()
+
+        transport = FakeTransport()
+        run_worker(transport, once=True)
+
+        self.assertEqual(len(transport.sent), 2)
+        statuses = {m.status for m in classes.Outbox.query.all()}
+        self.assertEqual(statuses, {"delivered"})
+        # only the delivered reminder counts as a saving suggestion
+        self.assertEqual(classes.User.query.first().saving_suggestions, 1)
+        self.assertEqual(classes.UserDailyActivity.query.one()
+                         .reminders_sent, 1)
+        self.assertEqual(claim_batch("worker"), [])
+
+    def test_failed_delivery_is_retried_with_backoff(self):
+        enqueue_messages([self.message("a")])
+        db.session.commit()
+
+        deliver_batch(claim_batch("worker"), FakeTransport(failure_rate=1.0))
+        message = classes.Outbox.query.first()
+        self.assertEqual(message.status, "pending")
+        self.assertEqual(message.attempts, 1)
+        self.assertGreater(message.next_attempt_at, datetime.utcnow())
+        self.assertEqual(claim_batch("worker"), [])
+
+        for _ in range(MAX_ATTEMPTS - 1):
+            later = message.next_attempt_at + timedelta(seconds=1)
+            deliver_batch(claim_batch("worker", now=later),
+                          FakeTransport(failure_rate=1.0))
+        self.assertEqual(message.status, "failed")
+
+    def test_timed_out_delivery_is_not_retried(self):
+        enqueue_messages([self.message("a")])
+        db.session.commit()
+
+        deliver_batch(claim_batch("worker"), FakeTransport(latency=0.5),
+                      timeout=0.1)
+        message = classes.Outbox.query.first()
+        # the send may still have gone through, so it is not sent again
+        self.assertEqual(message.status, "unknown")
+        self.assertIn("DispatchTimeout", message.last_error)
+        later = datetime.utcnow() + timedelta(days=1)
+        self.assertEqual(claim_batch("worker", now=later), [])
+
+    def test_counter_failure_does_not_resend(self):
+        enqueue_messages([self.message("a")])
+        db.session.commit()
+
+        transport = FakeTransport()
+        failure = OperationalError("UPDATE", {}, Exception("conflict"))
+        with mock.patch.object(outbox, "increment_daily_activity",
+                               side_effect=failure):
+            deliver_batch(claim_batch("worker"), transport)
+
+        self.assertEqual(classes.Outbox.query.one().status, "delivered")
+        later = datetime.utcnow() + timedelta(days=1)
+        self.assertEqual(claim_batch("worker", now=later), [])
+        self.assertEqual(len(transport.sent), 1)
+
+    def test_worker_survives_errors(self):
+        calls = []
+
+        def claim(worker_id, batch_size):
+            calls.append(worker_id)
+            if len(calls) == 1:
+                raise OperationalError("SELECT", {}, Exception("gone"))
+            raise KeyboardInterrupt
+
+        with mock.patch.object(outbox, "claim_batch", claim):
+            with self.assertRaises(KeyboardInterrupt):
+                run_worker(FakeTransport(), poll_interval=0)
+        self.assertEqual(len(calls), 2)
+
+    def test_socket_timeout_undercuts_dispatch_timeout(self):
+        self.assertLess(socket_timeout(10) + http_transport.connect_timeout,
+                        10)
+        with self.assertRaises(ValueError):
+            socket_timeout(http_transport.connect_timeout)
+
+    def test_send_message_route_queues_reminders(self):
+        habit = classes.Habits(user=self.test_user, habit_name="coffee",
+                               habit_category="Coffee", time_minute=0,
+                               time_hour=8, time_day_of_week="everyday")
+        schedule_habit(habit, datetime.utcnow() - timedelta(days=1))
+        db.session.add(habit)
+        db.session.commit()
+
+        self.app.get('/send_message')
+        # a redelivered tick does not queue the reminder again
+        self.app.get('/send_message')
+
+        message = classes.Outbox.query.one()
+        self.assertEqual(message.kind, "reminder")
+        self.assertEqual(message.body, "Would you like to save $5 on "
+                                       "Coffee today? Respond Y/N")
+        self.assertGreater(classes.Habits.query.first().next_fire_at,
+                           datetime.utcnow())
+
+        transport = FakeTransport()
+        run_worker(transport, once=True)
+        self.assertEqual(transport.sent, [("+19876543210", message.body)])
+
+
+if __name__ == "__main__":
+    unittest.main()
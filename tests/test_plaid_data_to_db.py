@@ -1,8 +1,9 @@
 import unittest
 import os
-from datetime import datetime
+from datetime import date, datetime
 from plaid_methods import add_plaid_data, methods
 from app import application, db, classes
+from scripts import fake_plaid
 from plaid import Client
 from plaid.api import sandbox
 
@@ -154,5 +155,73 @@ class TestDataToDB(unittest.TestCase):
                          msg="check category id")
 
 
+class TestBulkIngest(unittest.TestCase):
+    """Class for testing the bulk ingestion of Plaid data"""
+
+    def setUp(self):
+        """Initialization for the test cases
+
+        This is executed prior to each test.
+        """
+        application.config['TESTING'] = True
+        db.drop_all()
+        db.create_all()
+
+        self.test_user = classes.User(first_name="first",
+                                      last_name="last",
+                                      email="test@gmail.com",
+                                      phone="9876543210",
+                                      password="password")
+        self.test_item = classes.PlaidItems(user=self.test_user,
+                                            item_id="item",
+                                            access_token="token")
+        db.session.add_all([self.test_user, self.test_item])
+        db.session.commit()
+
+    def tearDown(self):
+        """Clean-up for the test cases
+
+        This is executed after each test.
+        """
+        db.session.remove()
+
+    ####################################################################
+    # Bulk Ingestion Tests
+    ####################################################################
+
+    def test_parse_date(self):
+        self.assertEqual(add_plaid_data.parse_date("2019-10-07"),
+                         date(2019, 10, 7))
+        self.assertIsNone(add_plaid_data.parse_date(None))
+
+    def test_bulk_add_accounts(self):
+        accounts = fake_plaid.fake_accounts(3)
+        add_plaid_data.add_accounts(accounts, self.test_user, self.test_item)
+        self.assertEqual([account.account_plaid_id
+                          for account in self.test_user.accounts],
+                         [account['account_id'] for account in accounts])
+        self.assertEqual(self.test_item.accounts[0].account_name,
+                         accounts[0]['name'])
+
+    def test_bulk_add_transactions(self):
+        add_plaid_data.add_accounts(fake_plaid.fake_accounts(1),
+                                    self.test_user, self.test_item)
+        account = self.test_user.accounts[0]
+        transactions = fake_plaid.fake_transactions(2500)
+        # more than add_plaid_data.CHUNK_SIZE records
+        add_plaid_data.add_transactions(transactions, self.test_user,
+                                        account)
+        self.assertEqual(len(account.transaction), 2500)
+        transaction = classes.Transaction.query.filter_by(
+            trans_date=add_plaid_data.parse_date(transactions[0]['date']),
+            category_id=int(transactions[0]['category_id'])).first()
+        self.assertEqual(transaction.user_id, self.test_user.id)
+        self.assertEqual(transaction.merchant_category,
+                         ';'.join(transactions[0]['category']))
+        total = db.session.query(
+            db.func.sum(classes.DailySpending.trans_count)).scalar()
+        self.assertEqual(total, 2500)
+
+
 if __name__ == "__main__":
     unittest.main()
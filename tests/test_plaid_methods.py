@@ -6,6 +6,8 @@ import flask
 from plaid_methods import methods
 from plaid import Client
 from plaid.api import sandbox
+from scripts.fake_plaid import FakePlaidClient, FakePlaidServer, \
+    FakeTransactions, LocalPlaidClient, fake_transactions
 
 
 ENV_VARS = {
@@ -121,5 +123,98 @@ class TestPlaidMethods(unittest.TestCase):
         return response['access_token']
 
 
+class ShortPageTransactions(FakeTransactions):
+    """Transactions endpoint whose page at short_offset once comes back
+    10 transactions short"""
+
+    def __init__(self, client, short_offset):
+        super().__init__(client)
+        self.short_offset = short_offset
+
+    def get(self, *args, offset=0, **kwargs):
+        response = super().get(*args, offset=offset, **kwargs)
+        if offset == self.short_offset:
+            self.short_offset = None
+            response["transactions"] = response["transactions"][:-10]
+        return response
+
+
+class TestParallelFetch(unittest.TestCase):
+    """Class for testing the paging of get_transactions"""
+
+    def setUp(self):
+        """Initialization for the test cases
+
+        This is executed prior to each test.
+        """
+        self.transactions = fake_transactions(1234)
+        self.expected = [transaction["transaction_id"]
+                         for transaction in self.transactions]
+
+    ####################################################################
+    # Fetch Tests
+    ####################################################################
+    def fetch(self, client, **kwargs):
+        transactions = methods.get_transactions(
+            client, "2000-01-01", "2100-01-01", "token", "acc", **kwargs)
+        return [transaction["transaction_id"]
+                for transaction in transactions]
+
+    def test_pages_reassembled_in_order(self):
+        for concurrency in (1, 3, 20):
+            with self.subTest(concurrency=concurrency):
+                client = FakePlaidClient(self.transactions)
+                self.assertEqual(self.fetch(client, page_size=100,
+                                            concurrency=concurrency),
+                                 self.expected)
+                offsets = sorted(call[4] for call in client.calls)
+                self.assertEqual(offsets, list(range(0, 1234, 100)))
+
+    def test_single_page(self):
+        client = FakePlaidClient(self.transactions[:50])
+        self.assertEqual(self.fetch(client), self.expected[:50])
+        self.assertEqual(len(client.calls), 1)
+
+    def test_not_ready_returns_without_waiting(self):
+        client = FakePlaidClient(self.transactions)
+        client.errors = [("ITEM_ERROR", "PRODUCT_NOT_READY")]
+        transactions = methods.get_transactions(
+            client, "2000-01-01", "2100-01-01", "token", "acc")
+        self.assertEqual(transactions, "PRODUCT_NOT_READY")
+        self.assertEqual(len(client.calls), 1)
+
+    def test_short_page_refetched(self):
+        for concurrency in (1, 4):
+            with self.subTest(concurrency=concurrency):
+                client = FakePlaidClient(self.transactions)
+                client.Transactions = ShortPageTransactions(client, 300)
+                self.assertEqual(self.fetch(client, page_size=100,
+                                            concurrency=concurrency),
+                                 self.expected)
+        # only the gap is fetched again
+        self.assertEqual(sorted(call[4] for call in client.calls),
+                         sorted(list(range(0, 1234, 100)) + [390]))
+
+    def test_shifted_pages_not_duplicated(self):
+        client = FakePlaidClient(self.transactions)
+        new = fake_transactions(1, seed=1)[0]
+
+        def add_new_transaction(page):
+            # a new, most recent, transaction moves every later page on
+            if new not in client.transactions:
+                client.transactions.insert(0, new)
+
+        fetched = self.fetch(client, page_size=100, concurrency=4,
+                             on_page=add_new_transaction)
+        # the transaction pushed across a page boundary is kept once
+        self.assertEqual(fetched, self.expected)
+
+    def test_fetch_over_http(self):
+        with FakePlaidServer(self.transactions) as server:
+            client = LocalPlaidClient(server.url)
+            self.assertEqual(self.fetch(client, page_size=250),
+                             self.expected)
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,160 @@
+from app import application, classes, db
+from plaid_methods.sync import SYNC_OVERLAP_DAYS, sync_account, \
+    sync_item, upsert_transactions
+from scripts.daily_spending import rebuild_daily_spending
+from scripts.fake_plaid import FakePlaidClient, fake_transactions
+import unittest
+from datetime import date, timedelta
+
+
+class TestPlaidSync(unittest.TestCase):
+    """Class for testing the incremental sync of Plaid transactions"""
+
+    def setUp(self):
+        """Initialization for the test cases
+
+        This is executed prior to each test.
+        """
+        application.config['TESTING'] = True
+        db.drop_all()
+        db.create_all()
+
+        self.user = classes.User(first_name="first", last_name="last",
+                                 email="test@gmail.com", phone="9876543210",
+                                 password="password")
+        item = classes.PlaidItems(user=self.user, access_token="token",
+                                  item_id="item")
+        self.account = classes.Accounts(account_plaid_id="acc",
+                                        account_name="checking",
+                                        account_type="depository",
+                                        account_subtype="checking",
+                                        user=self.user, plaid_item=item)
+        self.item = item
+        db.session.add_all([self.user, item, self.account])
+        db.session.commit()
+
+        self.end = date(2020, 5, 1)
+        self.client = FakePlaidClient(
+            fake_transactions(250, end=self.end, days=60))
+
+    def tearDown(self):
+        """Clean-up for the test cases
+
+        This is executed after each test.
+        """
+        db.session.remove()
+
+    def stored(self):
+        return {transaction.plaid_transaction_id:
+                (transaction.trans_date, float(transaction.trans_amount),
+                 transaction.pending)
+                for transaction in classes.Transaction.query}
+
+    def rollup(self):
+        return {(row.spending_date, row.bucket):
+                (row.trans_count, float(row.trans_amount))
+                for row in classes.DailySpending.query
+                if row.trans_count}
+
+    def assert_rollup_consistent(self):
+        rollup = self.rollup()
+        rebuild_daily_spending()
+        self.assertEqual(rollup, self.rollup())
+
+    ####################################################################
+    # Sync Tests
+    ####################################################################
+    def test_initial_sync(self):
+        self.assertEqual(sync_account(self.client, self.account, self.end),
+                         (250, 0, 0))
+        self.assertEqual(len(self.stored()), 250)
+        latest = max(transaction["date"]
+                     for transaction in self.client.transactions)
+        self.assertEqual(self.account.synced_through.isoformat(), latest)
+        self.assertIsNotNone(self.account.last_synced_at)
+        self.assert_rollup_consistent()
+
+    def test_resync_is_idempotent(self):
+        sync_account(self.client, self.account, self.end)
+        before = self.stored()
+        self.assertEqual(sync_account(self.client, self.account, self.end),
+                         (0, 0, 0))
+        self.assertEqual(self.stored(), before)
+
+        # only the overlap window is fetched again
+        start_date = self.client.calls[-1][1]
+        self.assertEqual(start_date, (self.account.synced_through -
+                                      timedelta(days=SYNC_OVERLAP_DAYS))
+                         .isoformat())
+        self.assert_rollup_consistent()
+
+    def test_pending_transactions(self):
+        pending = dict(self.client.transactions[0], transaction_id="pend1",
+                       amount=5.0, pending=True)
+        dropped = dict(self.client.transactions[1], transaction_id="pend2",
+                       amount=7.0, pending=True)
+        self.client.transactions[:0] = [pending, dropped]
+        self.assertEqual(sync_account(self.client, self.account, self.end),
+                         (252, 0, 0))
+
+        # pend1 posts with a new id and amount, pend2 disappears
+        self.client.transactions[0:2] = [
+            dict(pending, transaction_id="post1", amount=5.5, pending=False,
+                 pending_transaction_id="pend1")]
+        self.assertEqual(sync_account(self.client, self.account, self.end),
+                         (0, 1, 1))
+
+        stored = self.stored()
+        self.assertEqual(len(stored), 251)
+        self.assertNotIn("pend1", stored)
+        self.assertNotIn("pend2", stored)
+        self.assertEqual(stored["post1"][1:], (5.5, False))
+        self.assert_rollup_consistent()
+
+    def test_changed_transaction_is_updated(self):
+        sync_account(self.client, self.account, self.end)
+        self.client.transactions[0] = dict(self.client.transactions[0],
+                                           amount=99.99)
+        self.assertEqual(sync_account(self.client, self.account, self.end),
+                         (0, 1, 0))
+        plaid_id = self.client.transactions[0]["transaction_id"]
+        self.assertEqual(self.stored()[plaid_id][1], 99.99)
+        self.assert_rollup_consistent()
+
+    def test_duplicate_in_response_is_written_once(self):
+        transactions = self.client.transactions[:10]
+        self.assertEqual(upsert_transactions(
+            transactions + transactions[:2], self.user, self.account),
+            (10, 0, 0))
+        db.session.commit()
+        self.assertEqual(len(self.stored()), 10)
+        self.assert_rollup_consistent()
+
+    def test_item_accounts_fetched_once(self):
+        other = classes.Accounts(account_plaid_id="acc2",
+                                 account_name="savings",
+                                 account_type="depository",
+                                 account_subtype="savings",
+                                 user=self.user, plaid_item=self.item)
+        db.session.add(other)
+        db.session.commit()
+        self.client.transactions = fake_transactions(
+            300, account_ids=("acc", "acc2", "unlinked"), end=self.end,
+            days=60)
+
+        counts = sync_item(self.client, self.item,
+                           [self.account, other], self.end)
+        self.assertEqual(counts, {self.account.id: (100, 0, 0),
+                                  other.id: (100, 0, 0)})
+        self.assertEqual({call[3] for call in self.client.calls},
+                         {("acc", "acc2")})
+        self.assertEqual(len(self.client.calls), 1)
+        for account in (self.account, other):
+            self.assertEqual({transaction.account.account_plaid_id
+                              for transaction in account.transaction},
+                             {account.account_plaid_id})
+        self.assert_rollup_consistent()
+
+
+if __name__ == "__main__":
+    unittest.main()
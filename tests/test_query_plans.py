@@ -0,0 +1,32 @@
+from app import application, db
+from scripts.check_query_plans import check_query_plans
+import unittest
+
+
+class TestQueryPlans(unittest.TestCase):
+    """Class for testing that the hot queries use their indexes"""
+
+    def setUp(self):
+        """Initialization for the test cases
+
+        This is executed prior to each test.
+        """
+        application.config['TESTING'] = True
+        db.drop_all()
+        db.create_all()
+
+    def tearDown(self):
+        """Clean-up for the test cases
+
+        This is executed after each test.
+        """
+        db.session.remove()
+
+    def test_hot_queries_use_indexes(self):
+        for name, ok, plan in check_query_plans():
+            with self.subTest(query=name):
+                self.assertTrue(ok, msg=plan)
+
+
+if __name__ == "__main__":
+    unittest.main()
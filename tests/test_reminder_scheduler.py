@@ -0,0 +1,148 @@
+from app import application, classes, db
+from scripts.habit_schedule import schedule_habit
+from scripts import reminder_scheduler
+from scripts.reminder_scheduler import ReminderScheduler
+from sqlalchemy.exc import OperationalError
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+
+
+class TestReminderScheduler(unittest.TestCase):
+    """Class for testing the reminder scheduler daemon"""
+
+    def setUp(self):
+        """Initialization for the test cases
+
+        This is executed prior to each test.
+        """
+        application.config['TESTING'] = True
+        application.config['WTF_CSRF_ENABLED'] = False
+        application.config['DEBUG'] = False
+        db.drop_all()
+        db.create_all()
+
+        self.test_user = classes.User(first_name="first",
+                                      last_name="last",
+                                      email="test@gmail.com",
+                                      phone="9876543210",
+                                      password="password")
+        db.session.add(self.test_user)
+        db.session.commit()
+        # Wednesday 2020-05-20 08:00 PDT
+        self.start = datetime(2020, 5, 20, 15, 0)
+
+    def tearDown(self):
+        """Clean-up for the test cases
+
+        This is executed after each test.
+        """
+        db.session.remove()
+
+    def add_habit(self, name, hour, minute):
+        habit = classes.Habits(user=self.test_user, habit_name=name,
+                               habit_category="Coffee", time_minute=minute,
+                               time_hour=hour, time_day_of_week="everyday")
+        schedule_habit(habit, self.start)
+        db.session.add(habit)
+        db.session.commit()
+        return habit
+
+    ####################################################################
+    # Scheduler Tests
+    ####################################################################
+    def test_fires_due_reminders_once(self):
+        habit = self.add_habit("coffee", 10, 25)
+        scheduler = ReminderScheduler()
+        scheduler.load()
+
+        self.assertEqual(scheduler.fire_due(habit.next_fire_at -
+                                            timedelta(minutes=1)), 0)
+        fire_at = habit.next_fire_at
+        self.assertEqual(scheduler.fire_due(fire_at), 1)
+        self.assertEqual(scheduler.fire_due(fire_at), 0)
+        # sent to the number inbound replies are matched on
+        self.assertEqual(classes.Outbox.query.one().to_phone,
+                         "+19876543210")
+        # rescheduled for the next day
+        self.assertEqual(scheduler.scheduled[habit.id],
+                         fire_at + timedelta(days=1))
+
+    def test_catches_up_after_restart(self):
+        habit = self.add_habit("coffee", 10, 25)
+        scheduler = ReminderScheduler()
+        scheduler.load()
+        # the scheduler was down for a couple of hours past the reminder
+        self.assertEqual(scheduler.fire_due(habit.next_fire_at +
+                                            timedelta(hours=2)), 1)
+
+    def test_applies_changes_incrementally(self):
+        scheduler = ReminderScheduler()
+        scheduler.load()
+        habit = self.add_habit("coffee", 10, 25)
+        scheduler.apply_changes()
+        self.assertIn(habit.id, scheduler.scheduled)
+
+        # a deleted habit is dropped when it comes due
+        fire_at = habit.next_fire_at
+        db.session.delete(habit)
+        db.session.commit()
+        self.assertEqual(scheduler.fire_due(fire_at), 0)
+        self.assertEqual(scheduler.scheduled, {})
+
+    def test_late_commit_below_watermark_is_picked_up(self):
+        first = self.add_habit("coffee", 10, 25)
+        scheduler = ReminderScheduler(lag=300)
+        scheduler.load()
+
+        # committed after the poll, but stamped a minute before the
+        # watermark by a slow transaction or a host with a slower clock
+        late = classes.Habits(user=self.test_user, habit_name="lunch",
+                              habit_category="Lunch", time_minute=0,
+                              time_hour=12, time_day_of_week="everyday",
+                              updated_at=scheduler.watermark -
+                              timedelta(minutes=1))
+        schedule_habit(late, self.start)
+        db.session.add(late)
+        db.session.commit()
+        scheduler.apply_changes()
+        self.assertIn(late.id, scheduler.scheduled)
+
+        # habits re-read in the overlap are not fired twice
+        fire_at = first.next_fire_at
+        self.assertEqual(scheduler.fire_due(fire_at), 1)
+        scheduler.apply_changes()
+        self.assertEqual(scheduler.fire_due(fire_at), 0)
+        self.assertEqual(classes.Outbox.query.count(), 1)
+
+    def test_failed_fire_is_retried(self):
+        habit = self.add_habit("coffee", 10, 25)
+        scheduler = ReminderScheduler()
+        scheduler.load()
+        fire_at = habit.next_fire_at
+
+        failure = OperationalError("INSERT", {}, Exception("gone"))
+        with mock.patch.object(reminder_scheduler, "queue_reminders",
+                               side_effect=failure):
+            with self.assertRaises(OperationalError):
+                scheduler.fire_due(fire_at)
+        self.assertEqual(scheduler.scheduled[habit.id], fire_at)
+
+        self.assertEqual(scheduler.fire_due(fire_at), 1)
+        self.assertEqual(classes.Outbox.query.count(), 1)
+
+    def test_run_survives_errors(self):
+        scheduler = ReminderScheduler()
+        failure = OperationalError("SELECT", {}, Exception("gone"))
+        # the second poll for changes stops the loop
+        with mock.patch.object(scheduler, "fire_due",
+                               side_effect=[failure, 0]) as fire_due, \
+                mock.patch.object(scheduler, "apply_changes",
+                                  side_effect=KeyboardInterrupt):
+            with self.assertRaises(KeyboardInterrupt):
+                scheduler.run(poll_interval=0)
+        self.assertEqual(fire_due.call_count, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
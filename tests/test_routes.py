@@ -1,4 +1,5 @@
 from app import application, classes, db
+from scripts.daily_activity import increment_daily_activity, local_today
 import os
 import unittest
 import flask
@@ -107,6 +108,129 @@ class TestRoutes(unittest.TestCase):
             response = self.app.post('/register', data=data)
             self.assertEqual(response.location, None)
 
+    def test_receive_message_without_reminder(self):
+        test_user = classes.User('First', 'Last', 'test@test.com',
+                                 '6158172309', 'password')
+        db.session.add(test_user)
+        db.session.commit()
+        response = self.app.post('/receive_message',
+                                 data={'From': '+16158172309', 'Body': 'Y'})
+        self.assertIn(b"Oops", response.data)
+        self.assertEqual(classes.Coin.query.count(), 0)
+
+    def test_receive_message_saves(self):
+        test_user = classes.User('First', 'Last', 'test@test.com',
+                                 '6158172309', 'password')
+        db.session.add(test_user)
+        db.session.commit()
+        increment_daily_activity("reminders_sent", [test_user.id])
+        db.session.commit()
+
+        response = self.app.post('/receive_message',
+                                 data={'From': '+16158172309', 'Body': 'Y'})
+        self.assertIn(b"Hoorey", response.data)
+        activity = classes.UserDailyActivity.query.one()
+        self.assertEqual(activity.saves_recorded, 1)
+        self.assertEqual(classes.User.query.first().coins, 10)
+
+        # only one saving per reminder
+        response = self.app.post('/receive_message',
+                                 data={'From': '+16158172309', 'Body': 'Y'})
+        self.assertIn(b"Oops", response.data)
+
+    def test_chart_data(self):
+        test_user = classes.User('First', 'Last', 'test@test.com',
+                                 '6158172309', 'password')
+        test_user.saving_suggestions = 4
+        db.session.add(test_user)
+        db.session.commit()
+        db.session.add(classes.Coin(user_id=test_user.id, coin_amount=10,
+                                    log_date=local_today(),
+                                    description='saving'))
+        db.session.commit()
+        with self.app as c:
+            self.app.post('/login', data=dict(email='test@test.com',
+                                              password='password'))
+            pie = self.app.get('/dashboard/percent_saved.json').get_json()
+            history = self.app.get(
+                '/dashboard/saving_history.json').get_json()
+        self.assertEqual(pie['values'], [1, 3])
+        self.assertEqual(history['date'][-1], local_today().isoformat())
+        self.assertEqual(history['coins'][-1], 10)
+
+    def test_habit_table_save_changes(self):
+        test_user = classes.User('First', 'Last', 'test@test.com',
+                                 '6158172309', 'password')
+        db.session.add(test_user)
+        db.session.commit()
+        kept = classes.Habits(user=test_user, habit_name='coffee',
+                              habit_category='coffee', time_minute=30,
+                              time_hour=8, time_day_of_week='weekday')
+        removed = classes.Habits(user=test_user, habit_name='lunch',
+                                 habit_category='lunch', time_minute=0,
+                                 time_hour=12, time_day_of_week='weekday')
+        db.session.add_all([kept, removed])
+        db.session.commit()
+        kept_id, user_id = kept.id, test_user.id
+
+        with self.app as c:
+            self.app.post('/login', data=dict(email='test@test.com',
+                                              password='password'))
+            self.app.post('/habit_table_save_changes', data={
+                'habit_id': [str(kept_id), ''],
+                'habit_name': ['coffee', 'uber'],
+                'habit_category': ['coffee', 'transportation'],
+                'time_hour_minute': ['09:15', '18:00'],
+                'time_day_of_week': ['weekday', 'everyday']})
+        habits = classes.Habits.query.filter_by(user_id=user_id) \
+            .order_by(classes.Habits.id).all()
+        self.assertEqual([(habit.id == kept_id, habit.habit_name,
+                           habit.time_hour, habit.time_minute)
+                          for habit in habits],
+                         [(True, 'coffee', 9, 15), (False, 'uber', 18, 0)])
+        self.assertTrue(all(habit.next_fire_at for habit in habits))
+
+    def test_start_verification_rejects_invalid_phone(self):
+        test_user = classes.User('First', 'Last', 'test@test.com',
+                                 '0158172309', 'password')
+        db.session.add(test_user)
+        db.session.commit()
+        with self.app as c:
+            self.app.post('/login', data=dict(email='test@test.com',
+                                              password='password'))
+            response = self.app.get('/start_verification')
+        self.assertIn(b"verify this phone number", response.data)
+        self.assertEqual(classes.Outbox.query.count(), 0)
+
+    def test_verify_shows_failed_verification(self):
+        test_user = classes.User('First', 'Last', 'test@test.com',
+                                 '6158172309', 'password')
+        db.session.add(test_user)
+        db.session.commit()
+        with self.app as c:
+            self.app.post('/login', data=dict(email='test@test.com',
+                                              password='password'))
+            response = self.app.get('/start_verification')
+            self.assertTrue(response.location.endswith('verify'))
+            message = classes.Outbox.query.one()
+            self.assertEqual((message.kind, message.to_phone),
+                             ('verification', '+16158172309'))
+            self.assertNotIn(b"send a verification code",
+                             self.app.get('/verify').data)
+
+            classes.Outbox.query.update({'status': 'failed'})
+            db.session.commit()
+            response = self.app.get('/verify')
+        self.assertIn(b"send a verification code", response.data)
+
+    def test_normalize_phone(self):
+        for phone in ['6158172309', '+16158172309', '(615) 817-2309']:
+            self.assertEqual(classes.User.normalize_phone(phone),
+                             '+16158172309')
+            self.assertTrue(classes.User.valid_phone(phone))
+        for phone in ['0158172309', '615817230', '+446158172309']:
+            self.assertFalse(classes.User.valid_phone(phone))
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,73 @@
+from app import application, db
+from scripts.sms_dispatch import SmsMessage, FakeTransport, \
+    dispatch_messages
+import time
+import unittest
+
+
+class SlowTransport(FakeTransport):
+    """Fake transport where one recipient never answers in time"""
+
+    def send(self, to, body):
+        if to == "slow":
+            time.sleep(0.5)
+        return super().send(to, body)
+
+
+class TestSmsDispatch(unittest.TestCase):
+    """Class for testing the SMS dispatch engine"""
+
+    def setUp(self):
+        """Initialization for the test cases
+
+        This is executed prior to each test.
+        """
+        application.config['TESTING'] = True
+        application.config['WTF_CSRF_ENABLED'] = False
+        application.config['DEBUG'] = False
+        self.app = application.test_client()
+        db.drop_all()
+        db.create_all()
+
+    def tearDown(self):
+        """Clean-up for the test cases
+
+        This is executed after each test.
+        """
+        db.session.remove()
+
+    ####################################################################
+    # Dispatch Tests
+    ####################################################################
+    def test_results_keep_message_order(self):
+        messages = [SmsMessage(to=str(i), body="hi", user_id=i)
+                    for i in range(20)]
+        transport = FakeTransport(latency=0.01)
+        results = dispatch_messages(messages, transport, max_workers=4)
+        self.assertEqual([r.message for r in results], messages)
+        self.assertTrue(all(r.ok for r in results))
+        self.assertEqual(len(transport.sent), 20)
+
+    def test_failures_are_collected(self):
+        messages = [SmsMessage(to=str(i), body="hi", user_id=i)
+                    for i in range(10)]
+        transport = FakeTransport(failure_rate=1.0)
+        results = dispatch_messages(messages, transport, max_workers=4)
+        self.assertFalse(any(r.ok for r in results))
+        self.assertIsInstance(results[0].error, RuntimeError)
+        self.assertFalse(any(r.timed_out for r in results))
+
+    def test_per_message_timeout(self):
+        messages = [SmsMessage(to="fast", body="hi", user_id=1),
+                    SmsMessage(to="slow", body="hi", user_id=2)]
+        results = dispatch_messages(messages, SlowTransport(), max_workers=2,
+                                    timeout=0.1)
+        self.assertTrue(results[0].ok)
+        self.assertIsInstance(results[1].error, TimeoutError)
+        # the slow send was not cancelled, its outcome is unknown
+        self.assertFalse(results[0].timed_out)
+        self.assertTrue(results[1].timed_out)
+
+
+if __name__ == "__main__":
+    unittest.main()
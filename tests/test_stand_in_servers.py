@@ -0,0 +1,139 @@
+from app import application
+from plaid_methods import methods
+from scripts.fake_plaid import FakePlaidServer, fake_accounts
+from scripts.fake_twilio import FakeTwilioServer
+from scripts.http_transport import HttpTransport, PooledPlaidClient, \
+    PooledTwilioHttpClient
+from scripts.stand_in_server import RecordReplay, StandInServer
+import os
+import shutil
+import tempfile
+import twilio.rest
+import unittest
+
+
+class TestStandInServers(unittest.TestCase):
+    """Class for testing the Plaid and Twilio stand-in servers"""
+
+    def setUp(self):
+        """Initialization for the test cases
+
+        This is executed prior to each test.
+        """
+        application.config['TESTING'] = True
+        self.transport = HttpTransport(retries=0)
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """Clean-up for the test cases
+
+        This is executed after each test.
+        """
+        self.transport.close()
+        shutil.rmtree(self.directory)
+
+    def plaid_client(self, server):
+        return PooledPlaidClient("id", "secret", "key", "sandbox",
+                                 self.transport, base_url=server.url)
+
+    def twilio_client(self, server):
+        return twilio.rest.Client(
+            "AC123", "token",
+            http_client=PooledTwilioHttpClient(self.transport,
+                                               base_url=server.url))
+
+    ####################################################################
+    # Base Class Tests
+    ####################################################################
+    def test_incomplete_stand_in_fails_on_creation(self):
+        class NoHandler(StandInServer):
+            def parse(self, headers, body):
+                return {}
+
+            def request_key(self, path, request):
+                return request
+
+            def error(self):
+                return {}
+
+        with self.assertRaises(TypeError):
+            NoHandler()
+
+    ####################################################################
+    # Plaid Stand-in Tests
+    ####################################################################
+    def test_plaid_link_and_fetch(self):
+        with FakePlaidServer(accounts=2, volume=300) as server:
+            client = self.plaid_client(server)
+            exchange = methods.token_exchange(client, "public-fake-7")
+            self.assertEqual(exchange["item_id"], "item-7")
+            access_token = exchange["access_token"]
+
+            accounts = methods.get_accounts(client, access_token)
+            self.assertEqual(accounts, fake_accounts(2, seed=7))
+            account_ids = [account["account_id"] for account in accounts]
+            transactions = methods.get_transactions(
+                client, "2000-01-01", "2100-01-01", access_token,
+                account_ids, page_size=100)
+            self.assertEqual(len(transactions), 300)
+            self.assertEqual({transaction["account_id"]
+                              for transaction in transactions},
+                             set(account_ids))
+
+            self.assertTrue(
+                client.Item.remove(access_token)["removed"])
+            self.assertEqual(server.linked_items(), [])
+
+    def test_plaid_error_rate(self):
+        with FakePlaidServer(error_rate=1.0) as server:
+            client = self.plaid_client(server)
+            self.assertEqual(methods.token_exchange(client, "public-fake-1"),
+                             "INTERNAL_SERVER_ERROR")
+
+    def test_record_and_replay(self):
+        path = os.path.join(self.directory, "plaid.jsonl")
+        with FakePlaidServer(volume=50, record_replay=RecordReplay(
+                path, "record")) as server:
+            client = self.plaid_client(server)
+            access_token = methods.token_exchange(
+                client, "public-fake-3")["access_token"]
+            recorded = methods.get_accounts(client, access_token)
+
+        # replayed, although this server would make up other data
+        with FakePlaidServer(accounts=5, error_rate=1.0,
+                             record_replay=RecordReplay(
+                                 path, "replay")) as server:
+            client = self.plaid_client(server)
+            self.assertEqual(methods.token_exchange(
+                client, "public-fake-3")["access_token"], access_token)
+            self.assertEqual(methods.get_accounts(client, access_token),
+                             recorded)
+
+    ####################################################################
+    # Twilio Stand-in Tests
+    ####################################################################
+    def test_twilio_messages(self):
+        with FakeTwilioServer() as server:
+            message = self.twilio_client(server).messages.create(
+                body="hi", to="+16158172309", from_="+16462573594")
+        self.assertTrue(message.sid.startswith("SM"))
+        self.assertEqual([(sent["to"], sent["body"])
+                          for sent in server.messages],
+                         [("+16158172309", "hi")])
+
+    def test_twilio_verify(self):
+        with FakeTwilioServer(verify_code="654321") as server:
+            service = self.twilio_client(server).verify.services("VA123")
+            verification = service.verifications.create(to="+16158172309",
+                                                        channel="sms")
+            self.assertEqual(verification.status, "pending")
+            wrong = service.verification_checks.create(to="+16158172309",
+                                                       code="000000")
+            right = service.verification_checks.create(to="+16158172309",
+                                                       code="654321")
+        self.assertEqual(wrong.status, "pending")
+        self.assertEqual(right.status, "approved")
+
+
+if __name__ == "__main__":
+    unittest.main()